@@ -0,0 +1,29 @@
+"""add file summary row id
+
+Revision ID: 0d5b8e2f6c93
+Revises: 7f3c1e9a5d20
+Create Date: 2026-10-19 16:08:33.519427
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d5b8e2f6c93'
+down_revision: Union[str, Sequence[str], None] = '7f3c1e9a5d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Summaries computed so far do not record the rows they count: the next append recounts the file
+    op.add_column('file_summaries', sa.Column('row_id', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('file_summaries', 'row_id')
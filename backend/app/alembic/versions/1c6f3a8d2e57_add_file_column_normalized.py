@@ -0,0 +1,39 @@
+"""add file column normalized
+
+Revision ID: 1c6f3a8d2e57
+Revises: b7d04e2c6a19
+Create Date: 2026-10-19 09:12:40.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c6f3a8d2e57'
+down_revision: Union[str, Sequence[str], None] = 'b7d04e2c6a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file_columns', sa.Column('normalized', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Datetime columns recorded so far may have been typed after the fact (column mapping of an
+    # older file) and still hold the raw text: only flag the ones whose values all are ISO
+    op.execute(r"""
+        UPDATE file_columns fc SET normalized = true
+        WHERE fc.dtype = 'datetime'
+          AND NOT EXISTS (
+              SELECT 1 FROM file_rows r
+              WHERE r.file_id = fc.file_id
+                AND r.data ->> fc.name !~ '^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}:\d{2})?$'
+          )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('file_columns', 'normalized')
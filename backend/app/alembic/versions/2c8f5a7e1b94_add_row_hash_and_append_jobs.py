@@ -0,0 +1,32 @@
+"""add row hash and append jobs
+
+Revision ID: 2c8f5a7e1b94
+Revises: b7e41c2d9f03
+Create Date: 2026-10-18 19:32:10.664205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8f5a7e1b94'
+down_revision: Union[str, Sequence[str], None] = 'b7e41c2d9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file_rows', sa.Column('row_hash', sa.String(length=32), sa.Computed('md5(data::text)', persisted=True), nullable=True))
+    op.create_index('ix_file_rows_file_id_row_hash', 'file_rows', ['file_id', 'row_hash'], unique=False)
+    op.add_column('upload_jobs', sa.Column('mode', sa.String(), server_default='create', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('upload_jobs', 'mode')
+    op.drop_index('ix_file_rows_file_id_row_hash', table_name='file_rows')
+    op.drop_column('file_rows', 'row_hash')
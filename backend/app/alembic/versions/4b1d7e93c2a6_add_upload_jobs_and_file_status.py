@@ -0,0 +1,46 @@
+"""add upload jobs and file status
+
+Revision ID: 4b1d7e93c2a6
+Revises: cf60b20ea4e4
+Create Date: 2026-10-18 16:40:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1d7e93c2a6'
+down_revision: Union[str, Sequence[str], None] = 'cf60b20ea4e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('uploaded_files', sa.Column('status', sa.String(), server_default='ready', nullable=False))
+    op.create_table(
+        'upload_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=False), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('spool_path', sa.String(), nullable=True),
+        sa.Column('rows_processed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_upload_jobs_file_id'), 'upload_jobs', ['file_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_upload_jobs_file_id'), table_name='upload_jobs')
+    op.drop_table('upload_jobs')
+    op.drop_column('uploaded_files', 'status')
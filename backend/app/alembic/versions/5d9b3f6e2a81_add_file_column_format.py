@@ -0,0 +1,28 @@
+"""add file column format
+
+Revision ID: 5d9b3f6e2a81
+Revises: 8e2a5c0d4f17
+Create Date: 2026-10-18 18:21:07.513640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d9b3f6e2a81'
+down_revision: Union[str, Sequence[str], None] = '8e2a5c0d4f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file_columns', sa.Column('format', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('file_columns', 'format')
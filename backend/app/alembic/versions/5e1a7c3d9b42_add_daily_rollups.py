@@ -0,0 +1,83 @@
+"""add daily rollups
+
+Revision ID: 5e1a7c3d9b42
+Revises: 9c2e6f4b7d18
+Create Date: 2026-10-18 23:37:12.208514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1a7c3d9b42'
+down_revision: Union[str, Sequence[str], None] = '9c2e6f4b7d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('file_rollups',
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('columns', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('built_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('file_id')
+    )
+    op.create_table('file_daily_totals',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('midnight', sa.Boolean(), nullable=True),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(), nullable=True),
+    sa.Column('line_amount', sa.Numeric(), nullable=True),
+    sa.Column('quantity', sa.Numeric(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_file_daily_totals_file_id_day', 'file_daily_totals', ['file_id', 'day'], unique=False)
+    op.create_table('file_daily_products',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('midnight', sa.Boolean(), nullable=True),
+    sa.Column('product', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(), nullable=True),
+    sa.Column('line_amount', sa.Numeric(), nullable=True),
+    sa.Column('quantity', sa.Numeric(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_file_daily_products_file_id_day', 'file_daily_products', ['file_id', 'day'], unique=False)
+    op.create_table('file_daily_customers',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('midnight', sa.Boolean(), nullable=True),
+    sa.Column('customer', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(), nullable=True),
+    sa.Column('quantity', sa.Numeric(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_file_daily_customers_file_id_day', 'file_daily_customers', ['file_id', 'day'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_file_daily_customers_file_id_day', table_name='file_daily_customers')
+    op.drop_table('file_daily_customers')
+    op.drop_index('ix_file_daily_products_file_id_day', table_name='file_daily_products')
+    op.drop_table('file_daily_products')
+    op.drop_index('ix_file_daily_totals_file_id_day', table_name='file_daily_totals')
+    op.drop_table('file_daily_totals')
+    op.drop_table('file_rollups')
@@ -0,0 +1,32 @@
+"""add file rows file id index
+
+Revision ID: 6a0e9d3c4b57
+Revises: 2c8f5a7e1b94
+Create Date: 2026-10-18 20:14:52.381096
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a0e9d3c4b57'
+down_revision: Union[str, Sequence[str], None] = '2c8f5a7e1b94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built without locking out writes; per-file partial indexes are managed by app/dataset/index_helper.py
+    with op.get_context().autocommit_block():
+        op.create_index('ix_file_rows_file_id', 'file_rows', ['file_id', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_file_rows_file_id', table_name='file_rows', postgresql_concurrently=True, if_exists=True)
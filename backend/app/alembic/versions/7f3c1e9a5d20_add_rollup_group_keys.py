@@ -0,0 +1,41 @@
+"""add rollup group keys
+
+Revision ID: 7f3c1e9a5d20
+Revises: 1c6f3a8d2e57
+Create Date: 2026-10-19 14:26:51.734902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3c1e9a5d20'
+down_revision: Union[str, Sequence[str], None] = '1c6f3a8d2e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rollups built so far do not record the rows they cover: the next build of each file is a full one
+    op.add_column('file_rollups', sa.Column('row_id', sa.BigInteger(), nullable=True))
+    op.drop_index('ix_file_daily_totals_file_id_day', table_name='file_daily_totals')
+    op.create_index('uq_file_daily_totals_group', 'file_daily_totals', ['file_id', 'day', 'midnight'], unique=True, postgresql_nulls_not_distinct=True)
+    op.drop_index('ix_file_daily_products_file_id_day', table_name='file_daily_products')
+    op.create_index('uq_file_daily_products_group', 'file_daily_products', ['file_id', 'day', 'midnight', 'product'], unique=True, postgresql_nulls_not_distinct=True)
+    op.drop_index('ix_file_daily_customers_file_id_day', table_name='file_daily_customers')
+    op.create_index('uq_file_daily_customers_group', 'file_daily_customers', ['file_id', 'day', 'midnight', 'customer'], unique=True, postgresql_nulls_not_distinct=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_file_daily_customers_group', table_name='file_daily_customers')
+    op.create_index('ix_file_daily_customers_file_id_day', 'file_daily_customers', ['file_id', 'day'], unique=False)
+    op.drop_index('uq_file_daily_products_group', table_name='file_daily_products')
+    op.create_index('ix_file_daily_products_file_id_day', 'file_daily_products', ['file_id', 'day'], unique=False)
+    op.drop_index('uq_file_daily_totals_group', table_name='file_daily_totals')
+    op.create_index('ix_file_daily_totals_file_id_day', 'file_daily_totals', ['file_id', 'day'], unique=False)
+    op.drop_column('file_rollups', 'row_id')
@@ -0,0 +1,28 @@
+"""add upload job archive status
+
+Revision ID: 8e2a5c0d4f17
+Revises: 4b1d7e93c2a6
+Create Date: 2026-10-18 17:05:44.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2a5c0d4f17'
+down_revision: Union[str, Sequence[str], None] = '4b1d7e93c2a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('upload_jobs', sa.Column('archive_status', sa.String(), server_default='pending', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('upload_jobs', 'archive_status')
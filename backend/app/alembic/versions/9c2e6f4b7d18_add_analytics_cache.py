@@ -0,0 +1,44 @@
+"""add analytics cache
+
+Revision ID: 9c2e6f4b7d18
+Revises: f3b8d2a61c05
+Create Date: 2026-10-18 22:51:36.472903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e6f4b7d18'
+down_revision: Union[str, Sequence[str], None] = 'f3b8d2a61c05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('analytics_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('size_bytes', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('key'),
+    prefixes=['UNLOGGED']
+    )
+    op.create_index(op.f('ix_analytics_cache_file_id'), 'analytics_cache', ['file_id'], unique=False)
+    op.create_index(op.f('ix_analytics_cache_expires_at'), 'analytics_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_analytics_cache_expires_at'), table_name='analytics_cache')
+    op.drop_index(op.f('ix_analytics_cache_file_id'), table_name='analytics_cache')
+    op.drop_table('analytics_cache')
@@ -0,0 +1,38 @@
+"""add file summaries
+
+Revision ID: b7d04e2c6a19
+Revises: 5e1a7c3d9b42
+Create Date: 2026-10-19 00:24:51.730166
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d04e2c6a19'
+down_revision: Union[str, Sequence[str], None] = '5e1a7c3d9b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('file_summaries',
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('counters', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('first_order_at', sa.DateTime(), nullable=True),
+    sa.Column('last_order_at', sa.DateTime(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['uploaded_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('file_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('file_summaries')
@@ -0,0 +1,45 @@
+"""move raw upload bytes to blob store
+
+Revision ID: b7e41c2d9f03
+Revises: 5d9b3f6e2a81
+Create Date: 2026-10-18 18:54:31.207719
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e41c2d9f03'
+down_revision: Union[str, Sequence[str], None] = '5d9b3f6e2a81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('uploaded_files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('uploaded_files', sa.Column('blob_size', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_uploaded_files_content_hash'), 'uploaded_files', ['content_hash'], unique=False)
+    op.alter_column('uploaded_files', 'file_data',
+               existing_type=sa.LargeBinary(),
+               nullable=True)
+    # Existing uploads keep their bytes in file_data; record their size and hash
+    op.execute(
+        "UPDATE uploaded_files "
+        "SET blob_size = octet_length(file_data), content_hash = encode(sha256(file_data), 'hex') "
+        "WHERE file_data IS NOT NULL AND octet_length(file_data) > 0"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE uploaded_files SET file_data = '' WHERE file_data IS NULL")
+    op.alter_column('uploaded_files', 'file_data',
+               existing_type=sa.LargeBinary(),
+               nullable=False)
+    op.drop_index(op.f('ix_uploaded_files_content_hash'), table_name='uploaded_files')
+    op.drop_column('uploaded_files', 'blob_size')
+    op.drop_column('uploaded_files', 'content_hash')
@@ -0,0 +1,133 @@
+"""partition file rows by file
+
+Revision ID: d4a7c91e0b3f
+Revises: 6a0e9d3c4b57
+Create Date: 2026-10-18 21:02:39.845112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7c91e0b3f'
+down_revision: Union[str, Sequence[str], None] = '6a0e9d3c4b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_file_rows_id', 'file_rows', ['id'], unique=False)
+    op.create_index('ix_file_rows_file_id', 'file_rows', ['file_id', 'id'], unique=False)
+    op.create_index('ix_file_rows_file_id_row_hash', 'file_rows', ['file_id', 'row_hash'], unique=False)
+
+
+# Per-file indexes managed by app/dataset/index_helper.py: ix_file_rows_<file_id>_<kind>_<hash>
+_FILE_INDEX_RE = re.compile(r"^ix_file_rows_(\d+)_")
+
+
+def _file_index_defs(table_pattern: str) -> list:
+    """(name, file id, CREATE INDEX statement) of the per-file indexes on tables matching `table_pattern`."""
+    rows = op.get_bind().execute(
+        sa.text("SELECT indexname, indexdef FROM pg_indexes WHERE tablename LIKE :pattern"),
+        {"pattern": table_pattern},
+    ).all()
+    defs = []
+    for name, ddl in rows:
+        match = _FILE_INDEX_RE.match(name)
+        if match:
+            defs.append((name, int(match.group(1)), ddl))
+    return defs
+
+
+def _to_partition(file_id: int, ddl: str) -> str:
+    """A partial index on the shared table as the same index on the file's own partition."""
+    ddl = re.sub(r" ON (\S+\.)?file_rows_old ", f" ON file_rows_{file_id} ", ddl)
+    # The file_id = N predicate is implied by the partition
+    ddl = re.sub(rf" WHERE \(\(file_id = {file_id}\) AND (.*)\)$", r" WHERE \1", ddl)
+    return re.sub(rf" WHERE \(file_id = {file_id}\)$", "", ddl)
+
+
+def _to_shared_table(file_id: int, ddl: str) -> str:
+    """An index on a file's partition (or on file_rows_default) as a partial index on the flat table."""
+    ddl = re.sub(r" ON (\S+\.)?file_rows_\w+ ", " ON file_rows ", ddl)
+    if re.search(rf"\(file_id = {file_id}\)", ddl):
+        return ddl
+    if " WHERE " in ddl:
+        return ddl.replace(" WHERE ", f" WHERE (file_id = {file_id}) AND ", 1)
+    return ddl + f" WHERE (file_id = {file_id})"
+
+
+def _execute_ddl(ddl: str) -> None:
+    # Escape colons so casts and column names are not taken for bind parameters
+    op.execute(sa.text(ddl.replace(":", "\\:")))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the old heap aside; its per-file partial indexes go with it and are recreated on the partitions
+    op.execute("ALTER TABLE file_rows RENAME TO file_rows_old")
+    file_indexes = _file_index_defs("file_rows_old")
+    op.execute("ALTER TABLE file_rows_old RENAME CONSTRAINT file_rows_pkey TO file_rows_old_pkey")
+    op.execute("ALTER TABLE file_rows_old DROP CONSTRAINT IF EXISTS file_rows_file_id_fkey")
+    for name in ('ix_file_rows_id', 'ix_file_rows_file_id', 'ix_file_rows_file_id_row_hash'):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute("""
+        CREATE TABLE file_rows (
+            id INTEGER NOT NULL DEFAULT nextval('file_rows_id_seq'),
+            file_id INTEGER NOT NULL REFERENCES uploaded_files (id) ON DELETE CASCADE,
+            data JSONB NOT NULL,
+            row_hash VARCHAR(32) GENERATED ALWAYS AS (md5(data::text)) STORED,
+            PRIMARY KEY (id, file_id)
+        ) PARTITION BY LIST (file_id)
+    """)
+    op.execute("CREATE TABLE file_rows_default PARTITION OF file_rows DEFAULT")
+    op.execute("""
+        DO $$
+        DECLARE fid INTEGER;
+        BEGIN
+            FOR fid IN SELECT DISTINCT file_id FROM file_rows_old WHERE file_id IS NOT NULL LOOP
+                EXECUTE format('CREATE TABLE file_rows_%s PARTITION OF file_rows FOR VALUES IN (%s)', fid, fid);
+            END LOOP;
+        END $$
+    """)
+    # Rows without a file were unreachable and cannot be partitioned; they are dropped
+    op.execute("INSERT INTO file_rows (id, file_id, data) SELECT id, file_id, data FROM file_rows_old WHERE file_id IS NOT NULL")
+    op.execute("ALTER SEQUENCE file_rows_id_seq OWNED BY file_rows.id")
+    op.execute("DROP TABLE file_rows_old")
+    _create_indexes()
+
+    for name, file_id, ddl in file_indexes:
+        # A file without rows has no partition; its indexes are built with its next ingest/mapping
+        if op.get_bind().execute(sa.text("SELECT to_regclass(:name)"), {"name": f"file_rows_{file_id}"}).scalar():
+            _execute_ddl(_to_partition(file_id, ddl))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE file_rows RENAME TO file_rows_partitioned")
+    file_indexes = _file_index_defs("file_rows_%")
+    op.execute("ALTER TABLE file_rows_partitioned RENAME CONSTRAINT file_rows_pkey TO file_rows_partitioned_pkey")
+    op.execute("ALTER TABLE file_rows_partitioned DROP CONSTRAINT IF EXISTS file_rows_file_id_fkey")
+    for name in ('ix_file_rows_id', 'ix_file_rows_file_id', 'ix_file_rows_file_id_row_hash'):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute("""
+        CREATE TABLE file_rows (
+            id INTEGER NOT NULL DEFAULT nextval('file_rows_id_seq') PRIMARY KEY,
+            file_id INTEGER REFERENCES uploaded_files (id) ON DELETE CASCADE,
+            data JSONB NOT NULL,
+            row_hash VARCHAR(32) GENERATED ALWAYS AS (md5(data::text)) STORED
+        )
+    """)
+    op.execute("INSERT INTO file_rows (id, file_id, data) SELECT id, file_id, data FROM file_rows_partitioned")
+    op.execute("ALTER SEQUENCE file_rows_id_seq OWNED BY file_rows.id")
+    op.execute("DROP TABLE file_rows_partitioned CASCADE")
+    _create_indexes()
+
+    for name, file_id, ddl in file_indexes:
+        _execute_ddl(_to_shared_table(file_id, ddl))
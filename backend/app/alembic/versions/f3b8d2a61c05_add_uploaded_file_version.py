@@ -0,0 +1,28 @@
+"""add uploaded file version
+
+Revision ID: f3b8d2a61c05
+Revises: d4a7c91e0b3f
+Create Date: 2026-10-18 22:14:52.306118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d2a61c05'
+down_revision: Union[str, Sequence[str], None] = 'd4a7c91e0b3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('uploaded_files', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('uploaded_files', 'version')
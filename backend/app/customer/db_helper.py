@@ -1,6 +1,11 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, literal, literal_column, or_, select
 from typing import List, Dict, Any, Optional
 from app.models import FileRow, UploadedFile
+from app.dataset.page_helper import keyset_after, contains_pattern
+
+# Sort keys of the paged customers table ("first_seen" is the order customers first appear in the file)
+CUSTOMER_SORTS = ("first_seen", "customerName", "phone", "city")
 
 def fetch_file_rows(
     db: Session,
@@ -33,3 +38,76 @@ def upsert_customers_placeholder(db: Session, customers: List[Dict[str, Any]]):
     """
 
     return customers
+
+def get_customers_page_from_db(
+    db: Session,
+    file_id: int,
+    keys: dict,
+    dedupe: list[str],
+    sort: str = "first_seen",
+    descending: bool = False,
+    after: list | None = None,
+    limit: int = 50,
+    search: str | None = None,
+) -> tuple[list[dict], list | None, int | None]:
+
+    """
+    One page of a file's distinct customers, deduplicated and paged in PostgreSQL.
+    `keys` maps the logical customer fields to raw columns; each customer is the first row (by id) of its
+    `dedupe` fields, as drop_duplicates keeps it. `search` matches name or phone anywhere.
+    Returns (rows with the logical fields, keyset of the last row when more rows follow, total on the first page).
+    """
+
+    # Step 1: First row of every customer
+    def value(key):
+        # JSON null and a missing key are both "no value"
+        return func.nullif(FileRow.data[keys[key]], literal("null").cast(FileRow.data.type))
+
+    columns = {key: value(key).label(key) for key in keys}
+    firsts = (
+        select(FileRow.id.label("row_id"), *columns.values())
+        .where(FileRow.file_id == file_id)
+        .distinct(*[value(key) for key in dedupe])
+        .order_by(*[value(key) for key in dedupe], FileRow.id)
+        .subquery()
+    )
+
+    def as_text(key):
+        return func.coalesce(firsts.c[key].op("#>>")(literal_column("'{}'")), "") if key in keys else None
+
+    # Step 2: Sort key and search
+    sort_expr = firsts.c.row_id if sort == "first_seen" else as_text(sort)
+    if sort_expr is None:
+        raise ValueError(f"Cannot sort by {sort!r}: the column is not mapped.")
+    if sort != "first_seen":
+        sort_expr = sort_expr.collate("C")
+
+    filters = []
+    if search:
+        matches = [as_text(key).ilike(contains_pattern(search)) for key in ("customerName", "phone") if key in keys]
+        if not matches:
+            raise ValueError("Cannot search: neither customer name nor phone is mapped.")
+        filters.append(or_(*matches))
+
+    # Step 3: Count the customers once, on the first page
+    total = None
+    if after is None:
+        total = db.query(func.count()).select_from(firsts).filter(*filters).scalar()
+    else:
+        filters.append(keyset_after(sort_expr, firsts.c.row_id, descending, after))
+
+    # Step 4: One row past the page tells whether another page follows
+    order_by = [sort_expr.desc(), firsts.c.row_id.desc()] if descending else [sort_expr.asc(), firsts.c.row_id.asc()]
+    rows = (
+        db.query(firsts.c.row_id, sort_expr.label("sort_value"), *[firsts.c[key] for key in keys])
+        .filter(*filters)
+        .order_by(*order_by)
+        .limit(limit + 1)
+        .all()
+    )
+
+    last = [rows[limit - 1].sort_value, rows[limit - 1].row_id] if len(rows) > limit else None
+    return [
+        {key: getattr(r, key) for key in keys}
+        for r in rows[:limit]
+    ], last, total
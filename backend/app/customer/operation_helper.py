@@ -1,9 +1,15 @@
 from sqlalchemy.orm import Session
 from typing import Dict, List, Any
 from collections import defaultdict
+import functools
 import pandas as pd
-from app.customer.db_helper import fetch_file_rows, upsert_customers_placeholder
+from app.customer.db_helper import fetch_file_rows, upsert_customers_placeholder, get_customers_page_from_db, CUSTOMER_SORTS
 from app.dashboard.llm_helper import infer_customer_fields_with_llm
+from app.dataset.operation_helper import load_file_frame, list_file_columns, match_columns, ensure_numeric, ensure_datetime
+from app.dataset.aggregate_helper import is_large_file, parallel_group_aggregate, plain_value
+from app.dataset.cache_helper import cached_analytics
+from app.dataset.page_helper import encode_cursor, decode_cursor, page_limit
+from app.dashboard.db_helper import resolve_target_file, get_latest_mapping
 
 def normalize_dataframe_column_names(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -74,6 +80,7 @@ def normalize_dataframe_column_names(df: pd.DataFrame) -> pd.DataFrame:
 #         "count": len(persisted)
 #     }
 
+@cached_analytics("full-customer-classification")
 def aggregate_customers_from_orders(db: Session, identity: dict, file_id: int | None = None) -> dict:
 
     """Return per-customer aggregates from orders using column mappings."""
@@ -137,16 +144,16 @@ def aggregate_customers_from_orders(db: Session, identity: dict, file_id: int |
     amount_col = mapping.get("totalAmount")
     date_col = mapping.get("orderDate")
 
-    # Step 4: Fetch rows
-    rows = db.query(FileRow).filter(FileRow.file_id == target_file.id).all()
-    if not rows:
+    # Step 4: Files too big for one DataFrame are aggregated batch by batch
+    if is_large_file(target_file):
         return {
             "file_id": target_file.id,
             "columns": ["customerName", "phone", "orderCount", "totalSpending", "lastOrderDate"],
-            "rows": []
+            "rows": _aggregate_customers_streamed(db, target_file, name_col, phone_col, amount_col, date_col),
         }
 
-    df = pd.DataFrame([r.data for r in rows])
+    # Otherwise load the mapped columns
+    df = load_file_frame(db, target_file.id, [c for c in [name_col, phone_col, amount_col, date_col] if c])
     if df.empty:
         return {
             "file_id": target_file.id,
@@ -159,36 +166,23 @@ def aggregate_customers_from_orders(db: Session, identity: dict, file_id: int |
     df.columns = [str(c).strip() for c in df.columns]
 
     if amount_col and amount_col in df.columns:
-        df[amount_col] = pd.to_numeric(df[amount_col], errors="coerce").fillna(0)
+        df[amount_col] = ensure_numeric(df[amount_col]).fillna(0)
     if date_col and date_col in df.columns:
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+        df[date_col] = ensure_datetime(df[date_col])
 
-    # Step 6: Aggregate per customer
-    grouped_customers = []
+    # Step 6: Aggregate per customer, all customers in one vectorized group-by
+    grouped = None
+    group_keys = []
     if name_col and name_col in df.columns:
         group_keys = [k for k in [name_col, phone_col] if k and k in df.columns]
-        grouped = df.groupby(group_keys, dropna=False)
-
-        for keys, gdf in grouped:
-            if not isinstance(keys, tuple):
-                keys = (keys,)
-            key_map = dict(zip(group_keys, keys))
-
-            order_count = len(gdf)
-            total_spending = gdf[amount_col].sum() if amount_col in gdf.columns else 0.0
-            last_order_date = (
-                gdf[date_col].max().isoformat()
-                if date_col in gdf.columns and not gdf[date_col].isna().all()
-                else None
-            )
-
-            grouped_customers.append({
-                "customerName": key_map.get(name_col),
-                "phone": key_map.get(phone_col),
-                "orderCount": order_count,
-                "totalSpending": float(total_spending),
-                "lastOrderDate": last_order_date
-            })
+        aggs = _customer_aggs(
+            name_col,
+            amount_col if amount_col and amount_col in df.columns else None,
+            date_col if date_col and date_col in df.columns else None,
+        )
+        grouped = df.groupby(group_keys, dropna=False).agg(**aggs)
+
+    grouped_customers = _customer_rows(grouped, group_keys, name_col, phone_col)
 
     return {
         "file_id": target_file.id,
@@ -196,6 +190,103 @@ def aggregate_customers_from_orders(db: Session, identity: dict, file_id: int |
         "rows": grouped_customers
     }
 
+def _prepare_orders_batch(df: pd.DataFrame, amount_col, date_col) -> pd.DataFrame:
+    """Step 5 of aggregate_customers_from_orders for one batch (module level, so it pickles)."""
+    df = df.where(pd.notnull(df), None)
+    df.columns = [str(c).strip() for c in df.columns]
+    if amount_col:
+        df[amount_col] = ensure_numeric(df[amount_col]).fillna(0)
+    if date_col:
+        df[date_col] = ensure_datetime(df[date_col])
+    return df
+
+def _aggregate_customers_streamed(db: Session, target_file, name_col, phone_col, amount_col, date_col) -> list[dict]:
+    """
+    Step 5 + 6 of aggregate_customers_from_orders over one batch of rows at a time, in parallel over
+    the file's partitions: per-batch counts, sums and last dates per (name, phone), merged into one row per customer.
+    """
+    available = {str(c).strip() for c in list_file_columns(db, target_file.id)}
+    if not (name_col and name_col in available):
+        return []
+
+    group_keys = [k for k in [name_col, phone_col] if k and k in available]
+    has_amount = bool(amount_col and amount_col in available)
+    has_date = bool(date_col and date_col in available)
+
+    aggs = _customer_aggs(name_col, amount_col if has_amount else None, date_col if has_date else None)
+
+    # Per partition and batch group-by across the analytics process pool, merged here
+    grouped = parallel_group_aggregate(
+        db,
+        target_file.id,
+        [c for c in [name_col, phone_col, amount_col, date_col] if c],
+        group_keys,
+        aggs,
+        prepare=functools.partial(
+            _prepare_orders_batch,
+            amount_col=amount_col if has_amount else None,
+            date_col=date_col if has_date else None,
+        ),
+        dropna=False,
+    )
+    return _customer_rows(grouped, group_keys, name_col, phone_col)
+
+def _customer_aggs(name_col: str, amount_col: str | None, date_col: str | None) -> dict:
+    """Per-customer aggregations of full-customer-classification (all of them mergeable across batches)."""
+    aggs = {"orderCount": (name_col, "size")}
+    if amount_col:
+        aggs["totalSpending"] = (amount_col, "sum")
+    if date_col:
+        aggs["lastOrderDate"] = (date_col, "max")
+        aggs["firstOrderDate"] = (date_col, "min")
+    return aggs
+
+def _customer_rows(grouped: pd.DataFrame | None, group_keys: list, name_col, phone_col) -> list[dict]:
+    """
+    Response rows of full-customer-classification from the per-customer aggregates (indexed by group_keys),
+    with recency (days from the customer's last order to the file's last order) and average order value.
+    """
+    if grouped is None or grouped.empty:
+        return []
+
+    frame = grouped.reset_index()
+    size = len(frame)
+
+    def keys(col):
+        if not col or col not in group_keys:
+            return [None] * size
+        return [plain_value(v) for v in frame[col].tolist()]
+
+    def iso(series):
+        return [v.isoformat() if pd.notnull(v) else None for v in series]
+
+    counts = frame["orderCount"].astype(int)
+    spending = frame["totalSpending"].astype(float) if "totalSpending" in frame.columns else pd.Series(0.0, index=frame.index)
+    average = (spending / counts).tolist()
+
+    if "lastOrderDate" in frame.columns:
+        last, first = frame["lastOrderDate"], frame["firstOrderDate"]
+        recency = [None if pd.isna(v) else int(v) for v in (last.max() - last).dt.days]
+        last, first = iso(last), iso(first)
+    else:
+        last = first = recency = [None] * size
+
+    return [
+        {
+            "customerName": name,
+            "phone": phone,
+            "orderCount": count,
+            "totalSpending": total,
+            "lastOrderDate": last_order,
+            "firstOrderDate": first_order,
+            "recencyDays": days,
+            "averageOrderValue": avg,
+        }
+        for name, phone, count, total, last_order, first_order, days, avg in zip(
+            keys(name_col), keys(phone_col), counts.tolist(), spending.tolist(), last, first, recency, average
+        )
+    ]
+
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from typing import Dict, Any
@@ -229,6 +320,7 @@ def _extract_customer_table(df: pd.DataFrame, mapping: dict) -> list[dict]:
 
     return projected.to_dict(orient="records")
 
+@cached_analytics("customers-table")
 def get_customers_table(db: Session, identity: dict, file_id: int | None = None) -> Dict[str, Any]:
     """Return a clean customer table using 'customer' analysis first, 
     falling back to 'order' for phone if needed."""
@@ -287,12 +379,10 @@ def get_customers_table(db: Session, identity: dict, file_id: int | None = None)
     if "phone" not in final_mapping and "customerPhone" in order_mapping:
         final_mapping["phone"] = order_mapping["customerPhone"]
 
-    # Step 4: Query all rows
-    rows = db.query(FileRow).filter(FileRow.file_id == target_file.id).all()
-    if not rows:
-        return {"file_id": target_file.id, "columns": ["customerName", "customerId", "phone", "city"], "rows": []}
-
-    df = pd.DataFrame([r.data for r in rows])
+    # Step 4: Load the mapped columns
+    normalize = lambda c: str(c).strip().lower().replace(" ", "_")
+    columns = match_columns(list_file_columns(db, target_file.id), list(final_mapping.values()), normalize)
+    df = load_file_frame(db, target_file.id, columns)
     if df.empty:
         return {"file_id": target_file.id, "columns": ["customerName", "customerId", "phone", "city"], "rows": []}
 
@@ -313,3 +403,77 @@ def get_customers_table(db: Session, identity: dict, file_id: int | None = None)
         "rows": filtered_rows
     }
 
+
+def get_customers_page(
+    db: Session,
+    identity: dict,
+    file_id: int | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+    sort: str = "first_seen",
+    order: str = "asc",
+    search: str | None = None,
+) -> Dict[str, Any]:
+    """
+    One page of get_customers_table, deduplicated, sorted and searched in the database.
+    Pass next_cursor back (with the same sort and search) for the following page;
+    total (distinct customers) comes with the first page only.
+    """
+
+    desired_cols = ["customerName", "customerId", "phone", "city"]
+    empty = {"file_id": None, "columns": [], "rows": [], "next_cursor": None, "total": 0}
+
+    # Step 1: Validate the request
+    if sort not in CUSTOMER_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(CUSTOMER_SORTS)}.")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    after = decode_cursor(cursor, 2)
+
+    # Step 2: Locate the file and its mappings
+    target_file = resolve_target_file(db, identity, file_id)
+    if not target_file:
+        return empty
+
+    customer_mapping = get_latest_mapping(db, target_file.id, "customer")
+    order_mapping = get_latest_mapping(db, target_file.id, "order")
+    if not customer_mapping and not order_mapping:
+        return {**empty, "file_id": target_file.id}
+
+    # Step 3: Same phone fallback and column matching as get_customers_table
+    final_mapping = customer_mapping.copy()
+    if "phone" not in final_mapping and "customerPhone" in order_mapping:
+        final_mapping["phone"] = order_mapping["customerPhone"]
+
+    normalize = lambda c: str(c).strip().lower().replace(" ", "_")
+    available = list_file_columns(db, target_file.id)
+    keys = {}
+    for logical_name, actual_name in final_mapping.items():
+        matched = match_columns(available, [actual_name], normalize) if actual_name else []
+        if matched:
+            keys[logical_name] = matched[0]
+    if not keys:
+        return {**empty, "file_id": target_file.id, "columns": desired_cols}
+
+    dedupe = [k for k in ["civil_id", "email", "phone"] if k in keys] or list(keys)
+
+    # Step 4: Fetch the page
+    rows, last, total = get_customers_page_from_db(
+        db,
+        target_file.id,
+        keys,
+        dedupe,
+        sort=sort,
+        descending=order == "desc",
+        after=after,
+        limit=page_limit(limit),
+        search=search,
+    )
+
+    return {
+        "file_id": target_file.id,
+        "columns": desired_cols,
+        "rows": [{k: v for k, v in row.items() if k in desired_cols} for row in rows],
+        "next_cursor": encode_cursor(last) if last else None,
+        "total": total,
+    }
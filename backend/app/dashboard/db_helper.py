@@ -1,7 +1,11 @@
 from sqlalchemy.orm import Session
 from app import models
-from app.models import FileRow, UploadedFile, ColumnMapping
-from sqlalchemy import func, cast, String, and_, Date, and_, or_, desc, literal_column, select
+from app.models import FileRow, FileColumn, UploadedFile, ColumnMapping, FileDailyCustomer, FileSummary
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime
+from sqlalchemy import func, cast, String, and_, Date, and_, or_, desc, literal_column, select, distinct, tuple_, text
+from app.dataset.sql_helper import json_value, json_text, json_numeric, json_timestamp
+from app.database import SessionLocal
 
 ANALYSIS_FIELDS = {
     "order": ["orderId", "orderDate", "quantity", "totalAmount", "orderStatus", "customerName", "customerPhone"],
@@ -9,6 +13,54 @@ ANALYSIS_FIELDS = {
     "product": ["productId", "productName", "category", "price", "quantity"]
 }
 
+def resolve_target_file(db: Session, identity: dict, file_id: int | None = None):
+
+    """
+    The file a dashboard request is about: `file_id` when the user/guest owns it,
+    otherwise their most recently uploaded file. None when there is nothing to show.
+    """
+
+    user = identity.get("user")
+    guest_id = identity.get("guest_id")
+    user_id = getattr(user, "id", None) if user else None
+
+    filters = []
+    if user_id:
+        filters.append(UploadedFile.user_id == user_id)
+    if guest_id:
+        filters.append(UploadedFile.guest_id == guest_id)
+    if not filters:
+        return None
+
+    if file_id:
+        target_file = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+        if not target_file:
+            return None
+        if user_id and target_file.user_id != user_id:
+            return None
+        if guest_id and target_file.guest_id != guest_id:
+            return None
+        return target_file
+
+    return (
+        db.query(UploadedFile)
+        .filter(or_(*filters))
+        .order_by(UploadedFile.uploaded_at.desc())
+        .first()
+    )
+
+def get_latest_mapping(db: Session, file_id: int, analysis_type: str) -> dict:
+
+    """The most recently saved column mapping of a file for one analysis type ({} when none)."""
+
+    mapping_obj = (
+        db.query(ColumnMapping)
+        .filter(ColumnMapping.file_id == file_id, ColumnMapping.analysis_type == analysis_type)
+        .order_by(ColumnMapping.updated_at.desc())
+        .first()
+    )
+    return (mapping_obj.mapping or {}) if mapping_obj else {}
+
 def get_dashboard_data_from_db(db: Session, identity: dict, file_id: int | None, limit: int):
     
     user = identity.get("user")
@@ -45,6 +97,10 @@ def get_dashboard_data_from_db(db: Session, identity: dict, file_id: int | None,
         if not target_file:
             return {"file_id": None, "file_name": None, "rows": []}
 
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        return {"file_id": target_file.id, "file_name": target_file.filename, "rows": [], "status": target_file.status}
+
     # Step 2: Get column mapping for "order" analysis
     mapping_obj = (
         db.query(models.ColumnMapping)
@@ -59,8 +115,28 @@ def get_dashboard_data_from_db(db: Session, identity: dict, file_id: int | None,
     if not mapping_obj or "orderId" not in mapping_obj.mapping:
         return {"file_id": target_file.id, "file_name": target_file.filename, "rows": []}
 
-    order_col = mapping_obj.mapping["orderId"]
-    date_col = mapping_obj.mapping.get("OrderDate")  # optional fallback
+    result = get_latest_rows_from_db(db, target_file, mapping_obj.mapping, limit, identity)
+
+    return {
+        "file_id": target_file.id,
+        "file_name": target_file.filename,
+        "rows": result,
+    }
+
+def get_latest_rows_from_db(db: Session, target_file, mapping: dict, limit: int, identity: dict | None = None) -> list:
+
+    """
+    The `limit` latest order rows of a file, formatted for the latest-rows table: rows with an
+    order id, newest order date first (row id when no date is mapped).
+    `identity` adds the user/guest ownership filter.
+    """
+
+    user = identity.get("user") if identity else None
+    user_id = getattr(user, "id", None) if user else None
+    guest_id = identity.get("guest_id") if identity else None
+
+    order_col = mapping["orderId"]
+    date_col = mapping.get("orderDate") or mapping.get("OrderDate")  # optional fallback
 
     # Step 3: Query valid orders only
     query = db.query(models.FileRow).filter(
@@ -77,7 +153,20 @@ def get_dashboard_data_from_db(db: Session, identity: dict, file_id: int | None,
 
     # Step 4: Order by date if mapped, otherwise fallback to ID
     if date_col:
-        query = query.order_by(cast(models.FileRow.data.op("->>")(date_col), Date).desc())
+        date_column = (
+            db.query(models.FileColumn)
+            .filter(models.FileColumn.file_id == target_file.id, models.FileColumn.name == date_col)
+            .first()
+        )
+        if date_column and date_column.dtype == "datetime" and date_column.normalized:
+            # Stored as ISO text at ingest: text order is date order, and it matches the per-file date index
+            query = query.order_by(models.FileRow.data.op("->>")(date_col).collate("C").desc(), models.FileRow.id.desc())
+        else:
+            # Dates as uploaded: parse them, reading ambiguous ones the way the file writes them;
+            # blanks and text that is not a date sort last instead of failing the cast
+            if date_column and (date_column.format or "").startswith("%d"):
+                db.execute(text("SET LOCAL datestyle = 'ISO, DMY'"))
+            query = query.order_by(json_timestamp(date_col).desc().nulls_last(), models.FileRow.id.desc())
     else:
         query = query.order_by(models.FileRow.id.desc())
 
@@ -85,7 +174,7 @@ def get_dashboard_data_from_db(db: Session, identity: dict, file_id: int | None,
     rows = query.limit(limit).all()
 
     # Step 5: Format result
-    result = [
+    return [
         {
             "row_id": r.id,
             "file_id": r.file_id,
@@ -95,12 +184,6 @@ def get_dashboard_data_from_db(db: Session, identity: dict, file_id: int | None,
         for r in rows
     ]
 
-    return {
-        "file_id": target_file.id,
-        "file_name": target_file.filename,
-        "rows": result,
-    }
-
 def get_total_orders_count_data_from_db(db: Session, identity: dict, file_id: int | None = None) -> dict:
 
     """
@@ -137,28 +220,279 @@ def get_total_orders_count_data_from_db(db: Session, identity: dict, file_id: in
         if not target_file:
             return {"count": 0, "file_id": None}
 
-    # Step 2: Get order mapping
-    mapping_obj = (
-        db.query(ColumnMapping)
-        .filter(
-            ColumnMapping.file_id == target_file.id,
-            ColumnMapping.analysis_type == "order"
-        )
-        .order_by(ColumnMapping.updated_at.desc())
-        .first()
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        return {"file_id": target_file.id, "count": 0, "status": target_file.status}
+
+    # Step 2: Read the stored headline numbers (computed at ingest / mapping save)
+    count, _ = get_file_summary_from_db(db, target_file)["counters"].get("total_orders_count", (0, None))
+
+    return {"file_id": target_file.id, "count": count}
+
+def get_top_customers_data_from_db(db: Session, file_id: int, customer_key: str, amount_key: str | None, limit: int) -> list[dict]:
+
+    """
+    Group a file's rows by customer inside PostgreSQL and return the top `limit` groups as
+    {customer_key: customer, "orders": row count, "total_amount": summed amount (None without an amount column)}.
+    Rows without a customer are left out; amounts that are not numbers count as 0.
+    """
+
+    customer = json_value(customer_key)
+    orders = func.count().label("orders")
+    columns = [customer.label("customer"), orders]
+    order_by = []
+
+    if amount_key:
+        total_amount = func.coalesce(func.sum(json_numeric(amount_key)), 0).label("total_amount")
+        columns.append(total_amount)
+        order_by.append(total_amount.desc())
+    order_by += [orders.desc(), json_text(customer_key).collate("C")]
+
+    query = (
+        db.query(*columns)
+        .filter(FileRow.file_id == file_id)
+        .filter(func.jsonb_typeof(customer) != "null")
+        .group_by(customer, json_text(customer_key))
+        .order_by(*order_by)
+        .limit(limit)
     )
-    if not mapping_obj or "orderId" not in mapping_obj.mapping:
-        return {"count": 0, "file_id": target_file.id}
 
-    order_col = mapping_obj.mapping["orderId"]
+    return [
+        {
+            customer_key: r.customer,
+            "orders": r.orders,
+            "total_amount": float(r.total_amount) if amount_key else None,
+        }
+        for r in query.all()
+    ]
+
+def get_top_customers_data_from_rollup(db: Session, file_id: int, customer_key: str, with_amount: bool, limit: int) -> list[dict]:
+
+    """get_top_customers_data_from_db summed from the file's day x customer rollup instead of its rows."""
+
+    orders = func.sum(FileDailyCustomer.rows).label("orders")
+    columns = [FileDailyCustomer.customer, orders]
+    order_by = []
+
+    if with_amount:
+        total_amount = func.coalesce(func.sum(FileDailyCustomer.amount), 0).label("total_amount")
+        columns.append(total_amount)
+        order_by.append(total_amount.desc())
+    order_by += [orders.desc(), FileDailyCustomer.customer.op("#>>")(text("'{}'")).collate("C")]
+
+    query = (
+        db.query(*columns)
+        .filter(FileDailyCustomer.file_id == file_id)
+        .group_by(FileDailyCustomer.customer)
+        .order_by(*order_by)
+        .limit(limit)
+    )
+
+    return [
+        {
+            customer_key: r.customer,
+            "orders": int(r.orders),
+            "total_amount": float(r.total_amount) if with_amount else None,
+        }
+        for r in query.all()
+    ]
+
+def _present(column: str):
+    # Same test the dashboard cards use: the value exists and is not an empty string
+    return and_(json_text(column).isnot(None), json_text(column) != "")
+
+# Cards whose row counts and values add up over parts of a file, and ones counting distinct keys, which do not
+ADDITIVE_CARDS = {"total_orders_count", "total_sales"}
+DISTINCT_CARDS = {"total_customers", "total_products"}
+
+def get_summary_counters_from_db(
+    db: Session,
+    file_id: int,
+    order_mapping: dict,
+    product_mapping: dict,
+    cards: set | None = None,
+    rows: tuple | None = None,
+) -> dict:
+
+    """
+    Compute the four KPI cards in one pass over the file's rows, each aggregate restricted with FILTER
+    to the rows its standalone endpoint counts. Returns {card: (row_count, value)} for the cards the
+    mappings allow; cards missing from the result have nothing to count.
+    `cards` limits the pass to some of the cards and `rows` (first id, last id) to an id range.
+    """
+
+    aggregates = {}
+
+    order_col = order_mapping.get("orderId")
+    if order_col:
+        aggregates["total_orders_count"] = (func.count().filter(_present(order_col)), None)
+
+        amount_col = order_mapping.get("totalAmount")
+        price_col, qty_col = product_mapping.get("price"), product_mapping.get("quantity")
+        if amount_col:
+            condition = and_(_present(order_col), _present(amount_col))
+            amount = func.coalesce(json_numeric(amount_col), 0)
+        elif price_col and qty_col:
+            condition = _present(order_col)
+            amount = func.coalesce(json_numeric(price_col), 0) * func.coalesce(json_numeric(qty_col), 0)
+        else:
+            condition = None
+        if condition is not None:
+            aggregates["total_sales"] = (func.count().filter(condition), func.sum(amount).filter(condition))
+
+    name_col, phone_col = order_mapping.get("customerName"), order_mapping.get("customerPhone")
+    if order_mapping and (name_col or phone_col):
+        conditions = [_present(c) for c in (order_col, name_col, phone_col) if c]
+        if name_col and phone_col:
+            key = tuple_(json_value(name_col), json_value(phone_col))
+        else:
+            key = json_value(name_col or phone_col)
+        aggregates["total_customers"] = (func.count().filter(and_(*conditions)), func.count(distinct(key)).filter(and_(*conditions)))
+
+    if product_mapping:
+        product_col = product_mapping.get("productName") or list(product_mapping.values())[0]
+        condition = _present(product_col)
+        aggregates["total_products"] = (func.count().filter(condition), func.count(distinct(json_value(product_col))).filter(condition))
 
-    # Step 3: Count rows with non-empty order column
-    count = (
-        db.query(func.count(FileRow.id))
-        .join(UploadedFile, FileRow.file_id == UploadedFile.id)
-        .filter(FileRow.file_id == target_file.id)
-        .filter(FileRow.data[order_col].astext.isnot(None))
-        .filter(FileRow.data[order_col].astext != "")
-    ).scalar() or 0
+    if cards is not None:
+        aggregates = {card: pair for card, pair in aggregates.items() if card in cards}
+    if not aggregates:
+        return {}
+
+    columns = [agg for pair in aggregates.values() for agg in pair if agg is not None]
+    query = db.query(*columns).filter(FileRow.file_id == file_id)
+    if rows is not None:
+        query = query.filter(FileRow.id.between(*rows))
+    values = iter(query.one())
+    return {
+        card: (next(values), next(values) if value is not None else None)
+        for card, (_, value) in aggregates.items()
+    }
+
+def _merge_summary(summary, delta: dict, distinct: dict, span: tuple) -> tuple:
+    """Counters and order date span of `summary` plus the rows behind `delta`; distinct cards are taken as recounted."""
+    counters = dict(distinct)
+    for card, (row_count, value) in delta.items():
+        old_count, old_value = summary.counters[card]
+        if value is None:
+            value = old_value
+        elif old_value is not None:
+            value = old_value + value
+        counters[card] = [old_count + row_count, value]
+
+    first, last = span
+    first_order_at = min((d for d in (summary.first_order_at, first) if d is not None), default=None)
+    last_order_at = max((d for d in (summary.last_order_at, last) if d is not None), default=None)
+    return counters, first_order_at, last_order_at
+
+def refresh_file_summary_in_db(db: Session, file_id: int, appended_after: int | None = None) -> dict:
+
+    """
+    Compute a file's headline numbers (the four KPI cards and the order date span) for its current
+    version and upsert them into file_summaries. Runs inside the caller's transaction, so a version
+    bump and the summary it calls for are committed together; the caller commits.
+    After an append, pass the file's last row id from before it (`appended_after`): when the stored
+    summary covers exactly those rows, counts, sums and the date span are merged from the new rows
+    and only the distinct counts are recomputed over the whole file.
+    """
+
+    db.flush()
+    version = db.query(UploadedFile.version).filter(UploadedFile.id == file_id).scalar()
+    order_mapping = get_latest_mapping(db, file_id, "order")
+    product_mapping = get_latest_mapping(db, file_id, "product")
+    row_id = db.query(func.max(FileRow.id)).filter(FileRow.file_id == file_id).scalar() or 0
+
+    def counters_for(cards, rows):
+        return {
+            card: [row_count, float(value) if card == "total_sales" and value is not None else value]
+            for card, (row_count, value) in get_summary_counters_from_db(
+                db, file_id, order_mapping, product_mapping, cards, rows
+            ).items()
+        }
+
+    # Step 1: Merge the appended rows into the stored summary, or start over
+    summary = None
+    if appended_after is not None:
+        stored = db.query(FileSummary).filter(FileSummary.file_id == file_id).first()
+        if stored is not None and stored.row_id is not None and stored.row_id <= appended_after:
+            rows = (stored.row_id + 1, row_id)
+            delta = counters_for(ADDITIVE_CARDS, rows)
+            distinct = counters_for(DISTINCT_CARDS, (0, row_id))
+            # Cards that come and go mean the stored summary was made for other mappings
+            if set(delta) | set(distinct) == set(stored.counters):
+                summary = stored
+    if summary is None:
+        rows = (0, row_id)
+        counters = counters_for(None, rows)
+
+    # Step 2: Order date span
+    span = (None, None)
+    date_col = order_mapping.get("orderDate")
+    if date_col:
+        date_format = (
+            db.query(FileColumn.format)
+            .filter(FileColumn.file_id == file_id, FileColumn.name == date_col)
+            .scalar()
+        )
+        # Ambiguous dates like 03/04/2024 are read the way the file writes them
+        if (date_format or "").startswith("%d"):
+            db.execute(text("SET LOCAL datestyle = 'ISO, DMY'"))
+        order_date = json_timestamp(date_col)
+        span = (
+            db.query(func.min(order_date), func.max(order_date))
+            .filter(FileRow.file_id == file_id, FileRow.id.between(*rows))
+            .one()
+        )
+
+    if summary:
+        counters, first_order_at, last_order_at = _merge_summary(summary, delta, distinct, span)
+    else:
+        first_order_at, last_order_at = span
+
+    record = {
+        "version": version,
+        "counters": counters,
+        "first_order_at": first_order_at,
+        "last_order_at": last_order_at,
+        "row_id": row_id,
+        "computed_at": datetime.utcnow(),
+    }
+    # A slower refresh of an older version never overwrites a newer summary
+    stmt = insert(FileSummary).values(file_id=file_id, **record)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[FileSummary.file_id],
+        set_=record,
+        where=FileSummary.version <= stmt.excluded.version,
+    ))
+    return record
+
+def get_file_summary_from_db(db: Session, target_file) -> dict:
+
+    """
+    A file's stored headline numbers: one primary-key read while they match the file's version.
+    Files ingested before summaries existed (or whose summary is stale) get it computed once here,
+    in a short session of its own.
+    """
+
+    summary = (
+        db.query(FileSummary)
+        .filter(FileSummary.file_id == target_file.id, FileSummary.version == target_file.version)
+        .first()
+    )
+    if summary:
+        return {
+            "version": summary.version,
+            "counters": summary.counters,
+            "first_order_at": summary.first_order_at,
+            "last_order_at": summary.last_order_at,
+            "computed_at": summary.computed_at,
+        }
 
-    return {"file_id": target_file.id, "count": count}
\ No newline at end of file
+    # In a session of its own: a GET must not commit whatever the caller's session holds
+    summary_db = SessionLocal()
+    try:
+        record = refresh_file_summary_in_db(summary_db, target_file.id)
+        summary_db.commit()
+    finally:
+        summary_db.close()
+    return record
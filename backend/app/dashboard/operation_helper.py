@@ -1,11 +1,18 @@
 from fastapi import Depends, Query
-from app.dashboard.db_helper import get_dashboard_data_from_db, get_total_orders_count_data_from_db
+from app.dashboard.db_helper import (
+    get_dashboard_data_from_db, get_total_orders_count_data_from_db, get_top_customers_data_from_db,
+    get_latest_rows_from_db, get_latest_mapping, resolve_target_file,
+    get_top_customers_data_from_rollup, get_file_summary_from_db,
+)
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 import pandas as pd
 from app import models
 from app.dashboard.llm_helper import infer_columns_with_llm, infer_unique_id_column_with_llm
 from app.customer.db_helper import fetch_file_rows
+from app.dataset.operation_helper import list_file_columns, match_columns
+from app.dataset.cache_helper import cached_analytics
+from app.dataset.rollup_helper import current_rollup_columns
 from app.database import get_db
 from app.utils.deps import get_identity
 from app.models import *
@@ -87,37 +94,6 @@ def _safe_sample_values(df: pd.DataFrame, per_col: int = 5) -> Dict[str, List[st
     samples[col] = masked
   return samples
 
-def _aggregate_top_customers(df: pd.DataFrame, customer_col: str, amount_col: str | None, limit: int) -> list[dict]:
-    # Normalize column names
-    if customer_col:
-        customer_col = str(customer_col).strip().lower().replace(" ", "_")
-    if amount_col:
-        amount_col = str(amount_col).strip().lower().replace(" ", "_")
-
-    # Coerce amount to numeric
-    if amount_col and amount_col in df.columns:
-        df[amount_col] = pd.to_numeric(df[amount_col], errors="coerce")
-
-    # Ensure customer column exists
-    if customer_col not in df.columns:
-        print("⚠️ Customer column not found in DataFrame:", df.columns.tolist())
-        return []
-
-    grp = df.groupby(customer_col, dropna=True)
-
-    if amount_col and amount_col in df.columns:
-        agg = grp.agg(
-            orders=(customer_col, "count"),
-            total_amount=(amount_col, "sum")
-        ).reset_index()
-        agg = agg.sort_values(by=["total_amount", "orders"], ascending=False)
-    else:
-        agg = grp.agg(orders=(customer_col, "count")).reset_index()
-        agg["total_amount"] = None
-        agg = agg.sort_values(by=["orders"], ascending=False)
-
-    return agg.head(limit).to_dict(orient="records")
-
 def get_top_customers(db: Session, identity: dict, limit: int = 5, file_id: int | None = None) -> dict:
     user = identity.get("user")
     guest_id = identity.get("guest_id")
@@ -153,6 +129,10 @@ def get_top_customers(db: Session, identity: dict, limit: int = 5, file_id: int
         if not target_file:
             return {"file_id": None, "customer_column": None, "amount_column": None, "rows": []}
 
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        return {"file_id": target_file.id, "customer_column": None, "amount_column": None, "rows": [], "status": target_file.status}
+
     # Step 2: Get column mapping for "order" analysis
     mapping_obj = (
         db.query(ColumnMapping)
@@ -164,51 +144,42 @@ def get_top_customers(db: Session, identity: dict, limit: int = 5, file_id: int
     customer_col = mapping_obj.mapping.get("customerName") if mapping_obj else None
     amount_col = mapping_obj.mapping.get("totalAmount") if mapping_obj else None
 
-    # Step 3: Query FileRows for this file and user/guest
-    query = db.query(FileRow).filter(FileRow.file_id == target_file.id)
-    if user:
-        query = query.join(UploadedFile).filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.join(UploadedFile).filter(UploadedFile.guest_id == guest_id)
-
-    rows = query.all()
-    if not rows:
-        return {"file_id": target_file.id, "customer_column": customer_col, "amount_column": amount_col, "rows": []}
-
-    # Step 4: Convert rows to DataFrame
-    df = pd.DataFrame([r.data for r in rows])
-    if df.empty:
-        return {"file_id": target_file.id, "customer_column": customer_col, "amount_column": amount_col, "rows": []}
-
-    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
-    df = df.where(pd.notnull(df), None)
-
-    # Step 5: Aggregate top customers strictly using column mapping
+    # Step 3: Resolve the mapped names to the file's actual columns
     if not customer_col:
         return {"file_id": target_file.id, "customer_column": None, "amount_column": amount_col, "rows": []}
 
-    result = _aggregate_top_customers(df, customer_col, amount_col, limit)
+    return {
+        "file_id": target_file.id,
+        "customer_column": customer_col,
+        "amount_column": amount_col,
+        "rows": _top_customer_rows(db, target_file, customer_col, amount_col, limit),
+    }
 
-    # Rename result keys dynamically
+def _top_customer_rows(db: Session, target_file, customer_col: str, amount_col: str | None, limit: int) -> list[dict]:
+    available = list_file_columns(db, target_file.id)
+    customer_keys = match_columns(available, [customer_col], normalize_key)
+    amount_keys = match_columns(available, [amount_col], normalize_key)
+    if not customer_keys:
+        return []
+    amount_key = amount_keys[0] if amount_keys else None
+
+    # Step 4: Aggregate top customers in the database (ownership was checked in step 1),
+    # from the day x customer rollup when it was built from these same columns
+    rollup = current_rollup_columns(db, target_file)
+    if rollup and (rollup["customer"], rollup["customer_amount"]) == (customer_keys[0], amount_key):
+        result = get_top_customers_data_from_rollup(db, target_file.id, customer_keys[0], bool(amount_key), limit)
+    else:
+        result = get_top_customers_data_from_db(db, target_file.id, customer_keys[0], amount_key, limit)
+
+    # Step 5: Rename result keys to the mapped column names
     pretty_rows = []
     for row in result:
-        renamed = {}
-        # get normalized names
-        cust_key = str(customer_col).strip().lower().replace(" ", "_")
-        amt_key = str(amount_col).strip().lower().replace(" ", "_") if amount_col else None
-
-        renamed[customer_col] = row.get(cust_key) or row.get("customer") or row.get("customer_col_name")
+        renamed = {customer_col: row.get(customer_keys[0])}
         if amount_col:
-            renamed[amount_col] = row.get("total_amount") or row.get(amt_key)
+            renamed[amount_col] = row.get("total_amount")
         renamed["Orders"] = row.get("orders")
         pretty_rows.append(renamed)
-
-    return {
-        "file_id": target_file.id,
-        "customer_column": customer_col,
-        "amount_column": amount_col,
-        "rows": pretty_rows,
-    }
+    return pretty_rows
 
 JUNK_KEYWORDS = [
     "total", "grand total", "subtotal", "summary",
@@ -270,77 +241,18 @@ def get_total_sales(db: Session = Depends(get_db), identity: dict = Depends(get_
         if not target_file:
             return {"file_id": None, "total_sales": 0.0, "row_count": 0}
 
-    # Step 2: Get both mappings (order & product)
-    order_mapping = (
-        db.query(ColumnMapping)
-        .filter(ColumnMapping.file_id == target_file.id, ColumnMapping.analysis_type == "order")
-        .order_by(ColumnMapping.updated_at.desc())
-        .first()
-    )
-    product_mapping = (
-        db.query(ColumnMapping)
-        .filter(ColumnMapping.file_id == target_file.id, ColumnMapping.analysis_type == "product")
-        .order_by(ColumnMapping.updated_at.desc())
-        .first()
-    )
-
-    if not order_mapping or "orderId" not in order_mapping.mapping:
-        return {"file_id": target_file.id, "total_sales": 0.0, "row_count": 0}
-
-    order_col = order_mapping.mapping["orderId"]
-
-    # Step 3: Determine how to calculate amount
-    amount_col = order_mapping.mapping.get("totalAmount")
-    use_product_calculation = False
-    price_col, qty_col = None, None
-
-    if not amount_col:
-        # Check if product mapping exists and has both price and quantity
-        if product_mapping:
-            price_col = product_mapping.mapping.get("price")
-            qty_col = product_mapping.mapping.get("quantity")
-            if price_col and qty_col:
-                use_product_calculation = True
-
-    if not amount_col and not use_product_calculation:
-        return {"file_id": target_file.id, "total_sales": 0.0, "row_count": 0}
-
-    # Step 4: Query file rows
-    query = db.query(FileRow).join(UploadedFile, FileRow.file_id == UploadedFile.id).filter(FileRow.file_id == target_file.id)
-
-    if user:
-        query = query.filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.filter(UploadedFile.guest_id == guest_id)
-
-    query = query.filter(FileRow.data[order_col].astext.isnot(None))
-    query = query.filter(FileRow.data[order_col].astext != "")
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        return {"file_id": target_file.id, "total_sales": 0.0, "row_count": 0, "status": target_file.status}
 
-    if amount_col:
-        query = query.filter(FileRow.data[amount_col].astext.isnot(None))
-        query = query.filter(FileRow.data[amount_col].astext != "")
-
-    rows = query.all()
-    row_count = len(rows)
-    if row_count == 0:
+    # Step 2: Read the stored headline numbers (computed at ingest / mapping save)
+    row_count, total_sales = get_file_summary_from_db(db, target_file)["counters"].get("total_sales", (0, None))
+    if not row_count:
         return {"file_id": target_file.id, "total_sales": 0.0, "row_count": 0}
 
-    # Step 5: Compute total sales
-    if use_product_calculation:
-        total_sales = 0.0
-        for r in rows:
-            try:
-                price = float(r.data.get(price_col) or 0.0)
-                qty = float(r.data.get(qty_col) or 0.0)
-                total_sales += price * qty
-            except (TypeError, ValueError):
-                continue
-    else:
-        total_sales = sum(float(r.data.get(amount_col) or 0.0) for r in rows)
-
     return {
         "file_id": target_file.id,
-        "total_sales": round(total_sales, 3),
+        "total_sales": round(float(total_sales), 3),
         "row_count": row_count
     }
 
@@ -381,64 +293,15 @@ def get_total_customers(db: Session, identity: dict, file_id: int | None = None)
         if not target_file:
             return {"file_id": None, "total_customers": 0, "row_count": 0}
 
-    # Step 2: Get column mapping for "order" analysis
-    mapping_obj = (
-        db.query(ColumnMapping)
-        .filter(ColumnMapping.file_id == target_file.id, ColumnMapping.analysis_type == "order")
-        .order_by(ColumnMapping.updated_at.desc())
-        .first()
-    )
-    if not mapping_obj:
-        return {"file_id": target_file.id, "total_customers": 0, "row_count": 0}
-
-    customer_name_col = mapping_obj.mapping.get("customerName")
-    customer_phone_col = mapping_obj.mapping.get("customerPhone")
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        return {"file_id": target_file.id, "total_customers": 0, "row_count": 0, "status": target_file.status}
 
-    if not customer_name_col and not customer_phone_col:
+    # Step 2: Read the stored headline numbers (computed at ingest / mapping save)
+    row_count, unique_customers = get_file_summary_from_db(db, target_file)["counters"].get("total_customers", (0, None))
+    if not row_count:
         return {"file_id": target_file.id, "total_customers": 0, "row_count": 0}
 
-    # Step 3: Query FileRows for this file and user/guest
-    query = db.query(FileRow).join(UploadedFile, FileRow.file_id == UploadedFile.id).filter(FileRow.file_id == target_file.id)
-    if user:
-        query = query.filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.filter(UploadedFile.guest_id == guest_id)
-
-    # Step 4: Filter rows with valid orderId if exists
-    if "orderId" in mapping_obj.mapping:
-        order_col = mapping_obj.mapping["orderId"]
-        query = query.filter(FileRow.data[order_col].astext.isnot(None), FileRow.data[order_col].astext != "")
-
-    # Filter valid name/phone
-    if customer_name_col:
-        query = query.filter(FileRow.data[customer_name_col].astext.isnot(None), FileRow.data[customer_name_col].astext != "")
-    if customer_phone_col:
-        query = query.filter(FileRow.data[customer_phone_col].astext.isnot(None), FileRow.data[customer_phone_col].astext != "")
-
-    rows = query.all()
-    row_count = len(rows)
-    if row_count == 0:
-        return {"file_id": target_file.id, "total_customers": 0, "row_count": 0}
-
-    # Step 5: Count unique customers based on available keys
-    if customer_name_col and customer_phone_col:
-        # Use composite key
-        unique_customers = len(set(
-            (r.data.get(customer_name_col), r.data.get(customer_phone_col)) 
-            for r in rows
-            if r.data.get(customer_name_col) or r.data.get(customer_phone_col)
-        ))
-    elif customer_phone_col:
-        # Use phone only
-        unique_customers = len(set(
-            r.data.get(customer_phone_col) for r in rows if r.data.get(customer_phone_col)
-        ))
-    else:
-        # Use name only
-        unique_customers = len(set(
-            r.data.get(customer_name_col) for r in rows if r.data.get(customer_name_col)
-        ))
-
     return {
         "file_id": target_file.id,
         "total_customers": unique_customers,
@@ -491,40 +354,15 @@ def get_total_products(db: Session, identity: dict, file_id: int | None = None)
         if not target_file:
             return {"file_id": None, "total_products": 0, "row_count": 0}
 
-    # Step 2: Get column mapping for "product" analysis
-    mapping_obj = (
-        db.query(ColumnMapping)
-        .filter(ColumnMapping.file_id == target_file.id, ColumnMapping.analysis_type == "product")
-        .order_by(ColumnMapping.updated_at.desc())
-        .first()
-    )
-    if not mapping_obj or not mapping_obj.mapping:
-        return {"file_id": target_file.id, "total_products": 0, "row_count": 0}
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        return {"file_id": target_file.id, "total_products": 0, "row_count": 0, "status": target_file.status}
 
-    product_col = mapping_obj.mapping.get("productName")
-    if not product_col:
-        # fallback: pick first column in mapping
-        product_col = list(mapping_obj.mapping.values())[0]
-
-    # Step 3: Query FileRows for this file and user/guest
-    query = db.query(FileRow).join(UploadedFile, FileRow.file_id == UploadedFile.id).filter(FileRow.file_id == target_file.id)
-    if user:
-        query = query.filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.filter(UploadedFile.guest_id == guest_id)
-
-    # Step 4: Only consider rows with valid product value
-    query = query.filter(FileRow.data[product_col].astext.isnot(None))
-    query = query.filter(FileRow.data[product_col].astext != "")
-
-    rows = query.all()
-    row_count = len(rows)
-    if row_count == 0:
+    # Step 2: Read the stored headline numbers (computed at ingest / mapping save)
+    row_count, unique_products = get_file_summary_from_db(db, target_file)["counters"].get("total_products", (0, None))
+    if not row_count:
         return {"file_id": target_file.id, "total_products": 0, "row_count": 0}
 
-    # Step 5: Count unique products
-    unique_products = len(set(r.data.get(product_col) for r in rows if r.data.get(product_col)))
-
     return {
         "file_id": target_file.id,
         "total_products": unique_products,
@@ -535,4 +373,75 @@ def get_total_orders_count(db: Session, identity: dict, file_id: Optional[int] =
 
   total_orders_count_data = get_total_orders_count_data_from_db(db, identity, file_id)
 
-  return total_orders_count_data
\ No newline at end of file
+  return total_orders_count_data
+
+@cached_analytics("dashboard-summary")
+def get_dashboard_summary(db: Session, identity: dict, file_id: Optional[int] = None, limit: int = 5) -> Dict[str, Any]:
+
+    """
+    Everything the dashboard page shows for one file: the four KPI cards, top customers and
+    latest rows, each under its own key in the same shape as its standalone endpoint.
+    The file and its mappings are resolved once and the KPI cards come from the stored file summary.
+    """
+
+    # Step 1: Resolve the target file once
+    target_file = resolve_target_file(db, identity, file_id)
+    target_id = target_file.id if target_file else None
+    file_name = target_file.filename if target_file else None
+
+    summary = {
+        "file_id": target_id,
+        "file_name": file_name,
+        "total_orders_count": {"file_id": target_id, "count": 0},
+        "total_sales": {"file_id": target_id, "total_sales": 0.0, "row_count": 0},
+        "total_customers": {"file_id": target_id, "total_customers": 0, "row_count": 0},
+        "total_products": {"file_id": target_id, "total_products": 0, "row_count": 0},
+        "top_customers": {"file_id": target_id, "customer_column": None, "amount_column": None, "rows": []},
+        "latest_rows": {"file_id": target_id, "file_name": file_name, "rows": []},
+    }
+    if not target_file:
+        return summary
+
+    # File is still being ingested (or ingestion failed): report that instead of empty results
+    if target_file.status != "ready":
+        summary["status"] = target_file.status
+        for key in ("total_orders_count", "total_sales", "total_customers", "total_products", "top_customers", "latest_rows"):
+            summary[key]["status"] = target_file.status
+        return summary
+
+    # Step 2: Get the order mapping once
+    order_mapping = get_latest_mapping(db, target_file.id, "order")
+
+    # Step 3: KPI cards from the stored headline numbers
+    file_summary = get_file_summary_from_db(db, target_file)
+    counters = file_summary["counters"]
+    if "total_orders_count" in counters:
+        summary["total_orders_count"]["count"] = counters["total_orders_count"][0]
+    if counters.get("total_sales", (0, None))[0]:
+        row_count, total_sales = counters["total_sales"]
+        summary["total_sales"].update(total_sales=round(float(total_sales), 3), row_count=row_count)
+    if counters.get("total_customers", (0, None))[0]:
+        row_count, total_customers = counters["total_customers"]
+        summary["total_customers"].update(total_customers=total_customers, row_count=row_count)
+    if counters.get("total_products", (0, None))[0]:
+        row_count, total_products = counters["total_products"]
+        summary["total_products"].update(total_products=total_products, row_count=row_count)
+
+    first_order_at, last_order_at = file_summary["first_order_at"], file_summary["last_order_at"]
+    summary["date_span"] = {
+        "first_order_at": first_order_at.isoformat() if first_order_at else None,
+        "last_order_at": last_order_at.isoformat() if last_order_at else None,
+    }
+
+    # Step 4: Top customers
+    customer_col = order_mapping.get("customerName")
+    amount_col = order_mapping.get("totalAmount")
+    summary["top_customers"].update(customer_column=customer_col, amount_column=amount_col)
+    if customer_col:
+        summary["top_customers"]["rows"] = _top_customer_rows(db, target_file, customer_col, amount_col, limit)
+
+    # Step 5: Latest rows
+    if "orderId" in order_mapping:
+        summary["latest_rows"]["rows"] = get_latest_rows_from_db(db, target_file, order_mapping, limit)
+
+    return summary
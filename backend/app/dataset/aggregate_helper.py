@@ -0,0 +1,155 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+import pandas as pd
+import multiprocessing
+import threading
+import logging
+import os
+from app.dataset.operation_helper import iter_file_frames, file_partitions
+
+logger = logging.getLogger(__name__)
+
+# Files with more rows than this are aggregated batch by batch (map-reduce over iter_file_frames)
+# instead of being loaded into one DataFrame
+LARGE_FILE_ROWS = int(os.getenv("LARGE_FILE_ROWS", "500000"))
+
+# API worker processes per node (gunicorn --workers, see the Dockerfile); each one has its own pool
+API_WORKERS = int(os.getenv("WEB_CONCURRENCY", "3"))
+# Large-file aggregations are split across this many worker processes (per API worker); 1 runs them in-process.
+# The default shares the node's CPUs between the API workers' pools.
+# Small files never use the pool, so they do not queue behind large ones.
+ANALYTICS_PROCESSES = int(os.getenv("ANALYTICS_PROCESSES", str(max(1, (os.cpu_count() or 1) // max(1, API_WORKERS)))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Partial aggregates are combined with these: counts add up, sums add up, max of maxes, min of mins.
+# Only aggregations in here can be computed batch by batch (means are sum / count at the end).
+MERGE_FUNCS = {"size": "sum", "count": "sum", "sum": "sum", "max": "max", "min": "min"}
+
+def is_large_file(target_file) -> bool:
+    """Whether a file is too big to aggregate as a single in-memory DataFrame (LARGE_FILE_ROWS)."""
+    return (target_file.total_rows or 0) > LARGE_FILE_ROWS
+
+def plain_value(value):
+    """A group key / aggregate as a JSON-friendly Python value: numpy scalars unboxed, NaN/NaT as None."""
+    if value is None or (not isinstance(value, (list, tuple, dict)) and pd.isna(value)):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+def group_partial(frame: pd.DataFrame, by: List[str], aggs: Dict[str, Tuple[str, str]], dropna: bool = True) -> pd.DataFrame:
+    """
+    frame.groupby(by).agg(**aggs) for one batch of rows: a partial aggregate indexed by the group keys.
+    `aggs` maps output names to (column, func) with func in MERGE_FUNCS.
+    """
+    for name, (_, func) in aggs.items():
+        if func not in MERGE_FUNCS:
+            raise ValueError(f"{name}: {func!r} cannot be merged across batches.")
+    return frame.groupby(by, dropna=dropna).agg(**aggs)
+
+def merge_group_partials(partials: Iterable[Optional[pd.DataFrame]], aggs: Dict[str, Tuple[str, str]], dropna: bool = True) -> Optional[pd.DataFrame]:
+    """Combine partial aggregates of the same `aggs` into one, as if the batches had been grouped together."""
+    parts = [p for p in partials if p is not None]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    merged = pd.concat(parts)
+    return merged.groupby(level=list(range(merged.index.nlevels)), dropna=dropna).agg(
+        **{name: (name, MERGE_FUNCS[func]) for name, (_, func) in aggs.items()}
+    )
+
+def stream_group_aggregate(
+    frames: Iterable[pd.DataFrame],
+    by: List[str],
+    aggs: Dict[str, Tuple[str, str]],
+    prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    dropna: bool = True,
+) -> Optional[pd.DataFrame]:
+    """
+    Group-by over a stream of batches (app/dataset/operation_helper.py: iter_file_frames):
+    each batch is cleaned by `prepare` and grouped, and the batch partials are folded into the running one
+    once they outgrow it, so memory stays bounded by a batch plus about twice the number of groups while
+    each group is regrouped only O(log batches) times. None when there were no rows.
+    """
+    running = None
+    pending, pending_rows = [], 0
+    for frame in frames:
+        if prepare is not None:
+            frame = prepare(frame)
+        if frame.empty:
+            continue
+        part = group_partial(frame, by, aggs, dropna)
+        pending.append(part)
+        pending_rows += len(part)
+        if pending_rows >= (len(running) if running is not None else 0):
+            running = merge_group_partials([running, *pending], aggs, dropna)
+            pending, pending_rows = [], 0
+    return merge_group_partials([running, *pending], aggs, dropna)
+
+def top_n(partial: Optional[pd.DataFrame], order_by: List[str], n: int) -> pd.DataFrame:
+    """
+    The `n` largest groups of a merged partial by `order_by` (descending), keys as columns.
+    Top-N is taken after merging: per-batch top lists cannot be combined exactly.
+    """
+    if partial is None:
+        return pd.DataFrame()
+    return partial.sort_values(by=order_by, ascending=False).head(n).reset_index()
+
+def _analytics_pool() -> ProcessPoolExecutor:
+    # "spawn": forking a threaded server process could copy held locks and open DB connections
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=ANALYTICS_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # A pool with a dead child (e.g. OOM-killed) is broken for good: the next call starts a fresh one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _aggregate_partition(file_id: int, columns: List[str], partition: dict, by: List[str], aggs: dict, prepare, dropna: bool) -> Optional[pd.DataFrame]:
+    """Runs in a pool process: the partial aggregate of one partition, read with its own session."""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return stream_group_aggregate(iter_file_frames(db, file_id, columns, partition=partition), by, aggs, prepare, dropna)
+    finally:
+        db.close()
+
+def parallel_group_aggregate(
+    db: Session,
+    file_id: int,
+    columns: List[str],
+    by: List[str],
+    aggs: Dict[str, Tuple[str, str]],
+    prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    dropna: bool = True,
+) -> Optional[pd.DataFrame]:
+    """
+    stream_group_aggregate over a whole file, with the file split into partitions (file_partitions) that
+    the analytics process pool aggregates in parallel; the partials are merged here.
+    `prepare` is sent to the pool, so it has to be picklable: a module-level function or a functools.partial of one.
+    Without a pool (ANALYTICS_PROCESSES = 1), for a single partition, or if the pool fails, it runs in-process;
+    a broken pool is replaced on the next call.
+    """
+    partitions = file_partitions(db, file_id, ANALYTICS_PROCESSES) if ANALYTICS_PROCESSES > 1 else []
+    if len(partitions) > 1:
+        pool = _analytics_pool()
+        try:
+            futures = [pool.submit(_aggregate_partition, file_id, columns, p, by, aggs, prepare, dropna) for p in partitions]
+            return merge_group_partials([f.result() for f in futures], aggs, dropna)
+        except BrokenProcessPool:
+            logger.exception("Analytics pool broke while aggregating file %s, aggregating in-process", file_id)
+            _discard_pool(pool)
+        except Exception:
+            logger.exception("Parallel aggregation of file %s failed, aggregating in-process", file_id)
+
+    return stream_group_aggregate(iter_file_frames(db, file_id, columns), by, aggs, prepare, dropna)
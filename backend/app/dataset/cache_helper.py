@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import pandas as pd
+import functools
+import threading
+import hashlib
+import inspect
+import logging
+import json
+import math
+import time
+import os
+from app.models import UploadedFile, AnalyticsCache
+from app.database import engine
+from app.dashboard.db_helper import resolve_target_file
+
+logger = logging.getLogger(__name__)
+
+# Decoded per-file frames kept in this worker process, least recently used evicted first
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Computed analytics results shared by every worker through the UNLOGGED analytics_cache table
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "600"))  # seconds
+ANALYTICS_CACHE_MAX_BYTES = int(os.getenv("ANALYTICS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ANALYTICS_CACHE_MAX_ENTRY_BYTES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+# Each worker trims the table at most this often (seconds)
+ANALYTICS_CACHE_TRIM_INTERVAL = int(os.getenv("ANALYTICS_CACHE_TRIM_INTERVAL", "30"))
+
+# pg_try_advisory_xact_lock(namespace, 0): one trim at a time across all workers
+_CACHE_TRIM_LOCK_NAMESPACE = 17
+
+_frames: "OrderedDict[tuple, tuple[pd.DataFrame, int]]" = OrderedDict()
+_frames_bytes = 0
+_lock = threading.Lock()
+_last_trim = float("-inf")
+
+def file_version(db: Session, file_id: int) -> Optional[int]:
+    """Current version of a file (None when it does not exist)."""
+    return db.query(UploadedFile.version).filter(UploadedFile.id == file_id).scalar()
+
+def bump_file_version(db: Session, file_id: int) -> None:
+    """
+    Mark a file's rows/mappings as changed. Frames and results cached under the old version,
+    in any worker, are never served again; the caller commits.
+    """
+    db.query(UploadedFile).filter(UploadedFile.id == file_id).update(
+        {UploadedFile.version: UploadedFile.version + 1}, synchronize_session=False
+    )
+    invalidate_file_results(db, file_id)
+    invalidate_file_frames(file_id)
+
+def get_cached_frame(key: tuple) -> Optional[pd.DataFrame]:
+    """A copy of the frame cached under `key` (callers are free to modify it), or None."""
+    with _lock:
+        entry = _frames.get(key)
+        if entry is None:
+            return None
+        _frames.move_to_end(key)
+        return entry[0].copy()
+
+def put_cached_frame(key: tuple, df: pd.DataFrame) -> None:
+    """Cache a copy of `df` under `key`; frames larger than the whole budget are not kept."""
+    global _frames_bytes
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    if size > FRAME_CACHE_MAX_BYTES:
+        return
+    df = df.copy()
+    with _lock:
+        if key in _frames:
+            _frames_bytes -= _frames.pop(key)[1]
+        _frames[key] = (df, size)
+        _frames_bytes += size
+        while _frames_bytes > FRAME_CACHE_MAX_BYTES:
+            _, (_, evicted) = _frames.popitem(last=False)
+            _frames_bytes -= evicted
+
+def invalidate_file_frames(file_id: int) -> None:
+    """Drop every frame cached in this process for `file_id` (keys start with the file id)."""
+    global _frames_bytes
+    with _lock:
+        for key in [k for k in _frames if k[0] == file_id]:
+            _frames_bytes -= _frames.pop(key)[1]
+
+def result_cache_key(name: str, file_id: int, version: int, arguments: dict) -> str:
+    payload = json.dumps([name, file_id, version, arguments], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_cached_result(key: str):
+    """The unexpired result stored under `key`, or None."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                text("SELECT value FROM analytics_cache WHERE key = :key AND expires_at > :now"),
+                {"key": key, "now": datetime.utcnow()},
+            ).scalar()
+    except Exception:
+        logger.warning("Reading analytics cache entry %s failed", key, exc_info=True)
+        return None
+
+def _finite(value):
+    """A jsonable_encoder result with NaN and infinities replaced by None, as JSON has no such numbers."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_finite(v) for v in value]
+    return value
+
+def put_cached_result(key: str, name: str, file_id: int, result) -> None:
+    """
+    Store a result for ANALYTICS_CACHE_TTL seconds, then trim the table (see trim_cached_results).
+    Results that do not serialize to JSON, or are larger than ANALYTICS_CACHE_MAX_ENTRY_BYTES,
+    are not stored; NaN and infinities are stored as null.
+    """
+    try:
+        value = json.dumps(_finite(jsonable_encoder(result)), allow_nan=False)
+    except (TypeError, ValueError):
+        return
+    if len(value) > ANALYTICS_CACHE_MAX_ENTRY_BYTES:
+        return
+
+    now = datetime.utcnow()
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO analytics_cache (key, file_id, name, value, size_bytes, created_at, expires_at)
+                    VALUES (:key, :file_id, :name, CAST(:value AS jsonb), :size, :now, :expires_at)
+                    ON CONFLICT (key) DO UPDATE SET
+                        value = EXCLUDED.value, size_bytes = EXCLUDED.size_bytes,
+                        created_at = EXCLUDED.created_at, expires_at = EXCLUDED.expires_at
+                """),
+                {
+                    "key": key, "file_id": file_id, "name": name, "value": value, "size": len(value),
+                    "now": now, "expires_at": now + timedelta(seconds=ANALYTICS_CACHE_TTL),
+                },
+            )
+    except Exception:
+        # Another worker may have deleted the file meanwhile; the cache is best effort
+        logger.warning("Writing analytics cache entry %s failed", key, exc_info=True)
+        return
+    trim_cached_results()
+
+def trim_cached_results() -> None:
+    """
+    Delete expired entries, then the oldest ones beyond ANALYTICS_CACHE_MAX_BYTES.
+    Runs at most every ANALYTICS_CACHE_TRIM_INTERVAL seconds per worker, in its own
+    transaction, and only in the worker holding the trim lock, so trims never queue up or deadlock.
+    The whole-table size window is only computed when the table is over budget.
+    """
+    global _last_trim
+    with _lock:
+        if time.monotonic() - _last_trim < ANALYTICS_CACHE_TRIM_INTERVAL:
+            return
+        _last_trim = time.monotonic()
+
+    try:
+        with engine.begin() as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:namespace, 0)"), {"namespace": _CACHE_TRIM_LOCK_NAMESPACE}).scalar():
+                return
+            # Through ix_analytics_cache_expires_at
+            conn.execute(text("DELETE FROM analytics_cache WHERE expires_at < :now"), {"now": datetime.utcnow()})
+            total = conn.execute(text("SELECT coalesce(sum(size_bytes), 0) FROM analytics_cache")).scalar()
+            if total <= ANALYTICS_CACHE_MAX_BYTES:
+                return
+            conn.execute(
+                text("""
+                    DELETE FROM analytics_cache WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, sum(size_bytes) OVER (ORDER BY created_at DESC, key) AS kept
+                            FROM analytics_cache
+                        ) newest WHERE kept > :max_bytes
+                    )
+                """),
+                {"max_bytes": ANALYTICS_CACHE_MAX_BYTES},
+            )
+    except Exception:
+        logger.warning("Trimming the analytics cache failed", exc_info=True)
+
+def invalidate_file_results(db: Session, file_id: int) -> None:
+    """Delete every shared result of a file (deleting the file itself cascades)."""
+    db.query(AnalyticsCache).filter(AnalyticsCache.file_id == file_id).delete(synchronize_session=False)
+
+def cached_analytics(name: str):
+    """
+    Serve a file-level analytics helper from the shared analytics_cache table.
+    The helper takes `db`, `identity` and `file_id`; the file they resolve to and its version,
+    plus every other argument, make up the key. Files that are not ready are never cached.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            arguments = dict(arguments.arguments)
+            db, identity = arguments.pop("db"), arguments.pop("identity")
+            target_file = resolve_target_file(db, identity, arguments.pop("file_id", None))
+            if not target_file or target_file.status != "ready":
+                return func(*args, **kwargs)
+
+            key = result_cache_key(name, target_file.id, target_file.version, arguments)
+            cached = get_cached_result(key)
+            if cached is not None:
+                return cached
+
+            result = func(*args, **kwargs)
+            put_cached_result(key, name, target_file.id, result)
+            return result
+
+        return wrapper
+    return decorator
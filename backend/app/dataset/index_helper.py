@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+import hashlib
+import logging
+import os
+from app import models
+from app.database import SessionLocal, engine
+from app.upload.db_helper import file_partition_name, drop_file_partition
+
+logger = logging.getLogger(__name__)
+
+# Per-file indexes are built one at a time per worker process, off the request path
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "1"))
+_index_executor = ThreadPoolExecutor(max_workers=INDEX_WORKERS, thread_name_prefix="index")
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _index_name(file_id: int, kind: str, column: str) -> str:
+    # Column names can be anything (Arabic, spaces...); keep identifiers short and ASCII
+    return f"ix_file_rows_{file_id}_{kind}_{hashlib.md5(column.encode('utf-8')).hexdigest()[:8]}"
+
+def _index_prefix(file_id: int) -> str:
+    return f"ix_file_rows_{file_id}_"
+
+def file_index_specs(db, file_id: int, partitioned: bool = True) -> dict:
+    """
+    {index name: CREATE INDEX statement} for the indexes a file's mappings call for:
+      order     - rows with a non-empty order id, by id (latest rows, order counts)
+      orderkey  - order id lookups (append dedup)
+      orderdate - ISO order date + id, descending (latest rows ordered by date)
+      customer  - customer name / phone grouping keys
+    They go on the file's own file_rows partition; a file whose rows are still in
+    file_rows_default (`partitioned=False`) gets partial indexes restricted with WHERE file_id = N.
+    """
+    mappings = {
+        m.analysis_type: (m.mapping or {})
+        for m in db.query(models.ColumnMapping)
+        .filter(models.ColumnMapping.file_id == file_id)
+        .order_by(models.ColumnMapping.updated_at.asc())
+    }
+    order = mappings.get("order", {})
+    customer = mappings.get("customer", {})
+    iso_columns = {
+        c.name
+        for c in db.query(models.FileColumn).filter(models.FileColumn.file_id == file_id)
+        if c.dtype == "datetime" and c.normalized
+    }
+
+    specs = {}
+    table = file_partition_name(file_id) if partitioned else "file_rows_default"
+    scope = [] if partitioned else [f"file_id = {int(file_id)}"]
+
+    def add(kind: str, column: str, body: str, where: str = None):
+        name = _index_name(file_id, kind, column)
+        predicate = scope + ([where] if where else [])
+        specs[name] = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {body}"
+        if predicate:
+            specs[name] += " WHERE " + " AND ".join(predicate)
+
+    order_col = order.get("orderId")
+    if order_col:
+        add("order", order_col, "(id)", f"(data ->> {_literal(order_col)}) <> ''")
+        add("orderkey", order_col, f"((data ->> {_literal(order_col)}))")
+
+    date_col = order.get("orderDate")
+    # Only dates normalized to ISO at ingest sort correctly as text; other date columns are
+    # parsed at query time (json_timestamp), which cannot be indexed
+    if date_col and date_col in iso_columns:
+        add("orderdate", date_col, f"(((data ->> {_literal(date_col)}) COLLATE \"C\") DESC, id DESC)")
+
+    for column in {order.get("customerName"), order.get("customerPhone"), customer.get("customerName"), customer.get("phone")}:
+        if column:
+            add("customer", column, f"((data ->> {_literal(column)}))")
+
+    return specs
+
+def ensure_file_indexes(file_id: int) -> None:
+    """
+    Bring a file's partial indexes in line with its current column mappings:
+    build missing ones (and rebuild ones a failed concurrent build left invalid), drop stale ones.
+    For a deleted file, its emptied partition is dropped too (with its indexes).
+    CONCURRENTLY cannot run inside a transaction, so this uses an autocommit connection.
+    """
+    db = SessionLocal()
+    try:
+        deleted = db.query(models.UploadedFile.id).filter(models.UploadedFile.id == file_id).first() is None
+        partitioned = db.execute(text("SELECT to_regclass(:name)"), {"name": file_partition_name(file_id)}).scalar() is not None
+        specs = file_index_specs(db, file_id, partitioned)
+    finally:
+        db.close()
+
+    if deleted:
+        try:
+            drop_file_partition(file_id)
+        except Exception:
+            logger.warning("Could not drop partition of deleted file %s", file_id, exc_info=True)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        existing = dict(conn.execute(
+            text("""
+                SELECT c.relname, i.indisvalid
+                FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE left(c.relname, :length) = :prefix
+            """),
+            {"prefix": _index_prefix(file_id), "length": len(_index_prefix(file_id))},
+        ).all())
+
+        for name, valid in existing.items():
+            if name not in specs or not valid:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+        for name, ddl in specs.items():
+            if existing.get(name):
+                continue
+            try:
+                # Escape colons so column names are not taken for bind parameters
+                conn.execute(text(ddl.replace(":", "\\:")))
+            except Exception:
+                logger.exception("Building index %s for file %s failed", name, file_id)
+
+def schedule_file_indexes(file_id: int) -> None:
+    """Queue ensure_file_indexes on the background index pool."""
+    _index_executor.submit(_run_ensure_file_indexes, file_id)
+
+def _run_ensure_file_indexes(file_id: int) -> None:
+    try:
+        ensure_file_indexes(file_id)
+    except Exception:
+        logger.exception("Index maintenance for file %s failed", file_id)
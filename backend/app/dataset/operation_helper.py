@@ -0,0 +1,157 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.orm import Session
+from typing import Dict, Iterator, List, Optional
+import pandas as pd
+import os
+from app.models import FileRow
+from app.dataset.sql_helper import json_value
+from app.dataset.parquet_helper import read_snapshot, iter_snapshot, snapshot_columns, snapshot_parts
+from app.dataset.cache_helper import file_version, get_cached_frame, put_cached_frame
+
+# Rows per batch when a file is streamed instead of loaded whole (iter_file_frames)
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "20000"))
+
+def load_file_frame(db: Session, file_id: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Return the rows of an uploaded file as a DataFrame.
+    Reads only `columns` (None = all) from the file's Parquet snapshot when one exists,
+    otherwise from file_rows: just those keys (read_file_columns), or every JSONB document for None.
+    Frames are cached per (file, file version, columns), so repeat views skip the decoding.
+    """
+    version = file_version(db, file_id)
+    key = (file_id, version, tuple(dict.fromkeys(columns)) if columns is not None else None)
+    if version is not None:
+        cached = get_cached_frame(key)
+        if cached is not None:
+            return cached
+
+    df = read_snapshot(file_id, columns)
+    if df is None and columns is not None:
+        df = pd.DataFrame(read_file_columns(db, file_id, columns))
+    elif df is None:
+        rows = db.query(FileRow.data).filter(FileRow.file_id == file_id).order_by(FileRow.id).all()
+        df = pd.DataFrame([r.data for r in rows])
+
+    if version is not None:
+        put_cached_frame(key, df)
+    return df
+
+def _file_columns_query(db: Session, file_id: int, columns: List[str]):
+    """(columns the file has, SELECT of just those keys packed as one JSON array per row in row order)."""
+    available = set(list_file_columns(db, file_id))
+    wanted = [c for c in dict.fromkeys(columns) if c in available]
+    # to_jsonb(ARRAY[data -> c1, data -> c2, ...]): unlike jsonb_build_array, not capped at 100 arguments
+    query = (
+        select(func.to_jsonb(array([json_value(c) for c in wanted])))
+        .where(FileRow.file_id == file_id)
+        .order_by(FileRow.id)
+    )
+    return wanted, query
+
+def read_file_columns(db: Session, file_id: int, columns: List[str]) -> Dict[str, List]:
+    """
+    The values of `columns` over a file's rows (in row order), one list per column, ready for pd.DataFrame.
+    Only those keys leave the database, packed into one JSON array per row (a single decode per row
+    instead of one per value), and they come back as plain tuples without ORM objects.
+    Columns the file does not have are skipped.
+    """
+    wanted, query = _file_columns_query(db, file_id, columns)
+    if not wanted:
+        return {}
+
+    rows = db.execute(query).scalars().all()
+    if not rows:
+        return {c: [] for c in wanted}
+    return {c: list(values) for c, values in zip(wanted, zip(*rows))}
+
+def _with_columns(frame: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """`frame` with exactly `columns`; missing ones hold None, as absent JSON keys do on the file_rows path."""
+    if list(frame.columns) == columns:
+        return frame
+    missing = {c: pd.Series([None] * len(frame), index=frame.index, dtype=object) for c in columns if c not in frame.columns}
+    return frame.assign(**missing)[columns]
+
+def iter_file_frames(
+    db: Session,
+    file_id: int,
+    columns: List[str],
+    batch_rows: int = STREAM_BATCH_ROWS,
+    partition: Optional[dict] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    load_file_frame(db, file_id, columns) as consecutive DataFrames of at most `batch_rows` rows,
+    for feeding incremental aggregators (app/dataset/aggregate_helper.py): Parquet row batches when
+    the file has a snapshot, else a server-side cursor over file_rows. Only one batch is held at a time.
+    `partition` (from file_partitions) limits it to one piece of the file.
+    Every batch has all of `columns`: ones missing from the file, or from some of its snapshot
+    parts (appends can add or leave out columns), read as None.
+    """
+    columns = list(dict.fromkeys(columns))
+    if partition is None or "parts" in partition:
+        snapshot = iter_snapshot(file_id, columns, batch_rows, partition["parts"] if partition else None)
+        if snapshot is not None:
+            for frame in snapshot:
+                yield _with_columns(frame, columns)
+            return
+        if partition is not None:
+            raise RuntimeError(f"Snapshot of file {file_id} is no longer readable")
+
+    wanted, query = _file_columns_query(db, file_id, columns)
+    if not wanted:
+        return
+    if partition is not None:
+        low, high = partition["ids"]
+        query = query.where(FileRow.id.between(low, high))
+
+    result = db.execute(query.execution_options(stream_results=True, yield_per=batch_rows))
+    for batch in result.scalars().partitions():
+        yield _with_columns(pd.DataFrame({c: list(values) for c, values in zip(wanted, zip(*batch))}), columns)
+
+def file_partitions(db: Session, file_id: int, count: int) -> List[dict]:
+    """
+    Split a file into up to `count` pieces that iter_file_frames can read independently (and in any process):
+    runs of consecutive snapshot parts when the file has a snapshot, else ranges of file_rows ids.
+    """
+    parts = snapshot_parts(file_id)
+    if parts is not None:
+        size = max(1, -(-len(parts) // count))
+        return [{"parts": parts[i:i + size]} for i in range(0, len(parts), size)]
+
+    low, high = db.query(func.min(FileRow.id), func.max(FileRow.id)).filter(FileRow.file_id == file_id).one()
+    if low is None:
+        return []
+    step = max(1, -(-(high - low + 1) // count))
+    return [{"ids": (start, min(start + step - 1, high))} for start in range(low, high + 1, step)]
+
+def list_file_columns(db: Session, file_id: int) -> List[str]:
+    """Column names of an uploaded file (snapshot footer, else the keys of its first row)."""
+    names = snapshot_columns(file_id)
+    if names is not None:
+        return names
+
+    first = db.query(FileRow.data).filter(FileRow.file_id == file_id).order_by(FileRow.id).first()
+    return list(first.data.keys()) if first else []
+
+def match_columns(available: List[str], wanted: List[Optional[str]], normalize=lambda c: str(c).strip()) -> List[str]:
+    """Pick the actual columns whose normalized name matches one of `wanted` (mapping values)."""
+    targets = {normalize(w) for w in wanted if w}
+    return [c for c in available if normalize(c) in targets]
+
+def ensure_numeric(series: pd.Series) -> pd.Series:
+    """pd.to_numeric(errors="coerce") that is free for columns stored as numbers at ingest."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series, errors="coerce")
+
+def ensure_datetime(series: pd.Series) -> pd.Series:
+    """
+    pd.to_datetime(errors="coerce") with a fast path for the ISO strings written at ingest;
+    values in any other format (files uploaded before type inference) get the generic parser.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    parsed = pd.to_datetime(series, errors="coerce", format="ISO8601")
+    if parsed.notna().sum() == series.notna().sum():
+        return parsed
+    return pd.to_datetime(series, errors="coerce")
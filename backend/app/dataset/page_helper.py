@@ -0,0 +1,51 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import and_, or_
+import base64
+import json
+import os
+
+# Largest page a table endpoint hands out, whatever `limit` asks for
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+
+def page_limit(limit: int) -> int:
+    """Clamp a requested page size to 1..PAGE_MAX_LIMIT."""
+    return max(1, min(int(limit), PAGE_MAX_LIMIT))
+
+def encode_cursor(values: list) -> str:
+    """Opaque cursor for the last row of a page: its sort value(s) and row id."""
+    def plain(value):
+        if isinstance(value, Decimal):
+            return str(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+    raw = json.dumps([plain(v) for v in values], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[list]:
+    """The values encode_cursor packed (None without a cursor); ValueError for anything malformed."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor.")
+    return values
+
+def contains_pattern(value: str) -> str:
+    """ILIKE pattern matching `value` anywhere, with LIKE wildcards in it taken literally."""
+    return "%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def keyset_after(sort_expr, id_expr, descending: bool, values: list):
+    """
+    Rows strictly after the cursor row in ORDER BY sort_expr, id_expr (both ascending or both descending):
+    the keyset condition that replaces OFFSET, so page N costs the same as page 1.
+    """
+    last_value, last_id = values
+    if descending:
+        return or_(sort_expr < last_value, and_(sort_expr == last_value, id_expr < last_id))
+    return or_(sort_expr > last_value, and_(sort_expr == last_value, id_expr > last_id))
@@ -0,0 +1,129 @@
+from typing import Iterator, List, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pandas as pd
+import logging
+import shutil
+import os
+
+logger = logging.getLogger(__name__)
+
+# Columnar copy of every uploaded file, one directory per file with one Parquet part per ingest chunk
+SNAPSHOT_DIR = os.getenv(
+    "DATASET_SNAPSHOT_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "snapshots")),
+)
+SNAPSHOT_COMPRESSION = os.getenv("DATASET_SNAPSHOT_COMPRESSION", "zstd")
+_COMPLETE_MARKER = "_SUCCESS"
+
+def snapshot_path(file_id: int) -> str:
+    return os.path.join(SNAPSHOT_DIR, str(file_id))
+
+def _part_paths(file_id: int) -> List[str]:
+    base = snapshot_path(file_id)
+    return sorted(os.path.join(base, name) for name in os.listdir(base) if name.endswith(".parquet"))
+
+def write_snapshot_part(file_id: int, part_no: int, df: pd.DataFrame) -> None:
+    """Write one chunk of an upload as a compressed Parquet part (atomically, via rename)."""
+    base = snapshot_path(file_id)
+    os.makedirs(base, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    final = os.path.join(base, f"part-{part_no:05d}.parquet")
+    tmp = final + ".tmp"
+    pq.write_table(table, tmp, compression=SNAPSHOT_COMPRESSION)
+    os.replace(tmp, final)
+
+def _part_no(path: str) -> int:
+    return int(os.path.basename(path)[len("part-"):-len(".parquet")])
+
+def next_part_no(file_id: int) -> int:
+    base = snapshot_path(file_id)
+    if not os.path.isdir(base):
+        return 0
+    return max((_part_no(p) for p in _part_paths(file_id)), default=-1) + 1
+
+def mark_snapshot_complete(file_id: int) -> None:
+    """Readers only use snapshots that were fully written."""
+    with open(os.path.join(snapshot_path(file_id), _COMPLETE_MARKER), "w"):
+        pass
+
+def has_snapshot(file_id: int) -> bool:
+    return os.path.exists(os.path.join(snapshot_path(file_id), _COMPLETE_MARKER))
+
+def drop_snapshot(file_id: int) -> None:
+    shutil.rmtree(snapshot_path(file_id), ignore_errors=True)
+
+def drop_snapshot_parts(file_id: int, from_part: int) -> None:
+    """Remove parts numbered `from_part` and up (undoes a failed append)."""
+    base = snapshot_path(file_id)
+    if not os.path.isdir(base):
+        return
+    for part in _part_paths(file_id):
+        if _part_no(part) >= from_part:
+            os.remove(part)
+
+def snapshot_columns(file_id: int) -> Optional[List[str]]:
+    """Column names of a complete snapshot, read from the Parquet footer only."""
+    if not has_snapshot(file_id):
+        return None
+    # Appended parts may add columns, so take the union in order of appearance
+    names = {}
+    for part in _part_paths(file_id):
+        names.update(dict.fromkeys(pq.read_schema(part).names))
+    return list(names)
+
+def read_snapshot(file_id: int, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Load a file's rows from its Parquet snapshot, memory-mapped, decoding only `columns`.
+    Requested columns that the file does not have are skipped.
+    Returns None when there is no complete snapshot (callers fall back to file_rows).
+    """
+    if not has_snapshot(file_id):
+        return None
+
+    frames = []
+    try:
+        for part in _part_paths(file_id):
+            wanted = None
+            if columns is not None:
+                available = set(pq.read_schema(part).names)
+                wanted = [c for c in dict.fromkeys(columns) if c in available]
+            table = pq.read_table(part, columns=wanted, memory_map=True)
+            frames.append(table.to_pandas())
+    except (OSError, pa.ArrowException):
+        logger.exception("Unreadable snapshot for file %s, falling back to file_rows", file_id)
+        return None
+
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+def snapshot_parts(file_id: int) -> Optional[List[str]]:
+    """Paths of a complete snapshot's parts in order, or None without one."""
+    if not has_snapshot(file_id):
+        return None
+    return _part_paths(file_id)
+
+def iter_snapshot(file_id: int, columns: List[str], batch_rows: int, parts: Optional[List[str]] = None) -> Optional[Iterator[pd.DataFrame]]:
+    """
+    read_snapshot in batches of at most `batch_rows` rows, so only one batch is decoded at a time;
+    `parts` limits it to some of the snapshot's parts (see snapshot_parts).
+    Returns None when there is no complete (readable) snapshot.
+    """
+    if not has_snapshot(file_id):
+        return None
+
+    try:
+        parts = [(part, [c for c in dict.fromkeys(columns) if c in set(pq.read_schema(part).names)]) for part in (parts if parts is not None else _part_paths(file_id))]
+    except (OSError, pa.ArrowException):
+        logger.exception("Unreadable snapshot for file %s, falling back to file_rows", file_id)
+        return None
+
+    def batches():
+        for part, wanted in parts:
+            for batch in pq.ParquetFile(part, memory_map=True).iter_batches(batch_size=batch_rows, columns=wanted):
+                yield batch.to_pandas()
+
+    return batches()
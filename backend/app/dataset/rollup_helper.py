@@ -0,0 +1,206 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from typing import Optional
+from sqlalchemy import and_, cast, func, literal, null, or_, select, text, Date, DateTime, Integer, Numeric, String
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.orm import Session
+import logging
+import os
+from app.models import (
+    UploadedFile, FileColumn, FileRow, FileRollup, FileDailyTotal, FileDailyProduct, FileDailyCustomer,
+)
+from app.database import SessionLocal
+from app.dashboard.db_helper import get_latest_mapping
+from app.dataset.operation_helper import list_file_columns, match_columns
+from app.dataset.sql_helper import json_value, json_text, json_numeric, json_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Rollups are rebuilt one at a time per worker process, off the request path
+ROLLUP_WORKERS = int(os.getenv("ROLLUP_WORKERS", "1"))
+_rollup_executor = ThreadPoolExecutor(max_workers=ROLLUP_WORKERS, thread_name_prefix="rollup")
+
+# pg_advisory_xact_lock(namespace, file_id): one rebuild per file across all workers
+_ROLLUP_LOCK_NAMESPACE = 18
+
+def rollup_columns(db: Session, file_id: int) -> dict:
+    """
+    The raw columns a file's rollups are built from, resolved from its current mappings the same way
+    the endpoints served from them resolve theirs:
+      date, order, amount - order mapping columns known to file_columns (orders-in-graph)
+      product, price, quantity - product mapping columns present in the rows (top-products-by-date)
+      customer, customer_amount - order mapping customer/amount matched like top-customers does
+    Consumers compare these with their own columns and only use the rollups on a match.
+    """
+    from app.dashboard.operation_helper import normalize_key
+
+    order = get_latest_mapping(db, file_id, "order")
+    product = get_latest_mapping(db, file_id, "product")
+    known = {str(c.name).strip(): c for c in db.query(FileColumn).filter(FileColumn.file_id == file_id)}
+    available = list_file_columns(db, file_id)
+
+    def known_column(field: str) -> Optional[str]:
+        value = (order.get(field) or "").strip()
+        return value if value in known else None
+
+    def present_column(field: str) -> Optional[str]:
+        value = product.get(field)
+        return value if value and value in available else None
+
+    date_key = known_column("orderDate")
+    customer_keys = match_columns(available, [order.get("customerName")], normalize_key)
+    amount_keys = match_columns(available, [order.get("totalAmount")], normalize_key)
+
+    return {
+        "date": date_key,
+        "day_first": bool(date_key and (known[date_key].format or "").startswith("%d")),
+        "order": known_column("orderId"),
+        "amount": known_column("totalAmount"),
+        "product": present_column("productName"),
+        "price": present_column("price"),
+        "quantity": present_column("quantity"),
+        "customer": customer_keys[0] if customer_keys else None,
+        "customer_amount": amount_keys[0] if amount_keys else None,
+    }
+
+def current_rollup_columns(db: Session, target_file) -> Optional[dict]:
+    """rollup_columns as of the last rebuild, or None when the rollups do not match the file's current version."""
+    return (
+        db.query(FileRollup.columns)
+        .filter(FileRollup.file_id == target_file.id, FileRollup.version == target_file.version)
+        .scalar()
+    )
+
+def whole_day_range(start_dt: datetime, end_dt: datetime) -> Optional[tuple[date, date]]:
+    """(first day, last day) when both bounds fall on midnight, the only ranges daily rollups can answer."""
+    if start_dt.time() != time(0) or end_dt.time() != time(0):
+        return None
+    return start_dt.date(), end_dt.date()
+
+def rollup_day_filter(model, days: tuple[date, date]):
+    """
+    `start <= date <= end` on a rollup table, with `end` at midnight: the whole days before the
+    last one, and on the last day only the rows stamped exactly 00:00.
+    """
+    first, last = days
+    return and_(
+        model.day >= first,
+        or_(model.day < last, and_(model.day == last, model.midnight.is_(True))),
+    )
+
+def _numeric(key: Optional[str]):
+    return json_numeric(key) if key else cast(null(), Numeric)
+
+def _insert_groups(db: Session, model, keys: list, measures: list, query) -> None:
+    """INSERT the grouped `query` into a rollup table, adding its measures to groups the table already has."""
+    stmt = pg_insert(model).from_select(["file_id", "day", "midnight"] + keys + measures, query)
+    current = model.__table__.c
+    # A sum stays NULL when neither side had a value, like SUM over no values
+    merged = {name: func.coalesce(current[name] + stmt.excluded[name], current[name], stmt.excluded[name]) for name in measures}
+    db.execute(stmt.on_conflict_do_update(index_elements=["file_id", "day", "midnight"] + keys, set_=merged))
+
+def build_file_rollups(file_id: int, appended_after: Optional[int] = None) -> None:
+    """
+    Rebuild a file's daily rollups (totals, per product, per customer) from its rows in three
+    GROUP BY passes and record the version, columns and last row they were built from, in one transaction.
+    After an append, pass the file's last row id from before it (`appended_after`): when the rollups
+    cover exactly those rows with the current columns, only the new rows are aggregated and merged in.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT pg_advisory_xact_lock(:namespace, :file_id)"), {"namespace": _ROLLUP_LOCK_NAMESPACE, "file_id": file_id})
+        uploaded = db.query(UploadedFile).filter(UploadedFile.id == file_id).first()
+        if not uploaded or uploaded.status != "ready":
+            return
+
+        # Step 1: Resolve the columns; nothing to roll up before the file has mappings
+        columns = rollup_columns(db, file_id)
+        if not (columns["date"] or columns["customer"]):
+            return
+
+        # Ambiguous dates like 03/04/2024 are read the way the file writes them
+        if columns["day_first"]:
+            db.execute(text("SET LOCAL datestyle = 'ISO, DMY'"))
+
+        # Step 2: Merge the appended rows, or start over. All three passes read the same rows.
+        built = db.query(FileRollup).filter(FileRollup.file_id == file_id).first()
+        last_row_id = db.query(func.max(FileRow.id)).filter(FileRow.file_id == file_id).scalar() or 0
+        row_filter = [FileRow.file_id == file_id, FileRow.id <= last_row_id]
+        if (
+            appended_after is not None and built is not None and built.row_id is not None
+            and built.row_id <= appended_after and built.columns == columns
+        ):
+            row_filter.append(FileRow.id > built.row_id)
+        else:
+            for model in (FileDailyTotal, FileDailyProduct, FileDailyCustomer):
+                db.query(model).filter(model.file_id == file_id).delete(synchronize_session=False)
+
+        # Step 3: Per-row day / measures, computed once and grouped three ways
+        ts = json_timestamp(columns["date"]) if columns["date"] else cast(null(), DateTime)
+        if columns["amount"]:
+            amount = func.coalesce(json_numeric(columns["amount"]), 0)
+        else:
+            amount = cast(null(), Numeric)
+        if columns["price"] and columns["quantity"]:
+            line_amount = func.coalesce(json_numeric(columns["price"]), 0) * func.coalesce(json_numeric(columns["quantity"]), 1)
+        else:
+            line_amount = cast(null(), Numeric)
+
+        rows = (
+            select(
+                cast(ts, Date).label("day"),
+                (ts == func.date_trunc("day", ts)).label("midnight"),
+                (json_text(columns["order"]) if columns["order"] else cast(null(), String)).label("order_id"),
+                amount.label("amount"),
+                line_amount.label("line_amount"),
+                _numeric(columns["quantity"]).label("quantity"),
+                (json_value(columns["product"]) if columns["product"] else cast(null(), JSONB)).label("product"),
+                (json_value(columns["customer"]) if columns["customer"] else cast(null(), JSONB)).label("customer"),
+                _numeric(columns["customer_amount"]).label("customer_amount"),
+            )
+            .where(*row_filter)
+            .subquery()
+        )
+
+        # Step 4: Day totals
+        _insert_groups(db, FileDailyTotal, [], ["rows", "orders", "amount", "line_amount", "quantity"], select(
+            literal(file_id), rows.c.day, rows.c.midnight, cast(func.count(), Integer), cast(func.count(rows.c.order_id), Integer),
+            func.sum(rows.c.amount), func.sum(rows.c.line_amount), func.sum(rows.c.quantity),
+        ).group_by(rows.c.day, rows.c.midnight))
+
+        # Step 5: Day x product
+        if columns["product"]:
+            _insert_groups(db, FileDailyProduct, ["product"], ["rows", "amount", "line_amount", "quantity"], select(
+                literal(file_id), rows.c.day, rows.c.midnight, rows.c.product, cast(func.count(), Integer),
+                func.sum(rows.c.amount), func.sum(rows.c.line_amount), func.sum(rows.c.quantity),
+            )
+            .where(func.jsonb_typeof(rows.c.product) != "null")
+            .group_by(rows.c.day, rows.c.midnight, rows.c.product))
+
+        # Step 6: Day x customer
+        if columns["customer"]:
+            _insert_groups(db, FileDailyCustomer, ["customer"], ["rows", "amount", "quantity"], select(
+                literal(file_id), rows.c.day, rows.c.midnight, rows.c.customer, cast(func.count(), Integer),
+                func.sum(rows.c.customer_amount), func.sum(rows.c.quantity),
+            )
+            .where(func.jsonb_typeof(rows.c.customer) != "null")
+            .group_by(rows.c.day, rows.c.midnight, rows.c.customer))
+
+        # Step 7: Record what the rollups describe
+        db.merge(FileRollup(file_id=file_id, version=uploaded.version, columns=columns, row_id=last_row_id, built_at=datetime.utcnow()))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def schedule_file_rollups(file_id: int) -> None:
+    """Queue build_file_rollups on the background rollup pool; call it after committing the change."""
+    _rollup_executor.submit(_run_build_file_rollups, file_id)
+
+def _run_build_file_rollups(file_id: int) -> None:
+    try:
+        build_file_rollups(file_id)
+    except Exception:
+        logger.exception("Rollup build for file %s failed", file_id)
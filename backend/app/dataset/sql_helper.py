@@ -0,0 +1,38 @@
+from sqlalchemy import DateTime, Numeric, and_, case, cast, func
+from app.models import FileRow
+
+# Text that pd.to_numeric(errors="coerce") would turn into a finite number
+NUMERIC_TEXT_RE = r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$"
+
+def json_value(key: str):
+    """data -> key: the JSONB value itself, so numbers and strings group as they were stored."""
+    return FileRow.data[key]
+
+def json_text(key: str):
+    """data ->> key"""
+    return FileRow.data[key].astext
+
+def json_numeric(key: str):
+    """
+    data -> key as NUMERIC, NULL for anything that is not a number: the SQL side of ensure_numeric.
+    Values typed at ingest are JSON numbers; older files keep numbers as strings,
+    which are cast only when they look numeric.
+    """
+    kind = func.jsonb_typeof(FileRow.data[key])
+    stripped = func.btrim(FileRow.data[key].astext)
+    return case(
+        (kind == "number", cast(FileRow.data[key].astext, Numeric)),
+        (and_(kind == "string", stripped.op("~")(NUMERIC_TEXT_RE)), cast(stripped, Numeric)),
+        else_=None,
+    )
+
+def json_timestamp(key: str):
+    """
+    data ->> key as TIMESTAMP, NULL where the text is not a date PostgreSQL can read:
+    the SQL side of ensure_datetime. Needs PostgreSQL 16 (pg_input_is_valid).
+    """
+    value = FileRow.data[key].astext
+    return case(
+        (func.pg_input_is_valid(value, "timestamp"), cast(value, DateTime)),
+        else_=None,
+    )
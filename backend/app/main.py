@@ -9,6 +9,7 @@ from app.routers.auth import router as auth_router
 from app.routers.data_selection import router as data_selection_router
 from app.routers.sync import router as sync_router
 from app.routers.whatsapp_message import router as whatsapp_message_router
+from app.upload.job_helper import resume_pending_jobs
 import cloudinary
 from dotenv import load_dotenv
 import os
@@ -66,6 +67,12 @@ app.include_router(data_selection_router)
 app.include_router(sync_router)
 app.include_router(whatsapp_message_router)
 
+@app.on_event("startup")
+def resume_upload_jobs():
+    # Pick up uploads that were accepted but not ingested before the last restart,
+    # and fail the ones a dead worker left "running"
+    resume_pending_jobs()
+
 @app.get("/")
 def read_root():
     return {"message": "Hello, FastAPI!"}
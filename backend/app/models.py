@@ -1,6 +1,6 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, LargeBinary, Boolean, Index, Text
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, JSON, DateTime, Date, Numeric, LargeBinary, Boolean, Index, Text, Computed, DDL, event
+from sqlalchemy.orm import relationship, declarative_base, deferred, backref
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
@@ -17,9 +17,16 @@ class UploadedFile(Base):
     total_rows = Column(Integer, nullable=False)
     total_columns = Column(Integer, nullable=False)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
-
-    # raw file storage (optional: can also store just a path)
-    file_data = Column(LargeBinary, nullable=False)
+    # "ingesting" while a background job is loading rows, then "ready" (or "failed")
+    status = Column(String, nullable=False, default="ready", server_default="ready")
+    # bumped whenever the file's rows or column mappings change; part of the analytics cache keys
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # raw bytes live in the content-addressed blob store (app/upload/blob_helper.py);
+    # file_data only holds uploads from before it and is never loaded with the row
+    file_data = deferred(Column(LargeBinary, nullable=True))
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of the raw upload
+    blob_size = Column(BigInteger, nullable=True)
     
     # Cloudinary storage fields
     cloudinary_url = Column(String, nullable=True)
@@ -29,7 +36,8 @@ class UploadedFile(Base):
     guest_id = Column(UUID(as_uuid=False), ForeignKey("guests.id"), nullable=True)  # <-- MATCH TYPE
 
     # relationships
-    rows = relationship("FileRow", back_populates="file", cascade="all, delete-orphan")
+    # file_rows are removed by the database (partition drop / ON DELETE CASCADE), never loaded one by one
+    rows = relationship("FileRow", back_populates="file", cascade="all, delete-orphan", passive_deletes=True)
     columns = relationship("FileColumn", back_populates="file", cascade="all, delete-orphan")
     guest = relationship("Guest", backref="files")
     mappings = relationship("ColumnMapping", back_populates="file", cascade="all, delete-orphan")
@@ -40,19 +48,39 @@ class FileColumn(Base):
     id = Column(Integer, primary_key=True, index=True)
     file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"))
     name = Column(String, nullable=False)
-    dtype = Column(String, nullable=True)  # store pandas dtype
+    dtype = Column(String, nullable=True)  # int, decimal, datetime, phone, categorical, string
+    format = Column(String, nullable=True)  # detected strptime pattern for datetime columns
+    # Values were rewritten to the dtype's form at ingest (ISO text for datetime, JSON numbers for int/decimal);
+    # a datetime column without it still holds the text as uploaded, in `format`
+    normalized = Column(Boolean, nullable=False, default=False, server_default="false")
 
     file = relationship("UploadedFile", back_populates="columns")
 
 class FileRow(Base):
     __tablename__ = "file_rows"
 
-    id = Column(Integer, primary_key=True, index=True)
-    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"))
+    # LIST-partitioned by file_id: one partition per uploaded file (file_rows_<file_id>, see
+    # app/upload/db_helper.py) plus file_rows_default; the partition key has to be part of the PK
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), primary_key=True)
     data = Column(JSONB, nullable=False)  # store row as JSON
+    # fingerprint used to skip rows that are already present when appending to a file
+    row_hash = Column(String(32), Computed("md5(data::text)", persisted=True))
 
     file = relationship("UploadedFile", back_populates="rows")
 
+    __table_args__ = (
+        Index("ix_file_rows_file_id", "file_id", "id"),
+        Index("ix_file_rows_file_id_row_hash", "file_id", "row_hash"),
+        {"postgresql_partition_by": "LIST (file_id)"},
+    )
+
+event.listen(
+    FileRow.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS file_rows_default PARTITION OF file_rows DEFAULT"),
+)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -94,6 +122,112 @@ class ColumnMapping(Base):
         Index("ix_column_mappings_file_user_analysis", "file_id", "user_id", "analysis_type"),
     )
 
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+
+    id = Column(UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    spool_path = Column(String, nullable=True)  # spooled upload waiting to be parsed
+    rows_processed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    archive_status = Column(String, nullable=False, default="pending")  # pending, running, archived, failed, skipped
+    mode = Column(String, nullable=False, default="create", server_default="create")  # create, append
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    file = relationship("UploadedFile", backref=backref("jobs", cascade="all, delete-orphan", passive_deletes=True))
+
+class AnalyticsCache(Base):
+    """Computed analytics results shared by all workers (see app/dataset/cache_helper.py)."""
+    __tablename__ = "analytics_cache"
+    # A cache, not data: UNLOGGED skips the WAL, and the table is simply emptied after a crash
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String(64), primary_key=True)  # sha256 of name + file + version + arguments
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    value = Column(JSONB, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class FileRollup(Base):
+    """Which version of a file, and which of its columns, the daily rollup tables were built from."""
+    __tablename__ = "file_rollups"
+
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False)
+    columns = Column(JSONB, nullable=False)  # {"date": ..., "amount": ..., "product": ...}
+    row_id = Column(BigInteger, nullable=True)  # highest file_rows id rolled up
+    built_at = Column(DateTime, default=datetime.utcnow)
+
+class FileSummary(Base):
+    """Headline numbers of a file as of `version` (see app/dashboard/db_helper.py: get_file_summary_from_db)."""
+    __tablename__ = "file_summaries"
+
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False)
+    counters = Column(JSONB, nullable=False)  # {card: [row_count, value]} from get_summary_counters_from_db
+    first_order_at = Column(DateTime, nullable=True)
+    last_order_at = Column(DateTime, nullable=True)
+    row_id = Column(BigInteger, nullable=True)  # highest file_rows id counted
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+# Daily rollups: one row per (file, day, midnight?, key). `midnight` tells whether the rows were stamped
+# exactly 00:00, so "date <= end" stays exact on the last day; rows without a readable date have day NULL.
+class FileDailyTotal(Base):
+    __tablename__ = "file_daily_totals"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=True)
+    midnight = Column(Boolean, nullable=True)
+    rows = Column(Integer, nullable=False)
+    orders = Column(Integer, nullable=False)  # rows with an order id
+    amount = Column(Numeric, nullable=True)  # totalAmount, missing values as 0
+    line_amount = Column(Numeric, nullable=True)  # price x quantity, missing price 0 / quantity 1
+    quantity = Column(Numeric, nullable=True)
+
+    __table_args__ = (
+        # One row per group, so an append can merge its rows in (ON CONFLICT); rows without a date share day NULL
+        Index("uq_file_daily_totals_group", "file_id", "day", "midnight", unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+class FileDailyProduct(Base):
+    __tablename__ = "file_daily_products"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=True)
+    midnight = Column(Boolean, nullable=True)
+    product = Column(JSONB, nullable=False)
+    rows = Column(Integer, nullable=False)
+    amount = Column(Numeric, nullable=True)
+    line_amount = Column(Numeric, nullable=True)
+    quantity = Column(Numeric, nullable=True)
+
+    __table_args__ = (
+        Index("uq_file_daily_products_group", "file_id", "day", "midnight", "product", unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+class FileDailyCustomer(Base):
+    __tablename__ = "file_daily_customers"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=True)
+    midnight = Column(Boolean, nullable=True)
+    customer = Column(JSONB, nullable=False)
+    rows = Column(Integer, nullable=False)
+    amount = Column(Numeric, nullable=True)  # summed numeric amounts, NULL when there were none
+    quantity = Column(Numeric, nullable=True)
+
+    __table_args__ = (
+        Index("uq_file_daily_customers_group", "file_id", "day", "midnight", "customer", unique=True, postgresql_nulls_not_distinct=True),
+    )
+
 class WhatsAppTemplate(Base):
     __tablename__ = "whatsapp_templates"
 
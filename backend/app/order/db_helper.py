@@ -0,0 +1,205 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, text, cast, DateTime, literal
+from datetime import date, datetime, time
+from app.models import FileRow, FileDailyTotal
+from app.dataset.rollup_helper import rollup_day_filter
+from app.dataset.page_helper import keyset_after, contains_pattern
+from app.dataset.sql_helper import json_value, json_text, json_numeric, json_timestamp
+
+# Sort keys of the paged orders table
+ORDER_SORTS = ("date", "amount", "customer_name", "order_id")
+
+# granularity -> (date_trunc unit, to_char pattern of the period label)
+PERIOD_FORMATS = {
+    "daily": ("day", "YYYY-MM-DD"),
+    "monthly": ("month", "YYYY-MM"),
+    "yearly": ("year", "YYYY"),
+}
+
+def get_orders_aggregated_data_from_db(
+    db: Session,
+    file_id: int,
+    date_key: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    granularity: str,
+    amount_key: str | None = None,
+    price_key: str | None = None,
+    qty_key: str | None = None,
+    count_key: str | None = None,
+    day_first: bool = False,
+) -> list[dict]:
+
+    """
+    Bucket a file's orders by date_trunc(granularity, orderDate) inside PostgreSQL.
+    Returns [{"period", "orderCount", "totalAmount"}] in period order, for orders dated within
+    [start_dt, end_dt]. The amount is `amount_key`, or price x quantity when only those are given;
+    orderCount counts rows with a `count_key` value (all rows without one).
+    """
+
+    unit, period_format = PERIOD_FORMATS[granularity]
+
+    # Ambiguous dates like 03/04/2024 are read the way the file writes them
+    if day_first:
+        db.execute(text("SET LOCAL datestyle = 'ISO, DMY'"))
+
+    order_date = json_timestamp(date_key)
+    bucket = func.date_trunc(unit, order_date)
+
+    if amount_key:
+        amount = func.coalesce(json_numeric(amount_key), 0)
+    else:
+        amount = func.coalesce(json_numeric(price_key), 0) * func.coalesce(json_numeric(qty_key), 0)
+    order_count = func.count(json_text(count_key)) if count_key else func.count()
+
+    rows = (
+        db.query(
+            func.to_char(bucket, period_format).label("period"),
+            order_count.label("orderCount"),
+            func.sum(amount).label("totalAmount"),
+        )
+        .filter(FileRow.file_id == file_id, order_date >= start_dt, order_date <= end_dt)
+        .group_by(bucket)
+        .order_by(bucket)
+        .all()
+    )
+
+    return [
+        {"period": r.period, "orderCount": r.orderCount, "totalAmount": float(r.totalAmount)}
+        for r in rows
+    ]
+
+def get_orders_aggregated_data_from_rollup(
+    db: Session,
+    file_id: int,
+    days: tuple[date, date],
+    granularity: str,
+    count_orders: bool = True,
+) -> list[dict]:
+
+    """
+    get_orders_aggregated_data_from_db answered from the file's day totals (totalAmount amounts only):
+    the same buckets, summed from one row per day instead of one per order.
+    """
+
+    unit, period_format = PERIOD_FORMATS[granularity]
+    bucket = func.date_trunc(unit, cast(FileDailyTotal.day, DateTime))
+    order_count = func.sum(FileDailyTotal.orders if count_orders else FileDailyTotal.rows)
+
+    rows = (
+        db.query(
+            func.to_char(bucket, period_format).label("period"),
+            order_count.label("orderCount"),
+            func.sum(FileDailyTotal.amount).label("totalAmount"),
+        )
+        .filter(FileDailyTotal.file_id == file_id, rollup_day_filter(FileDailyTotal, days))
+        .group_by(bucket)
+        .order_by(bucket)
+        .all()
+    )
+
+    return [
+        {"period": r.period, "orderCount": int(r.orderCount), "totalAmount": float(r.totalAmount)}
+        for r in rows
+    ]
+
+def get_orders_page_from_db(
+    db: Session,
+    file_id: int,
+    keys: dict,
+    start_dt: datetime,
+    end_dt: datetime,
+    sort: str = "date",
+    descending: bool = True,
+    after: list | None = None,
+    limit: int = 50,
+    customer: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    iso_dates: bool = False,
+    day_first: bool = False,
+) -> tuple[list[dict], list | None, int | None]:
+
+    """
+    One page of a file's orders dated within [start_dt, end_dt], sorted and filtered in PostgreSQL.
+    `keys` maps order_id / customer_name / date / amount to raw column names (date is required).
+    Dates normalized to ISO at ingest (`iso_dates`) are compared as ISO text, which the per-file order
+    date index serves in date order; dates stored as uploaded are parsed with json_timestamp.
+    Returns (rows, keyset of the last row when more rows follow, total matching rows on the first page).
+    """
+
+    # Step 1: The date column, as indexed text or as a parsed timestamp
+    if iso_dates:
+        order_date = FileRow.data.op("->>")(keys["date"]).collate("C")
+        # ISO text sorts like the dates it holds: "2024-03-01" <= "2024-03-01T00:00:00" < "2024-03-01T10:00:00"
+        lower = start_dt.strftime("%Y-%m-%d") if start_dt.time() == time(0) else start_dt.strftime("%Y-%m-%dT%H:%M:%S")
+        in_range = [order_date >= lower, order_date <= end_dt.strftime("%Y-%m-%dT%H:%M:%S")]
+        date_label = func.left(order_date, 10)
+    else:
+        # Ambiguous dates like 03/04/2024 are read the way the file writes them
+        if day_first:
+            db.execute(text("SET LOCAL datestyle = 'ISO, DMY'"))
+        order_date = json_timestamp(keys["date"])
+        in_range = [order_date >= start_dt, order_date <= end_dt]
+        date_label = func.to_char(order_date, "YYYY-MM-DD")
+
+    # Step 2: Columns, sort keys and filters
+    amount = func.coalesce(json_numeric(keys["amount"]), 0) if keys.get("amount") else None
+    customer_text = func.coalesce(json_text(keys["customer_name"]), "") if keys.get("customer_name") else None
+    sorts = {
+        "date": order_date,
+        "amount": amount,
+        "customer_name": customer_text.collate("C") if customer_text is not None else None,
+        "order_id": func.coalesce(json_text(keys["order_id"]), "").collate("C") if keys.get("order_id") else None,
+    }
+    sort_expr = sorts.get(sort)
+    if sort_expr is None:
+        raise ValueError(f"Cannot sort by {sort!r}: the column is not mapped.")
+
+    filters = [FileRow.file_id == file_id, *in_range]
+    if customer:
+        if customer_text is None:
+            raise ValueError("Cannot filter by customer: the column is not mapped.")
+        filters.append(customer_text.ilike(contains_pattern(customer)))
+    if min_amount is not None or max_amount is not None:
+        if amount is None:
+            raise ValueError("Cannot filter by amount: the column is not mapped.")
+        if min_amount is not None:
+            filters.append(amount >= min_amount)
+        if max_amount is not None:
+            filters.append(amount <= max_amount)
+
+    # Step 3: Count the matches once, on the first page
+    total = None
+    if after is None:
+        total = db.query(func.count()).select_from(FileRow).filter(*filters).scalar()
+    else:
+        filters.append(keyset_after(sort_expr, FileRow.id, descending, after))
+
+    # Step 4: One row past the page tells whether another page follows
+    order_by = [sort_expr.desc(), FileRow.id.desc()] if descending else [sort_expr.asc(), FileRow.id.asc()]
+    rows = (
+        db.query(
+            FileRow.id.label("row_id"),
+            sort_expr.label("sort_value"),
+            (json_value(keys["order_id"]) if keys.get("order_id") else literal(None)).label("order_id"),
+            (json_value(keys["customer_name"]) if keys.get("customer_name") else literal(None)).label("customer_name"),
+            date_label.label("date"),
+            (amount if amount is not None else literal(None)).label("amount"),
+        )
+        .filter(*filters)
+        .order_by(*order_by)
+        .limit(limit + 1)
+        .all()
+    )
+
+    last = [rows[limit - 1].sort_value, rows[limit - 1].row_id] if len(rows) > limit else None
+    return [
+        {
+            "order_id": r.order_id,
+            "customer_name": r.customer_name,
+            "date": r.date,
+            "amount": float(r.amount) if r.amount is not None else None,
+        }
+        for r in rows[:limit]
+    ], last, total
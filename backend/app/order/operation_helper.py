@@ -86,6 +86,14 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from app.customer.db_helper import fetch_file_rows
 from app.models import UploadedFile, ColumnMapping, FileRow, FileColumn
+from app.dataset.operation_helper import load_file_frame, list_file_columns, ensure_numeric, ensure_datetime
+from app.dataset.cache_helper import cached_analytics
+from app.order.db_helper import (
+    get_orders_aggregated_data_from_db, get_orders_aggregated_data_from_rollup, get_orders_page_from_db,
+    PERIOD_FORMATS, ORDER_SORTS,
+)
+from app.dataset.page_helper import encode_cursor, decode_cursor, page_limit
+from app.dataset.rollup_helper import current_rollup_columns, whole_day_range
 from sqlalchemy import or_
 
 def normalize_dataframe_column_names(df: pd.DataFrame) -> pd.DataFrame:
@@ -142,9 +150,9 @@ def extract_orders_table_from_raw(df: pd.DataFrame) -> List[Dict[str, Any]]:
 
     # Type conversions
     if "amount" in projected.columns:
-        projected["amount"] = pd.to_numeric(projected["amount"], errors="coerce").fillna(0)
+        projected["amount"] = ensure_numeric(projected["amount"]).fillna(0)
     if "date" in projected.columns:
-        projected["date"] = pd.to_datetime(projected["date"], errors="coerce")
+        projected["date"] = ensure_datetime(projected["date"])
 
     return projected.where(pd.notnull(projected), None).to_dict(orient="records")
 
@@ -160,43 +168,25 @@ def get_orders_in_range(
     Uses stored column mappings (not LLM extraction).
     """
 
-    # --- Step 1: Identify user or guest ---
-    user = identity.get("user")
-    user_id = getattr(user, "id", None) if user else None
-    guest_id = identity.get("guest_id")
-
-    # --- Step 2: Find file mappings ---
-    q = db.query(ColumnMapping).filter(ColumnMapping.analysis_type == "order")
-    if user_id:
-        q = q.filter(ColumnMapping.user_id == user_id)
-    elif guest_id:
-        q = q.filter(ColumnMapping.guest_id == guest_id)
-
-    if file_id:
-        q = q.filter(ColumnMapping.file_id == file_id)
-
-    mapping_obj = q.first()
+    # --- Step 1 + 2: Identify user or guest and find file mappings ---
+    mapping_obj = _find_order_mapping(db, identity, file_id)
     if not mapping_obj or not mapping_obj.mapping:
         return []
 
     mapping = mapping_obj.mapping  # e.g. {"orderId": "م", "orderDate": "التاريخ", ...}
 
   
-    # --- Step 3: Fetch all rows for this file ---
-    rows_q = db.query(FileRow).filter(FileRow.file_id == mapping_obj.file_id)
-    rows = rows_q.all()
-    if not rows:
-        return []
-
-    records = [r.data for r in rows]
-    df = pd.DataFrame(records)
-
-    # --- Step 4: Apply field mapping safely ---
+    # --- Step 3: Apply field mapping safely ---
     order_date_col = mapping.get("orderDate")
     amount_col = mapping.get("totalAmount")
     order_id_col = mapping.get("orderId")
     customer_col = mapping.get("customerName")
 
+    # --- Step 4: Load only the mapped columns for this file ---
+    df = load_file_frame(db, mapping_obj.file_id, [c for c in [order_id_col, customer_col, order_date_col, amount_col] if c])
+    if df.empty:
+        return []
+
     if not order_date_col or order_date_col not in df.columns:
         return []
 
@@ -209,7 +199,7 @@ def get_orders_in_range(
     })
 
     # --- Step 6: Convert and filter dates ---
-    df_orders["date"] = pd.to_datetime(df_orders["date"], errors="coerce")
+    df_orders["date"] = ensure_datetime(df_orders["date"])
     df_orders = df_orders.dropna(subset=["date"])
 
     try:
@@ -233,6 +223,101 @@ def get_orders_in_range(
 
     return df_filtered.to_dict(orient="records")
 
+def _find_order_mapping(db: Session, identity: dict, file_id: Optional[int] = None):
+    user = identity.get("user")
+    user_id = getattr(user, "id", None) if user else None
+    guest_id = identity.get("guest_id")
+
+    q = db.query(ColumnMapping).filter(ColumnMapping.analysis_type == "order")
+    if user_id:
+        q = q.filter(ColumnMapping.user_id == user_id)
+    elif guest_id:
+        q = q.filter(ColumnMapping.guest_id == guest_id)
+
+    if file_id:
+        q = q.filter(ColumnMapping.file_id == file_id)
+
+    return q.first()
+
+def get_orders_page(
+    db: Session,
+    start_date: str,
+    end_date: str,
+    identity: dict,
+    file_id: Optional[int] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "date",
+    order: str = "desc",
+    customer: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    One page of get_orders_in_range, sorted and filtered in the database.
+    Pass the returned next_cursor back (with the same sort and filters) for the following page;
+    total (matching orders) comes with the first page only.
+    """
+
+    empty = {"file_id": file_id, "columns": ["order_id", "customer_name", "date", "amount"], "rows": [], "next_cursor": None, "total": 0}
+
+    # Step 1: Validate the request
+    if sort not in ORDER_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(ORDER_SORTS)}.")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    after = decode_cursor(cursor, 2)
+    try:
+        start_dt = pd.to_datetime(start_date).to_pydatetime()
+        end_dt = pd.to_datetime(end_date).to_pydatetime()
+    except Exception:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+    # Step 2: Same mapping lookup as get_orders_in_range
+    mapping_obj = _find_order_mapping(db, identity, file_id)
+    if not mapping_obj or not mapping_obj.mapping or not mapping_obj.mapping.get("orderDate"):
+        return empty
+
+    mapping = mapping_obj.mapping
+    keys = {
+        "order_id": mapping.get("orderId"),
+        "customer_name": mapping.get("customerName"),
+        "date": mapping["orderDate"],
+        "amount": mapping.get("totalAmount"),
+    }
+    date_column = (
+        db.query(FileColumn)
+        .filter(FileColumn.file_id == mapping_obj.file_id, FileColumn.name == keys["date"])
+        .first()
+    )
+
+    # Step 3: Fetch the page
+    rows, last, total = get_orders_page_from_db(
+        db,
+        mapping_obj.file_id,
+        keys,
+        start_dt,
+        end_dt,
+        sort=sort,
+        descending=order == "desc",
+        after=after,
+        limit=page_limit(limit),
+        customer=customer,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        iso_dates=bool(date_column and date_column.dtype == "datetime" and date_column.normalized),
+        day_first=bool(date_column and (date_column.format or "").startswith("%d")),
+    )
+
+    return {
+        "file_id": mapping_obj.file_id,
+        "columns": ["order_id", "customer_name", "date", "amount"],
+        "rows": rows,
+        "next_cursor": encode_cursor(last) if last else None,
+        "total": total,
+    }
+
+@cached_analytics("orders-in-graph")
 def get_orders_aggregated(
     db: Session,
     start_date: str,
@@ -283,108 +368,72 @@ def get_orders_aggregated(
     if not file_columns or not order_mapping:
         return {"file_id": target_file.id, "columns": ["period", "orderCount", "totalAmount"], "rows": []}
 
-    # Step 3: Build reverse mapping: actual column name → logical name
-    # Example: "التاريخ" -> "orderDate"
-    reverse_mapping = {}
+    # Step 3: Resolve the mapped columns that exist in this file
+    # Example: "orderDate" -> "التاريخ"
     mapping = order_mapping.mapping or {}
-    print ("mappings or product sample", mapping)
-
-    for logical_name, mapped_col in mapping.items():
-        for col in file_columns:
-            # Normalize both for comparison
-            col_name = str(col.name).strip()
-            if col_name == mapped_col.strip():
-                reverse_mapping[col_name] = logical_name
-                break
-
-    # Step 4: Load file rows
-    rows = db.query(FileRow).filter(FileRow.file_id == target_file.id).all()
-
-    print ("rows from file",rows)
-
-    if not rows:
-        return {"file_id": target_file.id, "columns": ["period", "orderCount", "totalAmount"], "rows": []}
-
-    df = pd.DataFrame([r.data for r in rows])
-
-    print("df data frame", df)
-
-    if df.empty:
-        return {"file_id": target_file.id, "columns": ["period", "orderCount", "totalAmount"], "rows": []}
-
-    df = df.where(pd.notnull(df), None)
-    print("second df", df)
-    df.columns = [str(c).strip() for c in df.columns]
-
-    # Step 5: Rename columns using reverse mapping
-    df = df.rename(columns=reverse_mapping)
-
-    print("third df", df)
+    known_columns = {str(col.name).strip(): col for col in file_columns}
+    mapped = {
+        logical_name: mapped_col.strip()
+        for logical_name, mapped_col in mapping.items()
+        if mapped_col and mapped_col.strip() in known_columns
+    }
 
-    # Step 6: Identify columns
-    date_col = "orderDate" if "orderDate" in df.columns else None
-    # If totalAmount is missing, try computing it
-    lower_cols = [c.lower() for c in df.columns]
+    # Step 4: Identify columns
+    date_key = mapped.get("orderDate")
+    amount_key = mapped.get("totalAmount")
+    price_key = qty_key = None
 
-    if "totalamount" not in lower_cols and "price" in lower_cols and "quantity" in lower_cols:
-        df["totalAmount"] = (
-            pd.to_numeric(df.loc[:, [c for c in df.columns if c.lower() == "price"][0]], errors="coerce").fillna(0)
-            * pd.to_numeric(df.loc[:, [c for c in df.columns if c.lower() == "quantity"][0]], errors="coerce").fillna(0)
-        )
+    # If totalAmount is missing, compute it from raw price/quantity columns
+    if not amount_key:
+        available = list_file_columns(db, target_file.id)
+        if not any(c.lower() == "totalamount" for c in available):
+            price_key = next((c for c in available if c.lower() == "price"), None)
+            qty_key = mapped.get("quantity") or next((c for c in available if c.lower() == "quantity"), None)
 
-    amount_col = "totalAmount" if "totalAmount" in df.columns else None
-    order_id_col = "orderId" if "orderId" in df.columns else None
-    print("amount",amount_col)
-    print("date",date_col)
-    print("orde id",order_id_col)
-
-    if not all([date_col, amount_col]):
+    if not date_key or not (amount_key or (price_key and qty_key)):
         return {"file_id": target_file.id, "columns": ["period", "orderCount", "totalAmount"], "rows": []}
 
-    # Step 7: Convert + clean
-    df[amount_col] = pd.to_numeric(df[amount_col], errors="coerce").fillna(0)
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce").dt.tz_localize(None)
-    df = df.dropna(subset=[date_col])
-
-    print("fourth df:", df)
-
-    # Step 8: Filter by date range
+    # Step 5: Validate the range and granularity
     try:
-        start_dt = pd.to_datetime(start_date)
-        end_dt = pd.to_datetime(end_date)
+        start_dt = pd.to_datetime(start_date).to_pydatetime()
+        end_dt = pd.to_datetime(end_date).to_pydatetime()
     except Exception:
         raise ValueError("Invalid date format. Use YYYY-MM-DD.")
 
-    df = df.loc[(df[date_col] >= start_dt) & (df[date_col] <= end_dt)]
-
-    print("fifth df:", df)
-    if df.empty:
-        return {"file_id": target_file.id, "columns": ["period", "orderCount", "totalAmount"], "rows": []}
-
-    # Step 9: Aggregate
-    if granularity == "daily":
-        df["period"] = df[date_col].dt.strftime("%Y-%m-%d")
-    elif granularity == "monthly":
-        df["period"] = df[date_col].dt.strftime("%Y-%m")
-    elif granularity == "yearly":
-        df["period"] = df[date_col].dt.strftime("%Y")
-    else:
+    if granularity not in PERIOD_FORMATS:
         raise ValueError("Granularity must be 'daily', 'monthly', or 'yearly'.")
 
-    df_agg = (
-        df.groupby("period")
-        .agg(orderCount=(order_id_col or amount_col, "count"), totalAmount=(amount_col, "sum"))
-        .reset_index()
+    # Step 6: Sum the daily rollups when they were built from these same columns for this version
+    date_format = known_columns[date_key].format or ""
+    rollup = current_rollup_columns(db, target_file)
+    days = whole_day_range(start_dt, end_dt)
+    if (
+        amount_key and rollup and days
+        and (rollup["date"], rollup["amount"], rollup["order"], rollup["day_first"])
+        == (date_key, amount_key, mapped.get("orderId"), date_format.startswith("%d"))
+    ):
+        rows = get_orders_aggregated_data_from_rollup(db, target_file.id, days, granularity, count_orders=bool(mapped.get("orderId")))
+        return {"file_id": target_file.id, "columns": ["period", "orderCount", "totalAmount"], "rows": rows}
+
+    # Step 7: Otherwise aggregate the rows in the database; only the buckets come back
+    rows = get_orders_aggregated_data_from_db(
+        db,
+        target_file.id,
+        date_key,
+        start_dt,
+        end_dt,
+        granularity,
+        amount_key=amount_key,
+        price_key=price_key,
+        qty_key=qty_key,
+        count_key=mapped.get("orderId"),
+        day_first=date_format.startswith("%d"),
     )
 
-    # Step 10: Final output
-    df_agg["totalAmount"] = df_agg["totalAmount"].astype(float)
-
     return {
 
         "file_id": target_file.id,
         "columns": ["period", "orderCount", "totalAmount"],
-        "rows": df_agg.to_dict(orient="records"),
+        "rows": rows,
 
     }
-
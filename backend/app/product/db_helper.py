@@ -0,0 +1,129 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, text, literal
+from datetime import date, datetime
+from app.models import FileRow, FileDailyProduct
+from app.dataset.rollup_helper import rollup_day_filter
+from app.dataset.page_helper import keyset_after, contains_pattern
+from app.dataset.sql_helper import json_value, json_text, json_numeric, json_timestamp
+
+# Sort keys of the paged product sales table ("id" is file order)
+PRODUCT_SALES_SORTS = ("id", "date", "name", "price", "quantity")
+
+def get_top_products_data_from_rollup(db: Session, file_id: int, days: tuple[date, date], line_totals: bool, limit: int) -> list[dict]:
+
+    """
+    Top `limit` products of a file between two days, from its day x product rollup:
+    [{"product", "orders", "total_amount"}] by amount, then order count.
+    `line_totals` sums price x quantity instead of totalAmount.
+    """
+
+    amount = FileDailyProduct.line_amount if line_totals else FileDailyProduct.amount
+    orders = func.sum(FileDailyProduct.rows).label("orders")
+    total_amount = func.sum(amount).label("total_amount")
+
+    rows = (
+        db.query(FileDailyProduct.product, orders, total_amount)
+        .filter(FileDailyProduct.file_id == file_id, rollup_day_filter(FileDailyProduct, days))
+        .group_by(FileDailyProduct.product)
+        .order_by(total_amount.desc(), orders.desc(), FileDailyProduct.product.op("#>>")(text("'{}'")).collate("C"))
+        .limit(limit)
+        .all()
+    )
+
+    return [
+        {"product": r.product, "orders": int(r.orders), "total_amount": float(r.total_amount)}
+        for r in rows
+    ]
+
+def get_products_sales_page_from_db(
+    db: Session,
+    file_id: int,
+    keys: dict,
+    start_dt: datetime,
+    end_dt: datetime,
+    sort: str = "id",
+    descending: bool = False,
+    after: list | None = None,
+    limit: int = 50,
+    product: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    day_first: bool = False,
+) -> tuple[list[dict], list | None, dict | None]:
+
+    """
+    One page of a file's product sale lines dated within [start_dt, end_dt], sorted and filtered in PostgreSQL.
+    `keys` maps name / category / price / quantity / date to raw column names (date is required); a missing
+    price counts as 0 and a missing quantity as 1, like the full table. Returns (rows, keyset of the last row
+    when more rows follow, {"total", "grand_total"} of all matching lines on the first page).
+    """
+
+    # Ambiguous dates like 03/04/2024 are read the way the file writes them
+    if day_first:
+        db.execute(text("SET LOCAL datestyle = 'ISO, DMY'"))
+
+    # Step 1: Columns and sort keys
+    order_date = json_timestamp(keys["date"])
+    price = func.coalesce(json_numeric(keys["price"]), 0) if keys.get("price") else literal(0)
+    quantity = func.coalesce(json_numeric(keys["quantity"]), 1) if keys.get("quantity") else literal(1)
+    name_text = func.coalesce(json_text(keys["name"]), "") if keys.get("name") else None
+    sorts = {
+        "id": FileRow.id,
+        "date": order_date,
+        "name": name_text.collate("C") if name_text is not None else None,
+        "price": price if keys.get("price") else None,
+        "quantity": quantity if keys.get("quantity") else None,
+    }
+    sort_expr = sorts.get(sort)
+    if sort_expr is None:
+        raise ValueError(f"Cannot sort by {sort!r}: the column is not mapped.")
+
+    # Step 2: Filters
+    filters = [FileRow.file_id == file_id, order_date >= start_dt, order_date <= end_dt]
+    if product:
+        if name_text is None:
+            raise ValueError("Cannot filter by product: the column is not mapped.")
+        filters.append(name_text.ilike(contains_pattern(product)))
+    if min_amount is not None:
+        filters.append(price >= min_amount)
+    if max_amount is not None:
+        filters.append(price <= max_amount)
+
+    # Step 3: Totals over every matching line, once, on the first page
+    totals = None
+    if after is None:
+        count, grand_total = db.query(func.count(), func.sum(price * quantity)).select_from(FileRow).filter(*filters).one()
+        totals = {"total": count, "grand_total": float(grand_total or 0)}
+    else:
+        filters.append(keyset_after(sort_expr, FileRow.id, descending, after))
+
+    # Step 4: One row past the page tells whether another page follows
+    order_by = [sort_expr.desc(), FileRow.id.desc()] if descending else [sort_expr.asc(), FileRow.id.asc()]
+    rows = (
+        db.query(
+            FileRow.id.label("row_id"),
+            sort_expr.label("sort_value"),
+            (json_value(keys["name"]) if keys.get("name") else literal(None)).label("name"),
+            (json_value(keys["category"]) if keys.get("category") else literal(None)).label("category"),
+            price.label("price"),
+            quantity.label("quantity"),
+            func.to_char(order_date, "YYYY-MM-DD").label("date"),
+        )
+        .filter(*filters)
+        .order_by(*order_by)
+        .limit(limit + 1)
+        .all()
+    )
+
+    last = [rows[limit - 1].sort_value, rows[limit - 1].row_id] if len(rows) > limit else None
+    return [
+        {
+            "id": r.row_id,
+            "name": r.name,
+            "category": r.category,
+            "price": float(r.price),
+            "quantity": float(r.quantity),
+            "date": r.date,
+        }
+        for r in rows[:limit]
+    ], last, totals
@@ -5,8 +5,16 @@ from typing import Any, List, Dict
 from app.dashboard.llm_helper import infer_columns_with_llm, infer_product_column_with_llm
 from app.dashboard.operation_helper import pick_columns_heuristic, _safe_sample_values
 from datetime import datetime
-from app.models import UploadedFile, ColumnMapping, FileRow
+from app.models import UploadedFile, ColumnMapping, FileRow, FileColumn
+from app.dataset.operation_helper import load_file_frame, list_file_columns, ensure_numeric, ensure_datetime
+from app.dataset.aggregate_helper import is_large_file, parallel_group_aggregate, top_n, plain_value
+from app.dataset.cache_helper import cached_analytics
+from app.dataset.rollup_helper import current_rollup_columns, whole_day_range
+from app.product.db_helper import get_top_products_data_from_rollup, get_products_sales_page_from_db, PRODUCT_SALES_SORTS
+from app.dashboard.db_helper import resolve_target_file, get_latest_mapping
+from app.dataset.page_helper import encode_cursor, decode_cursor, page_limit
 from sqlalchemy import or_
+import functools
 
 ANALYSIS_FIELDS = {
     "order": ["orderId","orderDate","quantity","totalAmount","orderStatus","customerName","customerPhone"],
@@ -50,6 +58,7 @@ def get_total_products(db):
     "row_count": len(df),
   }
 
+@cached_analytics("top-products")
 def get_top_selling_products(
     db: Session,
     identity: dict,
@@ -128,19 +137,12 @@ def get_top_selling_products(
     if not product_col:
         return {"file_id": target_file.id, "product_column": None, "amount_column": None, "rows": []}
 
-    # Step 4: Query file rows
-    query = db.query(FileRow).filter(FileRow.file_id == target_file.id)
-    if user:
-        query = query.join(UploadedFile).filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.join(UploadedFile).filter(UploadedFile.guest_id == guest_id)
+    # Step 4 + 5: Files too big for one DataFrame are aggregated batch by batch
+    if is_large_file(target_file):
+        return _top_products_streamed(db, target_file, product_col, total_amount_col, price_col, qty_col, limit)
 
-    rows = query.all()
-    if not rows:
-        return {"file_id": target_file.id, "product_column": product_col, "amount_column": None, "rows": []}
-
-    # Step 5: Convert rows to DataFrame
-    df = pd.DataFrame([r.data for r in rows])
+    # Otherwise load only the mapped columns (ownership was checked in step 1)
+    df = load_file_frame(db, target_file.id, [c for c in [product_col, total_amount_col, price_col, qty_col] if c])
     if df.empty:
         return {"file_id": target_file.id, "product_column": product_col, "amount_column": None, "rows": []}
 
@@ -150,11 +152,11 @@ def get_top_selling_products(
     # Step 6: Determine effective amount column
     effective_amount_col = None
     if total_amount_col and total_amount_col in df.columns:
-        df[total_amount_col] = pd.to_numeric(df[total_amount_col], errors="coerce").fillna(0)
+        df[total_amount_col] = ensure_numeric(df[total_amount_col]).fillna(0)
         effective_amount_col = total_amount_col
     elif price_col and qty_col and price_col in df.columns and qty_col in df.columns:
-        df[price_col] = pd.to_numeric(df[price_col], errors="coerce").fillna(0)
-        df[qty_col] = pd.to_numeric(df[qty_col], errors="coerce").fillna(1)
+        df[price_col] = ensure_numeric(df[price_col]).fillna(0)
+        df[qty_col] = ensure_numeric(df[qty_col]).fillna(1)
         df["__line_total__"] = df[price_col] * df[qty_col]
         effective_amount_col = "__line_total__"
     else:
@@ -184,6 +186,7 @@ def get_top_selling_products(
         "rows": records
     }
 
+@cached_analytics("top-products-by-date")
 def get_top_selling_products_by_date(
     db: Session,
     identity: dict,
@@ -264,19 +267,29 @@ def get_top_selling_products_by_date(
     if not product_col:
         return {"file_id": target_file.id, "product_column": None, "amount_column": None, "rows": []}
 
-    # Step 5: Query rows
-    query = db.query(FileRow).filter(FileRow.file_id == target_file.id)
-    if user:
-        query = query.join(UploadedFile).filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.join(UploadedFile).filter(UploadedFile.guest_id == guest_id)
+    # Step 5: Answer from the day x product rollup when it was built from these same columns
+    rows = _top_products_from_rollup(
+        db, target_file, product_col, total_amount_col, price_col, qty_col, order_date_col, start_date, end_date, limit
+    )
+    if rows is not None:
+        return rows
 
-    rows = query.all()
-    if not rows:
+    # Step 6: Load the mapped columns (plus an "orderDate" column when the date is unmapped)
+    if order_date_col:
+        date_columns = [order_date_col]
+    else:
+        date_columns = [c for c in list_file_columns(db, target_file.id) if c.strip().lower() == "orderdate"]
+    columns = [c for c in [product_col, total_amount_col, price_col, qty_col] if c] + date_columns
+    if is_large_file(target_file):
+        return _top_products_streamed(
+            db, target_file, product_col, total_amount_col, price_col, qty_col, limit,
+            date_col=next(iter(date_columns), None),
+            start_date=start_date, end_date=end_date,
+        )
+    df = load_file_frame(db, target_file.id, columns)
+    if df.empty:
         return {"file_id": target_file.id, "product_column": product_col, "amount_column": None, "rows": []}
 
-    # Step 6: Convert to DataFrame
-    df = pd.DataFrame([r.data for r in rows])
     df = df.where(pd.notnull(df), None)
     df.columns = [str(c).strip() for c in df.columns]
 
@@ -291,7 +304,7 @@ def get_top_selling_products_by_date(
         return {"file_id": target_file.id, "product_column": product_col, "amount_column": None, "rows": []}
 
     # Step 7: Filter by date range
-    df[order_date_col] = pd.to_datetime(df[order_date_col], errors="coerce").dt.tz_localize(None)
+    df[order_date_col] = ensure_datetime(df[order_date_col]).dt.tz_localize(None)
     start = pd.to_datetime(start_date, errors="coerce").tz_localize(None)
     end = pd.to_datetime(end_date, errors="coerce").tz_localize(None)
     df = df[(df[order_date_col] >= start) & (df[order_date_col] <= end)]
@@ -301,11 +314,11 @@ def get_top_selling_products_by_date(
     # Step 8: Determine amount source (totalAmount or price×quantity)
     effective_amount_col = None
     if total_amount_col and total_amount_col in df.columns:
-        df[total_amount_col] = pd.to_numeric(df[total_amount_col], errors="coerce").fillna(0)
+        df[total_amount_col] = ensure_numeric(df[total_amount_col]).fillna(0)
         effective_amount_col = total_amount_col
     elif price_col and qty_col and price_col in df.columns and qty_col in df.columns:
-        df[price_col] = pd.to_numeric(df[price_col], errors="coerce").fillna(0)
-        df[qty_col] = pd.to_numeric(df[qty_col], errors="coerce").fillna(1)
+        df[price_col] = ensure_numeric(df[price_col]).fillna(0)
+        df[qty_col] = ensure_numeric(df[qty_col]).fillna(1)
         df["__line_total__"] = df[price_col] * df[qty_col]
         effective_amount_col = "__line_total__"
     else:
@@ -335,6 +348,129 @@ def get_top_selling_products_by_date(
         "rows": records
     }
 
+def _prepare_sales_batch(df: pd.DataFrame, total_amount_col, price_col, qty_col, date_col, start, end) -> pd.DataFrame:
+    """The cleaning and date filter of the top-products helpers for one batch (module level, so it pickles)."""
+    df = df.where(pd.notnull(df), None)
+    df.columns = [str(c).strip() for c in df.columns]
+    if date_col:
+        df[date_col] = ensure_datetime(df[date_col]).dt.tz_localize(None)
+        df = df[(df[date_col] >= start) & (df[date_col] <= end)].copy()
+    if total_amount_col:
+        df[total_amount_col] = ensure_numeric(df[total_amount_col]).fillna(0)
+    else:
+        df[price_col] = ensure_numeric(df[price_col]).fillna(0)
+        df[qty_col] = ensure_numeric(df[qty_col]).fillna(1)
+        df["__line_total__"] = df[price_col] * df[qty_col]
+    return df
+
+def _top_products_streamed(
+    db: Session,
+    target_file,
+    product_col: str,
+    total_amount_col: str | None,
+    price_col: str | None,
+    qty_col: str | None,
+    limit: int,
+    date_col: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> Dict[str, Any]:
+    """
+    get_top_selling_products (with a date column and range: get_top_selling_products_by_date) for large files:
+    the same cleaning, filtering and group-by applied to one batch at a time, in parallel over the file's
+    partitions, partial sums merged.
+    """
+    empty = {"file_id": target_file.id, "product_column": product_col, "amount_column": None, "rows": []}
+    available = {str(c).strip() for c in list_file_columns(db, target_file.id)}
+    by_date = start_date is not None
+
+    # Step 1: The same column checks the in-memory path makes on its DataFrame
+    if product_col not in available:
+        return empty
+    if by_date and (not date_col or date_col not in available):
+        return empty
+    if total_amount_col and total_amount_col in available:
+        effective_amount_col = total_amount_col
+    elif price_col and qty_col and price_col in available and qty_col in available:
+        effective_amount_col = "__line_total__"
+    else:
+        return empty
+
+    start = end = None
+    if by_date:
+        start = pd.to_datetime(start_date, errors="coerce").tz_localize(None)
+        end = pd.to_datetime(end_date, errors="coerce").tz_localize(None)
+    prepare = functools.partial(
+        _prepare_sales_batch,
+        total_amount_col=effective_amount_col if effective_amount_col == total_amount_col else None,
+        price_col=price_col,
+        qty_col=qty_col,
+        date_col=date_col if by_date else None,
+        start=start,
+        end=end,
+    )
+
+    # Step 2: Map (per partition and batch group-by, across the analytics process pool) and
+    # reduce (merge the partial counts and sums)
+    grouped = parallel_group_aggregate(
+        db,
+        target_file.id,
+        [c for c in [product_col, total_amount_col, price_col, qty_col, date_col] if c],
+        [product_col],
+        {"orders": (product_col, "count"), "total_amount": (effective_amount_col, "sum")},
+        prepare=prepare,
+    )
+    if grouped is None:
+        return empty
+
+    # Step 3: Top N of the merged totals
+    records = [
+        {
+            "product": plain_value(row[product_col]),
+            "orders": int(row["orders"]),
+            "total_amount": plain_value(row["total_amount"]),
+        }
+        for row in top_n(grouped, ["total_amount", "orders"], limit).to_dict("records")
+    ]
+
+    return {
+        "file_id": target_file.id,
+        "product_column": product_col,
+        "amount_column": effective_amount_col,
+        "rows": records,
+    }
+
+def _top_products_from_rollup(db: Session, target_file, product_col, total_amount_col, price_col, qty_col, order_date_col, start_date, end_date, limit):
+    # None when the rollup cannot answer exactly: stale, built from other columns, or a range that is not whole days
+    rollup = current_rollup_columns(db, target_file)
+    if not rollup or not order_date_col or (rollup["date"], rollup["product"]) != (order_date_col, product_col):
+        return None
+    try:
+        days = whole_day_range(pd.to_datetime(start_date).to_pydatetime(), pd.to_datetime(end_date).to_pydatetime())
+    except Exception:
+        return None
+    if not days:
+        return None
+
+    available = list_file_columns(db, target_file.id)
+    if total_amount_col and total_amount_col in available:
+        if rollup["amount"] != total_amount_col:
+            return None
+        line_totals, effective_amount_col = False, total_amount_col
+    elif price_col and qty_col and (rollup["price"], rollup["quantity"]) == (price_col, qty_col):
+        line_totals, effective_amount_col = True, "__line_total__"
+    else:
+        return None
+
+    rows = get_top_products_data_from_rollup(db, target_file.id, days, line_totals, limit)
+    return {
+        "file_id": target_file.id,
+        "product_column": product_col,
+        "amount_column": effective_amount_col if rows else None,
+        "rows": rows
+    }
+
+@cached_analytics("products-sales-table")
 def get_products_sales_table(
     db: Session,
     identity: dict,
@@ -412,19 +548,11 @@ def get_products_sales_table(
         price_col = order_mapping.mapping.get("totalAmount")  # e.g. "Price"
         order_date_col = order_mapping.mapping.get("orderDate")
 
-    # --- Step 4: Load file rows ---
-    query = db.query(FileRow).filter(FileRow.file_id == target_file.id)
-    if user:
-        query = query.join(UploadedFile).filter(UploadedFile.user_id == user.id)
-    elif guest_id:
-        query = query.join(UploadedFile).filter(UploadedFile.guest_id == guest_id)
-
-    rows = query.all()
-    if not rows:
-        return {"columns": {}, "rows": []}
-
-    # --- Step 5: Convert to DataFrame ---
-    df = pd.DataFrame([r.data for r in rows])
+    # --- Step 4 + 5: Load the mapped columns; unmapped ones are guessed from all columns below ---
+    columns = None
+    if all([product_col, category_col, qty_col, price_col, order_date_col]):
+        columns = [product_col, category_col, qty_col, price_col, order_date_col]
+    df = load_file_frame(db, target_file.id, columns)
     if df.empty:
         return {"columns": {}, "rows": []}
 
@@ -441,7 +569,7 @@ def get_products_sales_table(
     if not order_date_col or order_date_col not in df.columns:
         return {"columns": {}, "rows": []}
 
-    df[order_date_col] = pd.to_datetime(df[order_date_col], errors="coerce").dt.tz_localize(None)
+    df[order_date_col] = ensure_datetime(df[order_date_col]).dt.tz_localize(None)
     start = pd.to_datetime(start_date, errors="coerce").tz_localize(None)
     end = pd.to_datetime(end_date, errors="coerce").tz_localize(None)
 
@@ -461,13 +589,13 @@ def get_products_sales_table(
 
     # --- Step 7: Clean numeric data ---
     if qty_col and qty_col in df.columns:
-        df[qty_col] = pd.to_numeric(df[qty_col], errors="coerce").fillna(1)
+        df[qty_col] = ensure_numeric(df[qty_col]).fillna(1)
     else:
         qty_col = "__dummy_qty__"
         df[qty_col] = 1
 
     if price_col and price_col in df.columns:
-        df[price_col] = pd.to_numeric(df[price_col], errors="coerce").fillna(0.0)
+        df[price_col] = ensure_numeric(df[price_col]).fillna(0.0)
     else:
         price_col = "__dummy_price__"
         df[price_col] = 0.0
@@ -495,3 +623,98 @@ def get_products_sales_table(
         },
         "rows": results,
     }
+
+def get_products_sales_page(
+    db: Session,
+    identity: dict,
+    start_date: str,
+    end_date: str,
+    file_id: int | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+    sort: str = "id",
+    order: str = "asc",
+    product: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+) -> Dict[str, Any]:
+
+    """
+    One page of get_products_sales_table, sorted and filtered in the database; rows carry the
+    file row id as "id". Pass next_cursor back (with the same sort and filters) for the following
+    page; total and grand_total (sum of price x quantity) come with the first page only.
+    """
+
+    empty = {"columns": {}, "rows": [], "next_cursor": None, "total": 0, "grand_total": 0.0}
+
+    # Step 1: Validate the request
+    if sort not in PRODUCT_SALES_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(PRODUCT_SALES_SORTS)}.")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    after = decode_cursor(cursor, 2)
+    try:
+        start_dt = pd.to_datetime(start_date).to_pydatetime()
+        end_dt = pd.to_datetime(end_date).to_pydatetime()
+    except Exception:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+    # Step 2: Find target file
+    target_file = resolve_target_file(db, identity, file_id)
+    if not target_file:
+        return empty
+
+    # Step 3: Resolve the columns the way the full table does, unmapped ones guessed by name
+    product_mapping = get_latest_mapping(db, target_file.id, "product")
+    order_mapping = get_latest_mapping(db, target_file.id, "order")
+    available = {str(c).strip(): c for c in list_file_columns(db, target_file.id)}
+
+    def guess(match):
+        return next((raw for name, raw in available.items() if match(name.lower())), None)
+
+    keys = {
+        "name": product_mapping.get("productName") or guess(lambda c: "product" in c),
+        "category": product_mapping.get("category") or guess(lambda c: "category" in c),
+        "quantity": product_mapping.get("quantity") or guess(lambda c: c in ["quantity", "qty", "count", "units"]),
+        "price": order_mapping.get("totalAmount") or guess(lambda c: c in ["price", "unit_price", "rate"]),
+        "date": order_mapping.get("orderDate") or guess(lambda c: c == "orderdate"),
+    }
+    if not keys["date"]:
+        return {**empty, "file_id": target_file.id}
+
+    date_format = (
+        db.query(FileColumn.format)
+        .filter(FileColumn.file_id == target_file.id, FileColumn.name == keys["date"])
+        .scalar()
+    )
+
+    # Step 4: Fetch the page
+    rows, last, totals = get_products_sales_page_from_db(
+        db,
+        target_file.id,
+        keys,
+        start_dt,
+        end_dt,
+        sort=sort,
+        descending=order == "desc",
+        after=after,
+        limit=page_limit(limit),
+        product=product,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        day_first=(date_format or "").startswith("%d"),
+    )
+
+    return {
+        "file_id": target_file.id,
+        "columns": {
+            "product_column": keys["name"],
+            "category_column": keys["category"],
+            "price_column": keys["price"] or "__dummy_price__",
+            "quantity_column": keys["quantity"] or "__dummy_qty__",
+            "date_column": keys["date"],
+        },
+        "rows": rows,
+        "next_cursor": encode_cursor(last) if last else None,
+        **(totals or {"total": None, "grand_total": None}),
+    }
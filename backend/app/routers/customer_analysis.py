@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.customer.operation_helper import get_customers_table, aggregate_customers_from_orders
+from app.customer.operation_helper import get_customers_table, get_customers_page, aggregate_customers_from_orders
 import math
 from app.utils.deps import get_identity
 from typing import Dict, Any, List
@@ -9,8 +9,25 @@ from typing import Dict, Any, List
 router = APIRouter(prefix="/customer-analysis", tags=["customer-analysis"])
 
 @router.get("/customers-table")
-def customers_table(identity: dict = Depends(get_identity), db: Session = Depends(get_db), file_id: int | None = Query(None, description = "Optional file ID to filter by")):
-
+def customers_table(
+    identity: dict = Depends(get_identity),
+    db: Session = Depends(get_db),
+    file_id: int | None = Query(None, description = "Optional file ID to filter by"),
+    limit: int | None = Query(None, description="Page size; pages the result (with cursor, sort, order and search)"),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    sort: str = Query("first_seen", description="first_seen, customerName, phone or city"),
+    order: str = Query("asc", description="asc or desc"),
+    search: str | None = Query(None, description="Customer name or phone contains"),
+):
+
+    if limit is not None:
+        try:
+            return get_customers_page(
+                db=db, identity=identity, file_id=file_id,
+                limit=limit, cursor=cursor, sort=sort, order=order, search=search,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     response = get_customers_table(db=db, identity=identity, file_id = file_id)
     
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.dashboard.operation_helper import get_dashboard_data, get_top_customers, get_total_orders_count, get_total_sales, get_total_customers, get_total_products
+from app.dashboard.operation_helper import get_dashboard_data, get_top_customers, get_total_orders_count, get_total_sales, get_total_customers, get_total_products, get_dashboard_summary
 from app.utils.deps import get_identity
 from fastapi import Query, Request
 
@@ -56,5 +56,13 @@ def total_products(db: Session = Depends(get_db), identity: dict = Depends(get_i
 
     return response
 
+@router.get("/summary")
+def summary(db: Session = Depends(get_db), identity: dict = Depends(get_identity), file_id: int | None = Query(None, description="Optional file ID"), limit: int = 5):
 
+    """
+    Returns the KPI cards, top customers and latest rows of the dashboard in one response.
+    """
 
+    response = get_dashboard_summary(db, identity, file_id, limit)
+
+    return response
@@ -7,6 +7,12 @@ from sqlalchemy import desc, or_
 from app.database import get_db
 from app.utils.deps import get_identity
 from app.models import FileColumn, ColumnMapping, UploadedFile
+from app.dataset.operation_helper import load_file_frame
+from app.upload.operation_helper import infer_column_types
+from app.dataset.index_helper import schedule_file_indexes
+from app.dataset.cache_helper import bump_file_version
+from app.dataset.rollup_helper import schedule_file_rollups
+from app.dashboard.db_helper import refresh_file_summary_in_db
 
 router = APIRouter()
 
@@ -45,12 +51,17 @@ def save_mapping(payload: MappingPayload, db: Session = Depends(get_db), identit
         file_id = latest_file.id
 
     # ✅ STEP 1: Store column names in FileColumn if not already saved
+    # (files ingested with type inference already have them; older files get their types inferred here,
+    # with their values left as uploaded, i.e. not normalized)
     existing_cols = {fc.name.lower() for fc in db.query(FileColumn).filter(FileColumn.file_id == file_id).all()}
 
+    missing = list(dict.fromkeys(c for c in payload.mapping.values() if c.lower() not in existing_cols))
+    column_types = infer_column_types(load_file_frame(db, file_id, missing)) if missing else {}
+
     new_columns = []
-    for user_col_name in payload.mapping.values():
-        if user_col_name.lower() not in existing_cols:
-            new_columns.append(FileColumn(file_id=file_id, name=user_col_name, dtype="string"))
+    for user_col_name in missing:
+        dtype, fmt = column_types.get(user_col_name, ("string", None))
+        new_columns.append(FileColumn(file_id=file_id, name=user_col_name, dtype=dtype, format=fmt, normalized=False))
 
     if new_columns:
         db.add_all(new_columns)
@@ -88,5 +99,13 @@ def save_mapping(payload: MappingPayload, db: Session = Depends(get_db), identit
             )
             db.add(cm)
 
+    # Analytics cached for the old mappings must not be served any more;
+    # the headline numbers for the new ones are committed with the version bump
+    bump_file_version(db, file_id)
+    refresh_file_summary_in_db(db, file_id)
     db.commit()
+
+    # ✅ STEP 3: Build the per-file indexes and daily rollups these mappings call for (in the background)
+    schedule_file_indexes(file_id)
+    schedule_file_rollups(file_id)
     return {"ok": True, "file_id": file_id}
@@ -4,130 +4,178 @@ from sqlalchemy.orm import Session
 from app import models
 from app.database import get_db
 from app.utils.deps import get_identity 
-import pandas as pd
-from io import BytesIO
-import cloudinary
-import cloudinary.uploader
-import time
-import re
 import traceback
 import logging
-import json
-import math
-from typing import Any
+import os
+from datetime import datetime
+from typing import Any, Optional
+from app.upload.operation_helper import spool_upload
+from app.upload.job_helper import submit_ingest_job
+from app.upload.db_helper import find_duplicate_upload, drop_file_rows, release_blob
+from app.dataset.parquet_helper import drop_snapshot
+from app.dataset.index_helper import schedule_file_indexes
+from app.dataset.cache_helper import invalidate_file_frames
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# storing the data in both the cloudinary and database
-
-def clean_json(obj):
-    """Recursively replace NaN/Infinity/-Infinity with None for JSON compliance."""
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    elif isinstance(obj, dict):
-        return {k: clean_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_json(v) for v in obj]
-    return obj
-
-@router.post("/upload-file/")
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db),  response: Response = None, identity = Depends(get_identity), ):
+# storing the data in both cloudinary and the local blob store (see app/upload/job_helper.py)
+
+@router.post("/upload-file/", status_code=202)
+async def upload_file(file: UploadFile = File(...), append_to: Optional[int] = None, db: Session = Depends(get_db),  response: Response = None, identity = Depends(get_identity), ):
+    """
+    Accept an upload and hand it to the background ingestion pipeline.
+    Returns 202 with a job id right away; poll /upload-jobs/{job_id} for progress.
+    With ?append_to=<file_id> the rows are added to that existing file instead, skipping
+    rows it already has (same row content, or same mapped orderId).
+    """
+    spool_path = None
     try:
-        # Read file content
-        file_content = await file.read()
+        # Spool the upload to disk instead of holding it in memory
+        spool_path, content_hash, blob_size = await spool_upload(file)
 
          # 🔒 Ownership from identity
         owner_user = identity["user"]
         owner_guest = identity["guest_id"]
 
-        # Sanitize filename for Cloudinary
-        public_id_safe = re.sub(r'[^A-Za-z0-9_-]', '_', file.filename)
-        public_id = f"{public_id_safe}_{int(time.time())}"
-
-        # Upload to Cloudinary as raw
-        file_buffer = BytesIO(file_content)
-        result = cloudinary.uploader.upload(
-            file_buffer,
-            resource_type="raw",
-            folder="uploads",
-            public_id=public_id
-        )
-
-        # Parse file with pandas
-        buffer = BytesIO(file_content)
-        try:
-            if file.filename.endswith(".csv"):
-                df = pd.read_csv(buffer)
-            else:
-                df = pd.read_excel(buffer, engine="openpyxl")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"File parsing failed: {str(e)}")
+        if append_to is not None:
+            target = db.query(models.UploadedFile).filter(models.UploadedFile.id == append_to).first()
+            if not target:
+                raise HTTPException(status_code=404, detail="File not found")
+            if owner_user and target.user_id != owner_user.id:
+                raise HTTPException(status_code=403, detail="Unauthorized to access this file")
+            if not owner_user and target.guest_id != owner_guest:
+                raise HTTPException(status_code=403, detail="Unauthorized to access this file")
+            # Appends to one file run one at a time, after its initial ingestion
+            if target.status != "ready" or any(j.status in ("queued", "running") for j in target.jobs):
+                raise HTTPException(status_code=409, detail="File is still being ingested, try again shortly")
+
+            job = models.UploadJob(
+                file_id=target.id, status="queued", mode="append", archive_status="skipped", spool_path=spool_path
+            )
+            db.add(job)
+            db.commit()
 
-        # Normalize dataframe
-        df = df.dropna(how="all")
-        df.columns = [c.strip() for c in df.columns]
-        # Convert datetime-like columns to ISO strings to make JSON-serializable
-        try:
-            for col in df.columns:
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
-        except Exception:
-            pass
-        # Ensure JSON-safe values
-        df = df.where(pd.notnull(df), None)
-
-        # Store UploadedFile metadata
+            submit_ingest_job(job.id, spool_path)
+            spool_path = None
+
+            return {
+                "id": target.id,
+                "job_id": job.id,
+                "status": job.status,
+                "filename": target.filename,
+                "owner": owner_user.email if owner_user else f"guest:{owner_guest}",
+                "duplicate": False,
+            }
+
+        # Same bytes from the same owner: link to the dataset that is already there
+        duplicate = find_duplicate_upload(db, content_hash, owner_user, owner_guest)
+        if duplicate:
+            # Bump it so "latest file" lookups resolve to it again
+            duplicate.uploaded_at = datetime.utcnow()
+            db.commit()
+            latest_job = (
+                db.query(models.UploadJob)
+                .filter(models.UploadJob.file_id == duplicate.id)
+                .order_by(models.UploadJob.created_at.desc())
+                .first()
+            )
+            response.status_code = 200
+            return {
+                "id": duplicate.id,
+                "job_id": latest_job.id if latest_job else None,
+                "status": latest_job.status if latest_job else "completed",
+                "filename": duplicate.filename,
+                "owner": owner_user.email if owner_user else f"guest:{owner_guest}",
+                "duplicate": True,
+            }
+
+        # Store UploadedFile metadata (filled in by the ingest job)
         uploaded = models.UploadedFile(
             filename=file.filename,
             file_type=file.content_type,
-            total_rows=len(df),
-            total_columns=len(df.columns),
-            file_data=file_content,
-            cloudinary_url=result["secure_url"],
-            cloudinary_public_id=result["public_id"],
+            total_rows=0,
+            total_columns=0,
+            content_hash=content_hash,
+            blob_size=blob_size,
+            status="ingesting",
             user_id=(owner_user.id if owner_user else None),
             guest_id=(owner_guest if owner_guest and not owner_user else None)
         )
 
-        # Add main file record
+        # Add main file record + its ingest job
         try:
             db.add(uploaded)
+            db.flush()
+            job = models.UploadJob(file_id=uploaded.id, status="queued", spool_path=spool_path)
+            db.add(job)
             db.commit()
             db.refresh(uploaded)
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"DB commit failed for UploadedFile: {str(e)}")
-            
-        # Save rows
-        try:
-            for _, row in df.iterrows():
-                row_dict = row.to_dict()
-                safe_row = clean_json(row_dict)   # sanitize floats
-                db.add(models.FileRow(file_id=uploaded.id, data=safe_row))
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"DB commit failed for FileRow: {str(e)}")
+
+        # The job owns the spool file from here on
+        submit_ingest_job(job.id, spool_path)
+        spool_path = None
 
         return {
             "id": uploaded.id,
+            "job_id": job.id,
+            "status": job.status,
             "filename": uploaded.filename,
-            "rows": uploaded.total_rows,
-            "columns": uploaded.total_columns,
-            "cloudinary_url": uploaded.cloudinary_url,
-            "public_id": uploaded.cloudinary_public_id,
             "owner": owner_user.email if owner_user else f"guest:{owner_guest}",
+            "duplicate": False,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
         logger.error("Upload-file failed:\n%s", tb)  # Logs full traceback to console
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    finally:
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+
+@router.get("/upload-jobs/{job_id}")
+def upload_job_status(job_id: str, identity: dict = Depends(get_identity), db: Session = Depends(get_db)):
+    """Report progress of a background ingestion job: rows processed, throughput and errors."""
+    user = identity.get("user")
+    guest_id = identity.get("guest_id")
+
+    job = db.query(models.UploadJob).filter(models.UploadJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    # Check ownership through the job's file
+    if user and job.file.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Unauthorized to access this job")
+    if not user and job.file.guest_id != guest_id:
+        raise HTTPException(status_code=403, detail="Unauthorized to access this job")
+
+    elapsed = None
+    rows_per_second = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            rows_per_second = round(job.rows_processed / elapsed, 1)
+
+    return {
+        "job_id": job.id,
+        "file_id": job.file_id,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+        "rows_per_second": rows_per_second,
+        "error": job.error,
+        "archive_status": job.archive_status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
 
 @router.get("/files")
 def list_uploads(identity = Depends(get_identity), db: Session = Depends(get_db)):
@@ -143,7 +191,7 @@ def list_uploads(identity = Depends(get_identity), db: Session = Depends(get_db)
             "id": f.id,
             "name": f.filename,
             "uploadedAt": f.uploaded_at.isoformat() if f.uploaded_at else None,
-            "size": getattr(f, "size", None),
+            "size": f.blob_size,
             "contentType": getattr(f, "content_type", None)
         })
     
@@ -166,7 +214,42 @@ def download_file(file_id: int, identity: dict = Depends(get_identity), db: Sess
         raise HTTPException(status_code=403, detail="Unauthorized to access this file")
 
     if not file.cloudinary_url:
+        # Archival runs in the background after upload
+        if any(job.archive_status in ("pending", "running") for job in file.jobs):
+            raise HTTPException(status_code=409, detail="File is still being archived, try again shortly")
         raise HTTPException(status_code=400, detail="File has no Cloudinary URL")
 
     # Optional: could generate a time-limited signed URL if needed
-    return {"download_url": file.cloudinary_url, "filename": file.filename}
\ No newline at end of file
+    return {"download_url": file.cloudinary_url, "filename": file.filename}
+
+@router.delete("/files/{file_id}")
+def delete_file(file_id: int, identity: dict = Depends(get_identity), db: Session = Depends(get_db)):
+    """Delete an uploaded file with everything derived from it. Its rows go with a partition drop."""
+    user = identity.get("user")
+    guest_id = identity.get("guest_id")
+
+    file = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Check ownership
+    if user and file.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Unauthorized to access this file")
+    if not user and file.guest_id != guest_id:
+        raise HTTPException(status_code=403, detail="Unauthorized to access this file")
+
+    if any(job.status in ("queued", "running") for job in file.jobs):
+        raise HTTPException(status_code=409, detail="File is still being ingested, try again shortly")
+
+    content_hash = file.content_hash
+    drop_file_rows(db, file.id)
+    db.delete(file)
+    db.commit()
+
+    drop_snapshot(file_id)
+    invalidate_file_frames(file_id)
+    # Drops partial indexes left on file_rows_default, if the file ever had rows there
+    schedule_file_indexes(file_id)
+    release_blob(db, content_hash)
+
+    return {"ok": True, "file_id": file_id}
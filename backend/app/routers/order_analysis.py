@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.order.operation_helper import get_orders_in_range, get_orders_aggregated
+from app.order.operation_helper import get_orders_in_range, get_orders_aggregated, get_orders_page
 import math
 from app.utils.deps import get_identity
 from typing import Optional
@@ -26,9 +26,27 @@ def orders_in_range(
     end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
     db: Session = Depends(get_db),
     identity: dict = Depends(get_identity),
-    file_id: Optional[int] = Query(None, description="Optional file ID to filter by")
+    file_id: Optional[int] = Query(None, description="Optional file ID to filter by"),
+    limit: Optional[int] = Query(None, description="Page size; pages the result (with cursor, sort, order and filters)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    sort: str = Query("date", description="date, amount, customer_name or order_id"),
+    order: str = Query("desc", description="asc or desc"),
+    customer: Optional[str] = Query(None, description="Customer name contains"),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
 ):
-    """Return detailed orders between given dates."""
+    """Return detailed orders between given dates; one page at a time when `limit` is given."""
+    if limit is not None:
+        try:
+            page = get_orders_page(
+                db=db, start_date=start_date, end_date=end_date, identity=identity, file_id=file_id,
+                limit=limit, cursor=cursor, sort=sort, order=order,
+                customer=customer, min_amount=min_amount, max_amount=max_amount,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return sanitize_for_json(page)
+
     data = get_orders_in_range(db=db, start_date=start_date, end_date=end_date, identity=identity, file_id=file_id)
     return sanitize_for_json({
         "file_id": file_id,
@@ -45,5 +63,4 @@ def orders_in_range(
     identity: dict = Depends(get_identity),
     file_id: int | None = Query(None, description = "Optional file ID to filter by")
 ):
-    print("identity:", identity)
     return get_orders_aggregated(db=db, start_date=start_date, end_date=end_date, granularity=granularity, identity= identity, file_id=file_id)
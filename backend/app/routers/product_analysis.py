@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.utils.deps import get_identity
-from app.product.operation_helper import get_top_selling_products, get_top_selling_products_by_date, get_products_sales_table
+from app.product.operation_helper import get_top_selling_products, get_top_selling_products_by_date, get_products_sales_table, get_products_sales_page
 
 router = APIRouter(prefix="/product-analysis", tags=["product-analysis"])
 
@@ -30,7 +30,24 @@ def products_sales_table(
     file_id: int | None = None,
     db: Session = Depends(get_db),
     identity=Depends(get_identity),
+    limit: int | None = Query(None, description="Page size; pages the result (with cursor, sort, order and filters)"),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    sort: str = Query("id", description="id (file order), date, name, price or quantity"),
+    order: str = Query("asc", description="asc or desc"),
+    product: str | None = Query(None, description="Product name contains"),
+    min_amount: float | None = Query(None),
+    max_amount: float | None = Query(None),
 ):
+    if limit is not None:
+        try:
+            return get_products_sales_page(
+                db, identity, start_date, end_date, file_id,
+                limit=limit, cursor=cursor, sort=sort, order=order,
+                product=product, min_amount=min_amount, max_amount=max_amount,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     response = get_products_sales_table(db, identity, start_date, end_date, file_id)
     return response
 
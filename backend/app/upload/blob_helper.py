@@ -0,0 +1,39 @@
+import tempfile
+import hashlib
+import shutil
+import os
+
+# Content-addressed store for raw uploads: <BLOB_DIR>/<sha256[:2]>/<sha256>
+BLOB_DIR = os.getenv(
+    "UPLOAD_BLOB_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "blobs")),
+)
+
+def new_content_hash():
+    return hashlib.sha256()
+
+def blob_path(content_hash: str) -> str:
+    return os.path.join(BLOB_DIR, content_hash[:2], content_hash)
+
+def has_blob(content_hash: str) -> bool:
+    return os.path.exists(blob_path(content_hash))
+
+def store_blob(src_path: str, content_hash: str) -> str:
+    """
+    Copy a file into the store under its content hash and return the blob path.
+    Identical content is stored once; the copy is written to a temp name and renamed into place.
+    """
+    final = blob_path(content_hash)
+    if os.path.exists(final):
+        return final
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(final), suffix=".tmp")
+    os.close(fd)
+    shutil.copyfile(src_path, tmp)
+    os.replace(tmp, final)
+    return final
+
+def delete_blob(content_hash: str) -> None:
+    path = blob_path(content_hash)
+    if os.path.exists(path):
+        os.remove(path)
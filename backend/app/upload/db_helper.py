@@ -0,0 +1,199 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text, and_, or_, exists
+from datetime import datetime, timedelta
+from io import BytesIO
+import logging
+import os
+import pandas as pd
+from app.models import UploadedFile, UploadJob
+from app.database import engine
+from app.upload.operation_helper import dataframe_to_json_lines
+from app.upload.blob_helper import delete_blob
+
+logger = logging.getLogger(__name__)
+
+# Rows serialized and sent to the database per round trip
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "20000"))
+# How long partition create/drop may wait for the file_rows table lock
+PARTITION_LOCK_TIMEOUT_MS = int(os.getenv("PARTITION_LOCK_TIMEOUT_MS", "5000"))
+# Ingest jobs still "running" this long after they started are taken to have died with their worker
+INGEST_STALE_AFTER = int(os.getenv("INGEST_STALE_AFTER", "7200"))  # seconds
+
+def _copy_escape(value: str) -> str:
+    """Escape a JSON document for PostgreSQL COPY text format."""
+    return value.replace("\\", "\\\\")
+
+def file_partition_name(file_id: int) -> str:
+    return f"file_rows_{int(file_id)}"
+
+def _set_lock_timeout(db: Session) -> None:
+    # Partition DDL locks the whole file_rows table: give up quickly instead of queueing
+    # every other tenant's queries behind a long-running report
+    db.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT_MS}ms'"))
+
+def _reset_lock_timeout(db: Session) -> None:
+    # SET LOCAL outlives a released savepoint; the rest of the caller's transaction keeps the default
+    db.execute(text("SET LOCAL lock_timeout = DEFAULT"))
+
+def ensure_file_partition(db: Session, file_id: int) -> bool:
+    """
+    Create the file_rows partition for `file_id` if it does not exist yet.
+    Returns False when it cannot be created (lock timeout, or file_rows_default already holds
+    rows for the file); the rows then go to the default partition. The caller owns the transaction.
+    """
+    name = file_partition_name(file_id)
+    try:
+        with db.begin_nested():
+            _set_lock_timeout(db)
+            db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF file_rows FOR VALUES IN ({int(file_id)})"))
+            _reset_lock_timeout(db)
+        return True
+    except Exception:
+        logger.warning("Could not create partition %s, using file_rows_default", name, exc_info=True)
+        return False
+
+def drop_file_rows(db: Session, file_id: int) -> None:
+    """
+    Remove every row of a file by truncating its partition (no per-row DELETE, no dead tuples).
+    TRUNCATE locks only the file's partition, so other files stay readable and writable; the empty
+    partition is dropped later by drop_file_partition. Rows in file_rows_default, or all of them
+    if the partition lock is not granted in time, are deleted instead. The caller owns the transaction.
+    """
+    name = file_partition_name(file_id)
+    try:
+        with db.begin_nested():
+            _set_lock_timeout(db)
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                db.execute(text(f"TRUNCATE {name}"))
+            _reset_lock_timeout(db)
+    except Exception:
+        logger.warning("Could not truncate partition %s, deleting its rows instead", name, exc_info=True)
+    db.execute(text("DELETE FROM file_rows WHERE file_id = :file_id"), {"file_id": file_id})
+
+def drop_file_partition(file_id: int) -> None:
+    """
+    Drop a deleted file's partition, on an autocommit connection of its own.
+    DROP (and DETACH, which cannot run CONCURRENTLY while file_rows_default exists) takes
+    ACCESS EXCLUSIVE on file_rows, so this runs off the request path and gives up after
+    PARTITION_LOCK_TIMEOUT_MS; a partition left behind is empty and only costs a catalog entry.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"SET lock_timeout = '{PARTITION_LOCK_TIMEOUT_MS}ms'"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {file_partition_name(file_id)}"))
+
+def _copy_json_lines(db: Session, raw_cursor, table: str, lines: list[str], file_id: int = None) -> None:
+    """Send pre-serialized JSON rows to `table` with COPY (psycopg2) or a batched executemany."""
+    if file_id is not None:
+        columns, values = "file_id, data", ":file_id, CAST(:data AS JSONB)"
+        prefix = f"{file_id}\t"
+    else:
+        columns, values = "data", "CAST(:data AS JSONB)"
+        prefix = ""
+
+    if hasattr(raw_cursor, "copy_expert"):
+        buffer = BytesIO("".join(f"{prefix}{_copy_escape(line)}\n" for line in lines).encode("utf-8"))
+        raw_cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+    else:
+        db.execute(
+            text(f"INSERT INTO {table} ({columns}) VALUES ({values})"),
+            [{"file_id": file_id, "data": line} for line in lines],
+        )
+
+def bulk_insert_file_rows(db: Session, file_id: int, df: pd.DataFrame, batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """
+    Stream the rows of `df` into file_rows for `file_id`.
+    Uses COPY when the driver supports it (psycopg2), otherwise a batched executemany of
+    pre-serialized JSON. Only one batch is serialized at a time, so memory stays flat.
+    Returns the number of rows written. The caller owns the transaction.
+    """
+    raw_cursor = db.connection().connection.cursor()
+
+    written = 0
+    try:
+        for start in range(0, len(df), batch_size):
+            lines = dataframe_to_json_lines(df.iloc[start:start + batch_size])
+            if not lines:
+                continue
+            _copy_json_lines(db, raw_cursor, "file_rows", lines, file_id)
+            written += len(lines)
+    finally:
+        raw_cursor.close()
+
+    return written
+
+def append_new_file_rows(db: Session, file_id: int, df: pd.DataFrame, last_row_id: int, key_column: str = None, batch_size: int = INGEST_BATCH_SIZE) -> pd.DataFrame:
+    """
+    Insert only the rows of `df` that `file_id` did not have before this append and return them.
+    A row is already present when its row_hash (md5 of the JSONB document) exists for the file,
+    or, when `key_column` is given (the mapped orderId), when a row with the same key exists.
+    Only rows up to `last_row_id` (the file's rows before the append started) are compared, so
+    what gets kept does not depend on how the upload was split into chunks and batches; like a
+    new upload, the appended file itself is taken as it is.
+    Rows go through a temp staging table so the comparison runs in the database, against the
+    (file_id, row_hash) index, and costs time in proportion to the new rows only.
+    The caller owns the transaction.
+    """
+    db.execute(text("CREATE TEMP TABLE IF NOT EXISTS file_rows_stage (data JSONB) ON COMMIT DELETE ROWS"))
+    key_filter = ""
+    if key_column:
+        key_filter = """
+          AND (s.data->>:key IS NULL OR NOT EXISTS (
+                SELECT 1 FROM file_rows f
+                WHERE f.file_id = :file_id AND f.id <= :last_row_id AND f.data->>:key = s.data->>:key))"""
+    insert_sql = text(f"""
+        INSERT INTO file_rows (file_id, data)
+        SELECT :file_id, s.data FROM file_rows_stage s
+        WHERE NOT EXISTS (
+                SELECT 1 FROM file_rows f
+                WHERE f.file_id = :file_id AND f.id <= :last_row_id AND f.row_hash = md5(s.data::text)){key_filter}
+        RETURNING data
+    """)
+
+    raw_cursor = db.connection().connection.cursor()
+    inserted = []
+    try:
+        for start in range(0, len(df), batch_size):
+            lines = dataframe_to_json_lines(df.iloc[start:start + batch_size])
+            if not lines:
+                continue
+            db.execute(text("TRUNCATE file_rows_stage"))
+            _copy_json_lines(db, raw_cursor, "file_rows_stage", lines)
+            inserted.extend(row.data for row in db.execute(insert_sql, {"file_id": file_id, "last_row_id": last_row_id, "key": key_column}))
+    finally:
+        raw_cursor.close()
+
+    # JSONB does not keep key order; restore the upload's column order
+    return pd.DataFrame(inserted).reindex(columns=df.columns)
+
+def release_blob(db: Session, content_hash: str) -> None:
+    """
+    Delete the stored upload for `content_hash` unless a file still points at it.
+    Blobs are shared by identical uploads; call this after committing the change that let go of it.
+    """
+    if content_hash and not db.query(UploadedFile.id).filter(UploadedFile.content_hash == content_hash).first():
+        delete_blob(content_hash)
+
+def find_duplicate_upload(db: Session, content_hash: str, user=None, guest_id=None):
+    """
+    Return the owner's existing upload with the same content hash, if it is ingested, or being
+    ingested by a job that is queued or was started less than INGEST_STALE_AFTER ago.
+    Failed uploads, and ones whose job died, are not reused, so re-uploading them ingests again.
+    """
+    live_job = exists().where(
+        UploadJob.file_id == UploadedFile.id,
+        or_(
+            UploadJob.status == "queued",
+            and_(UploadJob.status == "running", UploadJob.started_at >= datetime.utcnow() - timedelta(seconds=INGEST_STALE_AFTER)),
+        ),
+    )
+    query = db.query(UploadedFile).filter(
+        UploadedFile.content_hash == content_hash,
+        or_(UploadedFile.status == "ready", and_(UploadedFile.status == "ingesting", live_job)),
+    )
+    if user:
+        query = query.filter(UploadedFile.user_id == user.id)
+    elif guest_id:
+        query = query.filter(UploadedFile.guest_id == guest_id)
+    else:
+        return None
+    return query.order_by(UploadedFile.uploaded_at.desc()).first()
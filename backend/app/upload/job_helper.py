@@ -0,0 +1,475 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+import cloudinary
+import cloudinary.uploader
+import logging
+import time
+import re
+import os
+from app import models
+from app.database import SessionLocal
+from app.upload.operation_helper import iter_upload_chunks, infer_column_types, apply_column_types
+from app.upload.db_helper import (
+    bulk_insert_file_rows, append_new_file_rows, ensure_file_partition, drop_file_rows, release_blob, INGEST_STALE_AFTER,
+)
+from app.upload.blob_helper import store_blob
+from app.dataset.index_helper import schedule_file_indexes
+from app.dataset.cache_helper import bump_file_version
+from app.dataset.rollup_helper import build_file_rollups, schedule_file_rollups
+from app.dashboard.db_helper import refresh_file_summary_in_db
+from app.dataset.parquet_helper import (
+    write_snapshot_part, mark_snapshot_complete, drop_snapshot, drop_snapshot_parts, next_part_no, has_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+# Concurrent ingestion jobs per worker process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+# Concurrent raw-file archival uploads per worker process
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "2"))
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", "5"))
+ARCHIVE_RETRY_DELAY = float(os.getenv("ARCHIVE_RETRY_DELAY", "2"))  # seconds, doubled after each failure
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+# Separate pool so a slow blob store never holds up parsing/inserting
+_archive_executor = ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS, thread_name_prefix="archive")
+
+def _release_spool(db, job_id: str, spool_path: str) -> None:
+    """
+    Remove the spooled upload once neither the ingest nor the archive step needs it any more.
+    The two steps may have been claimed by different worker processes, so the job row is what
+    tells: each claimed step calls this after committing its outcome, and whichever finishes last removes the file.
+    """
+    job = (
+        db.query(models.UploadJob.status, models.UploadJob.archive_status)
+        .filter(models.UploadJob.id == job_id)
+        .first()
+    )
+    if job and (job.status in ("queued", "running") or job.archive_status in ("pending", "running")):
+        return
+    try:
+        os.remove(spool_path)
+    except FileNotFoundError:
+        pass
+
+def submit_ingest_job(job_id: str, spool_path: str) -> None:
+    """Queue an upload job on this process' ingestion pool, archiving the raw file alongside it."""
+    _executor.submit(run_ingest_job, job_id)
+    submit_archive_job(job_id, spool_path)
+
+def submit_archive_job(job_id: str, spool_path: str) -> None:
+    _archive_executor.submit(run_archive_job, job_id, spool_path)
+
+def resume_pending_jobs() -> int:
+    """
+    Re-submit work that was accepted but never finished (e.g. the worker restarted):
+    queued ingest jobs, and archive uploads still pending for already ingested files.
+    Every worker calls this on startup; the claim steps make sure only one runs each task.
+    Ingest jobs left "running" by a dead worker are failed first (see recover_stale_jobs).
+    """
+    recover_stale_jobs()
+
+    db = SessionLocal()
+    try:
+        pending = (
+            db.query(models.UploadJob.id, models.UploadJob.status, models.UploadJob.spool_path)
+            .filter((models.UploadJob.status == "queued") | (models.UploadJob.archive_status == "pending"))
+            .all()
+        )
+    finally:
+        db.close()
+
+    resumed = 0
+    for job_id, status, spool_path in pending:
+        if not spool_path or not os.path.exists(spool_path):
+            _fail_lost_spool(job_id)
+            continue
+        if status == "queued":
+            submit_ingest_job(job_id, spool_path)
+        else:
+            submit_archive_job(job_id, spool_path)
+        resumed += 1
+    return resumed
+
+def recover_stale_jobs() -> int:
+    """
+    Fail ingest jobs that have been "running" for longer than INGEST_STALE_AFTER: their worker died,
+    and nothing else would ever finish them (the file would stay "ingesting" for good).
+    A new upload's partial rows are removed and the file is marked failed, so uploading it again re-ingests it;
+    an append keeps the rows that made it in and the file is brought in line with them.
+    Archive uploads left "running" as long are put back to "pending" to be resumed.
+    Returns the number of ingest jobs failed.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=INGEST_STALE_AFTER)
+    db = SessionLocal()
+    try:
+        db.query(models.UploadJob).filter(
+            models.UploadJob.archive_status == "running", models.UploadJob.created_at < cutoff
+        ).update({"archive_status": "pending"}, synchronize_session=False)
+        db.commit()
+
+        stale = [
+            job_id for (job_id,) in db.query(models.UploadJob.id).filter(
+                models.UploadJob.status == "running", models.UploadJob.started_at < cutoff
+            )
+        ]
+        failed = 0
+        for job_id in stale:
+            # Claim the failure, so only one of the workers starting up cleans up after the job
+            claimed = (
+                db.query(models.UploadJob)
+                .filter(models.UploadJob.id == job_id, models.UploadJob.status == "running")
+                .update(
+                    {"status": "failed", "error": "Ingestion was interrupted", "finished_at": datetime.utcnow()},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if not claimed:
+                continue
+            job = db.query(models.UploadJob).filter(models.UploadJob.id == job_id).first()
+            try:
+                if job.mode == "append":
+                    released_hash = _resync_appended_file(db, job.file_id)
+                    db.commit()
+                    release_blob(db, released_hash)
+                else:
+                    _discard_ingested_rows(db, job.file_id)
+                    db.commit()
+            except Exception:
+                logger.exception("Cleaning up after interrupted ingest job %s failed", job_id)
+                db.rollback()
+            if job.spool_path:
+                _release_spool(db, job_id, job.spool_path)
+            failed += 1
+        return failed
+    finally:
+        db.close()
+
+def _fail_lost_spool(job_id: str) -> None:
+    """A queued job whose spooled upload is gone can never run: fail it instead of leaving it queued."""
+    db = SessionLocal()
+    try:
+        claimed = (
+            db.query(models.UploadJob)
+            .filter(models.UploadJob.id == job_id, models.UploadJob.status == "queued")
+            .update(
+                {"status": "failed", "error": "The uploaded file is no longer available", "finished_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.query(models.UploadJob).filter(
+            models.UploadJob.id == job_id, models.UploadJob.archive_status == "pending"
+        ).update({"archive_status": "failed"}, synchronize_session=False)
+        if claimed:
+            job = db.query(models.UploadJob).filter(models.UploadJob.id == job_id).first()
+            if job.mode != "append":
+                job.file.status = "failed"
+        db.commit()
+    finally:
+        db.close()
+
+def _discard_ingested_rows(db, file_id: int) -> None:
+    """Drop what a failed new upload managed to ingest, so the file never serves half a dataset."""
+    drop_snapshot(file_id)
+    drop_file_rows(db, file_id)
+    db.query(models.FileColumn).filter(models.FileColumn.file_id == file_id).delete(synchronize_session=False)
+    db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).update({"status": "failed"}, synchronize_session=False)
+
+def _resync_appended_file(db, file_id: int):
+    """
+    After an append that died part-way: which of its rows were committed is not known, so keep them
+    and bring the file's metadata in line with its rows; the snapshot may miss parts, so it is dropped.
+    Returns the content hash the file let go of, for release_blob once the caller has committed.
+    """
+    drop_snapshot(file_id)
+    content_hash = db.query(models.UploadedFile.content_hash).filter(models.UploadedFile.id == file_id).scalar()
+    total_rows = db.query(func.count(models.FileRow.id)).filter(models.FileRow.file_id == file_id).scalar()
+    db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).update(
+        {"total_rows": total_rows, "content_hash": None}, synchronize_session=False
+    )
+    bump_file_version(db, file_id)
+    refresh_file_summary_in_db(db, file_id)
+    schedule_file_rollups(file_id)
+    return content_hash
+
+def _claim_job(db, job_id: str) -> bool:
+    claimed = (
+        db.query(models.UploadJob)
+        .filter(models.UploadJob.id == job_id, models.UploadJob.status == "queued")
+        .update({"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(claimed)
+
+def _claim_archive(db, job_id: str) -> bool:
+    claimed = (
+        db.query(models.UploadJob)
+        .filter(models.UploadJob.id == job_id, models.UploadJob.archive_status == "pending")
+        .update({"archive_status": "running"}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(claimed)
+
+def _order_id_column(db, file_id: int):
+    """The raw column mapped to orderId for a file, used as the append dedup key."""
+    mapping = (
+        db.query(models.ColumnMapping)
+        .filter(models.ColumnMapping.file_id == file_id, models.ColumnMapping.analysis_type == "order")
+        .order_by(models.ColumnMapping.updated_at.desc())
+        .first()
+    )
+    return (mapping.mapping or {}).get("orderId") if mapping else None
+
+def run_ingest_job(job_id: str) -> None:
+    """
+    Parse and insert a spooled upload, recording progress on its UploadJob.
+    Jobs in "append" mode add only the rows the file does not have yet to an existing file.
+    """
+    db = SessionLocal()
+    spool_path = None
+    claimed = False
+    appending = False
+    first_part = 0
+    last_row_id = 0
+    try:
+        job = db.query(models.UploadJob).filter(models.UploadJob.id == job_id).first()
+        spool_path = job.spool_path if job else None
+        if not job or not _claim_job(db, job_id):
+            return
+        claimed = True
+
+        db.refresh(job)
+        uploaded = job.file
+        appending = job.mode == "append"
+
+        # Step 1: Load what the file already has when appending: its column types (so new values
+        # are normalized the same way), its dedup key and where its rows/snapshot parts end
+        column_types = {}
+        key_column = None
+        snapshot_ok = True
+        if appending:
+            known = db.query(models.FileColumn).filter(models.FileColumn.file_id == uploaded.id).all()
+            # Columns whose stored values were left as uploaded are not converted now either
+            column_types = {c.name: (c.dtype or "string", c.format) if c.normalized else ("string", None) for c in known}
+            key_column = _order_id_column(db, uploaded.id)
+            last_row_id = db.query(func.max(models.FileRow.id)).filter(models.FileRow.file_id == uploaded.id).scalar() or 0
+            first_part = next_part_no(uploaded.id)
+            # Never start a snapshot from the delta alone
+            snapshot_ok = has_snapshot(uploaded.id)
+        else:
+            # Give the file its own file_rows partition before any row arrives
+            ensure_file_partition(db, uploaded.id)
+            db.commit()
+
+        # Step 2: Parse and insert chunk by chunk, committing progress after each one.
+        # Column types are inferred from the first chunk and values are stored normalized.
+        # Every chunk also goes to the file's columnar (Parquet) snapshot.
+        # A column is converted in every chunk or in none: when a later chunk does not fit a column's
+        # type, the rows stored so far are discarded and the upload is read again with the column kept
+        # as uploaded. An append cannot do that for the file's existing columns and fails instead.
+        existing_columns = set(column_types)
+        while True:
+            rows_read = 0
+            rows_written = 0
+            part_no = first_part
+            retyped = set()
+            for chunk in iter_upload_chunks(spool_path, uploaded.filename):
+                if not uploaded.total_columns:
+                    uploaded.total_columns = len(chunk.columns)
+                unseen = [c for c in chunk.columns if c not in column_types]
+                if unseen:
+                    column_types.update(infer_column_types(chunk[unseen]))
+                chunk, mismatched = apply_column_types(chunk, column_types)
+                if mismatched & existing_columns:
+                    raise ValueError(
+                        "Values do not match the file's column types: " + ", ".join(sorted(mismatched & existing_columns))
+                    )
+                for col in mismatched:
+                    column_types[col] = ("string", None)
+                # Typed on an earlier chunk, whose rows were stored converted
+                retyped = mismatched.difference(unseen)
+                if retyped:
+                    break
+
+                rows_read += len(chunk)
+                if appending:
+                    chunk = append_new_file_rows(db, uploaded.id, chunk, last_row_id, key_column)
+                    rows_written += len(chunk)
+                else:
+                    rows_written += bulk_insert_file_rows(db, uploaded.id, chunk)
+                job.rows_processed = rows_read
+                db.commit()
+
+                if snapshot_ok and not chunk.empty:
+                    try:
+                        write_snapshot_part(uploaded.id, part_no, chunk)
+                        part_no += 1
+                    except Exception:
+                        # The snapshot is only an accelerator; analytics fall back to file_rows
+                        logger.warning("Snapshot write failed for file %s", uploaded.id, exc_info=True)
+                        drop_snapshot(uploaded.id)
+                        snapshot_ok = False
+
+            if not retyped:
+                break
+            logger.info("Column(s) %s of file %s do not fit their type, ingesting it again", sorted(retyped), uploaded.id)
+            if appending:
+                drop_snapshot_parts(uploaded.id, first_part)
+                db.query(models.FileRow).filter(
+                    models.FileRow.file_id == uploaded.id, models.FileRow.id > last_row_id
+                ).delete(synchronize_session=False)
+            else:
+                drop_snapshot(uploaded.id)
+                drop_file_rows(db, uploaded.id)
+                ensure_file_partition(db, uploaded.id)
+                snapshot_ok = True
+            db.commit()
+
+        # Step 3: Finalize
+        recorded = {c.name: c for c in db.query(models.FileColumn).filter(models.FileColumn.file_id == uploaded.id)}
+        for name, (dtype, fmt) in column_types.items():
+            column = recorded.get(name)
+            if column is None:
+                db.add(models.FileColumn(file_id=uploaded.id, name=name, dtype=dtype, format=fmt, normalized=True))
+            elif not appending:
+                # Typed at column-mapping time while the file was still ingesting
+                column.dtype, column.format, column.normalized = dtype, fmt, True
+        if snapshot_ok:
+            mark_snapshot_complete(uploaded.id)
+
+        if appending:
+            uploaded.total_rows = (uploaded.total_rows or 0) + rows_written
+            uploaded.total_columns = len(column_types)
+            # The dataset no longer matches the originally uploaded bytes
+            released_hash, uploaded.content_hash = uploaded.content_hash, None
+            uploaded.uploaded_at = datetime.utcnow()
+            bump_file_version(db, uploaded.id)
+        else:
+            uploaded.total_rows = rows_written
+        uploaded.status = "ready"
+        job.status = "completed"
+        job.finished_at = datetime.utcnow()
+        # Headline numbers for the dashboard cards, committed together with the rows
+        refresh_file_summary_in_db(db, uploaded.id, last_row_id if appending else None)
+        db.commit()
+        if appending:
+            release_blob(db, released_hash)
+
+        # Mappings saved while the file was ingesting could not use its column types yet
+        if not appending:
+            schedule_file_indexes(uploaded.id)
+
+        # Daily rollups for the new rows; already on a background thread, so build them here
+        try:
+            build_file_rollups(uploaded.id, last_row_id if appending else None)
+        except Exception:
+            logger.exception("Rollup build for file %s failed", uploaded.id)
+
+    except Exception as e:
+        logger.exception("Ingest job %s failed", job_id)
+        db.rollback()
+        job = db.query(models.UploadJob).filter(models.UploadJob.id == job_id).first()
+        if job:
+            if appending:
+                # Undo only this job's delta; the file keeps serving what it had
+                drop_snapshot_parts(job.file_id, first_part)
+                db.query(models.FileRow).filter(
+                    models.FileRow.file_id == job.file_id, models.FileRow.id > last_row_id
+                ).delete(synchronize_session=False)
+            else:
+                _discard_ingested_rows(db, job.file_id)
+            job.status = "failed"
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.commit()
+    finally:
+        # Only the worker that ran the job may let go of the spool; the others never had it
+        if claimed and spool_path:
+            _release_spool(db, job_id, spool_path)
+        db.close()
+
+def _lock_uploaded_file(db, file_id: int, read: bool = False):
+    """
+    The file row, locked until the caller commits, or None when the file has been deleted.
+    delete_file waits for the lock, so what the caller persists under it is cleaned up with the file.
+    """
+    return (
+        db.query(models.UploadedFile)
+        .filter(models.UploadedFile.id == file_id)
+        .with_for_update(read=read)
+        .first()
+    )
+
+def run_archive_job(job_id: str, spool_path: str) -> None:
+    """
+    Keep the raw upload (Cloudinary + local blob store) with retries and exponential backoff.
+    Runs next to run_ingest_job, so rows are queryable before the blob store has answered.
+    The spool stays in place for as long as the archive is pending or running (see _release_spool).
+    If the file is deleted meanwhile, nothing is persisted for it and the spool is removed here.
+    """
+    db = SessionLocal()
+    claimed = False
+    try:
+        job = db.query(models.UploadJob).filter(models.UploadJob.id == job_id).first()
+        if not job:
+            # Deleted with its file before the archive got to run; nobody else will remove the spool
+            claimed = True
+            return
+        if not _claim_archive(db, job_id):
+            return
+        claimed = True
+
+        db.refresh(job)
+        file_id = job.file_id
+        # The local copy first: it does not depend on the network
+        uploaded = _lock_uploaded_file(db, file_id, read=True)
+        if uploaded is None:
+            return
+        if uploaded.content_hash:
+            store_blob(spool_path, uploaded.content_hash)
+        filename = uploaded.filename
+        db.commit()
+
+        public_id_safe = re.sub(r'[^A-Za-z0-9_-]', '_', filename)
+        public_id = f"{public_id_safe}_{int(time.time())}"
+
+        for attempt in range(1, ARCHIVE_MAX_ATTEMPTS + 1):
+            try:
+                result = cloudinary.uploader.upload(
+                    spool_path,
+                    resource_type="raw",
+                    folder="uploads",
+                    public_id=public_id
+                )
+                break
+            except Exception:
+                if attempt == ARCHIVE_MAX_ATTEMPTS:
+                    raise
+                logger.warning("Archive upload for job %s failed (attempt %d), retrying", job_id, attempt, exc_info=True)
+                time.sleep(ARCHIVE_RETRY_DELAY * 2 ** (attempt - 1))
+
+        uploaded = _lock_uploaded_file(db, file_id)
+        if uploaded is None:
+            # Deleted during the upload: do not leave an archive behind for it
+            try:
+                cloudinary.uploader.destroy(result["public_id"], resource_type="raw")
+            except Exception:
+                logger.warning("Could not remove the archive of deleted file %s", file_id, exc_info=True)
+            return
+        uploaded.cloudinary_url = result["secure_url"]
+        uploaded.cloudinary_public_id = result["public_id"]
+        db.query(models.UploadJob).filter(models.UploadJob.id == job_id).update({"archive_status": "archived"}, synchronize_session=False)
+        db.commit()
+
+    except Exception:
+        logger.exception("Archive job %s failed", job_id)
+        db.rollback()
+        db.query(models.UploadJob).filter(models.UploadJob.id == job_id).update({"archive_status": "failed"}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.rollback()
+        if claimed and spool_path:
+            _release_spool(db, job_id, spool_path)
+        db.close()
@@ -0,0 +1,197 @@
+from fastapi import UploadFile
+from typing import Iterator
+import numpy as np
+import pandas as pd
+import tempfile
+import re
+import os
+from app.upload.blob_helper import new_content_hash
+
+# Rows parsed per chunk when streaming CSV uploads
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "50000"))
+# Where uploads are spooled before parsing (None -> system temp dir)
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR") or None
+SPOOL_READ_SIZE = 1024 * 1024
+# Non-null values looked at when inferring a column's type
+TYPE_SAMPLE_SIZE = 1000
+# Text columns with at most this share of distinct values are reported as categorical
+CATEGORICAL_MAX_RATIO = 0.5
+
+ISO_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+ISO_DATE_FORMAT = "%Y-%m-%d"
+# Tried in order; month-first comes before day-first, like pandas' own guess
+DATETIME_FORMATS = [
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M",
+    "%Y/%m/%d", "%Y/%m/%d %H:%M:%S",
+    "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S",
+    "%m-%d-%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y", "%b %d, %Y",
+]
+PHONE_NAME_RE = re.compile(r"phone|mobile|(^|[^a-z])tel([^a-z]|$)|whatsapp|هاتف|جوال|موبايل", re.IGNORECASE)
+PHONE_VALUE_RE = re.compile(r"^\+?[\d\s\-().]{7,20}$")
+
+async def spool_upload(file: UploadFile) -> tuple[str, str, int]:
+    """
+    Copy the uploaded file to a temp file in fixed-size blocks.
+    Returns (path, sha256 hex digest, size in bytes); the hash is computed on the way through.
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    digest = new_content_hash()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=INGEST_SPOOL_DIR) as tmp:
+        while True:
+            block = await file.read(SPOOL_READ_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+            tmp.write(block)
+    return tmp.name, digest.hexdigest(), size
+
+def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Apply the upload-time cleanup: drop empty rows, strip headers, ISO-format datetimes, Inf -> NaN."""
+    df = df.dropna(how="all")
+    df = df.replace([np.inf, -np.inf], np.nan)
+    df.columns = [str(c).strip() for c in df.columns]
+    # Convert datetime-like columns to ISO strings to make JSON-serializable
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return df
+
+def iter_upload_chunks(path: str, filename: str, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Yield normalized DataFrames for a spooled upload.
+    CSV files are parsed `chunk_size` rows at a time, so memory is bounded by the chunk
+    size rather than the file size. Excel workbooks cannot be streamed and come back whole.
+    """
+    if filename.endswith(".csv"):
+        with pd.read_csv(path, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield normalize_dataframe(chunk)
+    else:
+        yield normalize_dataframe(pd.read_excel(path, engine="openpyxl"))
+
+def _sample(series: pd.Series) -> pd.Series:
+    return series.dropna().head(TYPE_SAMPLE_SIZE)
+
+def _parse_datetimes(values: pd.Series, fmt: str):
+    """
+    Parse `values` with `fmt` (unparseable -> NaT) into naive timestamps.
+    Returns None when pandas cannot give a datetime64 series, e.g. for ISO values with
+    mixed UTC offsets, so such columns are treated as text rather than half-converted.
+    """
+    try:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    except (ValueError, TypeError):
+        return None
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        return None
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+def _detect_datetime_format(values: pd.Series):
+    """Return the first known format that parses every sampled value, "ISO8601" as a last resort."""
+    values = values.astype(str).str.strip()
+    for fmt in DATETIME_FORMATS + ["ISO8601"]:
+        parsed = _parse_datetimes(values, fmt)
+        if parsed is not None and parsed.notna().all():
+            return fmt
+    return None
+
+def _is_numeric_text(values: pd.Series) -> bool:
+    values = values.astype(str).str.strip()
+    # Leading zeros ("00123") are identifiers, not numbers
+    if values.str.match(r"^[+-]?0\d").any():
+        return False
+    return pd.to_numeric(values, errors="coerce").notna().all()
+
+def _is_phone_text(values: pd.Series) -> bool:
+    values = values.astype(str).str.strip()
+    return values.str.match(PHONE_VALUE_RE).all() and values.str.count(r"\d").ge(7).all()
+
+def infer_column_types(df: pd.DataFrame) -> dict:
+    """
+    Infer {column: (dtype, format)} from a parsed chunk.
+    dtype is one of int, decimal, datetime, phone, categorical, string;
+    format is the detected strptime pattern for datetime columns, else None.
+    """
+    types = {}
+    for col in df.columns:
+        series = df[col]
+        sample = _sample(series)
+
+        if PHONE_NAME_RE.search(str(col)):
+            types[col] = ("phone", None)
+        elif pd.api.types.is_bool_dtype(series):
+            types[col] = ("categorical", None)
+        elif pd.api.types.is_integer_dtype(series):
+            types[col] = ("int", None)
+        elif pd.api.types.is_float_dtype(series):
+            integral = sample.empty or (sample % 1 == 0).all()
+            types[col] = ("int" if integral else "decimal", None)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            types[col] = ("datetime", ISO_DATETIME_FORMAT)
+        elif sample.empty:
+            types[col] = ("string", None)
+        elif _is_numeric_text(sample):
+            numbers = pd.to_numeric(sample.astype(str).str.strip())
+            types[col] = ("int" if (numbers % 1 == 0).all() else "decimal", None)
+        elif fmt := _detect_datetime_format(sample):
+            types[col] = ("datetime", fmt)
+        elif _is_phone_text(sample):
+            types[col] = ("phone", None)
+        elif sample.nunique() <= CATEGORICAL_MAX_RATIO * len(sample):
+            types[col] = ("categorical", None)
+        else:
+            types[col] = ("string", None)
+    return types
+
+def apply_column_types(df: pd.DataFrame, types: dict) -> tuple[pd.DataFrame, set]:
+    """
+    Store values in their inferred type: numbers as numbers and dates as ISO strings.
+    Conversion is all-or-nothing per column, so a chunk never mixes raw and converted values;
+    columns that do not fit their type are left untouched and returned so the caller can
+    downgrade them to "string".
+    """
+    mismatched = set()
+    for col, (dtype, fmt) in types.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        present = series.notna()
+
+        if dtype in ("int", "decimal"):
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                continue
+            text = series.astype(str).str.strip()
+            converted = pd.to_numeric(text.where(present), errors="coerce")
+            if converted[present].isna().any() or text[present].str.match(r"^[+-]?0\d").any():
+                mismatched.add(col)
+                continue
+            df[col] = converted
+
+        elif dtype == "datetime" and fmt:
+            parsed = _parse_datetimes(series.astype(str).str.strip().where(present), fmt)
+            if parsed is None or parsed[present].isna().any():
+                mismatched.add(col)
+                continue
+            has_time = fmt == "ISO8601" or any(t in fmt for t in ("%H", "%M", "%S"))
+            df[col] = parsed.dt.strftime(ISO_DATETIME_FORMAT if has_time else ISO_DATE_FORMAT)
+    return df, mismatched
+
+def dataframe_to_json_lines(df: pd.DataFrame) -> list[str]:
+    """
+    Serialize every row of `df` to a JSON document in one vectorized pass.
+    NaN/Infinity/-Infinity become null, which is what clean_json did row by row.
+    Records are split on "\n" only: str.splitlines would also break on U+0085/U+2028/U+2029,
+    which force_ascii=False leaves unescaped inside string values.
+    """
+    if df.empty:
+        return []
+
+    df = df.replace([np.inf, -np.inf], np.nan)
+    payload = df.to_json(orient="records", lines=True, force_ascii=False, double_precision=15, date_format="iso")
+    lines = payload.split("\n")
+    return lines[:-1] if lines and not lines[-1] else lines
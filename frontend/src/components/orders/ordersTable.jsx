@@ -5,52 +5,58 @@ import DatePicker from 'react-datepicker'
 import 'react-datepicker/dist/react-datepicker.css'
 import { useTranslation } from 'react-i18next';
 
+const PAGE_SIZE = 10
+
 const OrderTable = () => {
   const { t } = useTranslation("ordersAnalysis");
 
   const [orders, setOrders] = useState([])
-  const [filteredOrders, setFilteredOrders] = useState([])
+  const [total, setTotal] = useState(0)
   const [startDate, setStartDate] = useState(null)
   const [endDate, setEndDate] = useState(null)
   const [columns, setColumns] = useState([]) // dynamic columns
+  // cursors of the pages before the current one, and of the next page
+  const [cursors, setCursors] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
 
-  const fetchOrders = async () => {
+  // The server sorts, filters and pages the orders; only PAGE_SIZE rows are fetched at a time
+  const fetchOrders = async (cursor = null) => {
     try {
-      const params = {}
+      const params = { limit: PAGE_SIZE }
       if (startDate) params.start_date = startDate.toISOString().split("T")[0]
       if (endDate) params.end_date = endDate.toISOString().split("T")[0]
+      if (cursor) params.cursor = cursor
 
       const res = await api.get(`/order-analysis/orders-in-range`, { params })
       const data = res.data
 
-      // Use rows and columns from API
+      // Use rows and columns from API; the total only comes with the first page
       setOrders(data.rows || [])
-      setFilteredOrders(data.rows || [])
       setColumns(data.columns || [])
+      setNextCursor(data.next_cursor || null)
+      if (!cursor) setTotal(data.total || 0)
     } catch (err) {
       console.error('Error fetching orders:', err)
     }
   }
 
   useEffect(() => {
-    if (startDate && endDate) fetchOrders()
-  }, [startDate, endDate])
-
-  const filterByDateRange = () => {
     if (startDate && endDate) {
-      const filtered = orders.filter((order) => {
-        const orderDate = new Date(order.date)
-        return orderDate >= startDate && orderDate <= endDate
-      })
-      setFilteredOrders(filtered)
-    } else {
-      setFilteredOrders(orders)
+      setCursors([])
+      fetchOrders()
     }
+  }, [startDate, endDate])
+
+  const nextPage = () => {
+    setCursors([...cursors, nextCursor])
+    fetchOrders(nextCursor)
   }
 
-  useEffect(() => {
-    filterByDateRange()
-  }, [startDate, endDate, orders])
+  const previousPage = () => {
+    const previous = cursors.slice(0, -1)
+    setCursors(previous)
+    fetchOrders(previous[previous.length - 1])
+  }
 
   const renderHead = (item, index) => <th key={index}>{t(item)}</th>
 
@@ -110,20 +116,26 @@ const OrderTable = () => {
           <div className="card__header">
             <h3>{t("tableTitle")}</h3>
             <p className="text-sm text-gray-600 mt-2">
-              {t("showing")} <span className="font-semibold">{filteredOrders.length}</span> {t("order")}
-              {filteredOrders.length !== 1 ? 's' : ''} {t("inSelectedDateRange")}
+              {t("showing")} <span className="font-semibold">{total}</span> {t("order")}
+              {total !== 1 ? 's' : ''} {t("inSelectedDateRange")}
             </p>
           </div>
           <div className="card__body">
             <Table
-              limit="10"
               headData={columns}
               renderHead={renderHead}
-              bodyData={filteredOrders}
+              bodyData={orders}
               renderBody={renderBody}
             />
           </div>
-          <div className="card__footer">{/* Optional footer */}</div>
+          <div className="card__footer flex justify-end gap-2">
+            <button className="border px-3 py-1 rounded" disabled={cursors.length === 0} onClick={previousPage}>
+              {t("previous")}
+            </button>
+            <button className="border px-3 py-1 rounded" disabled={!nextCursor} onClick={nextPage}>
+              {t("next")}
+            </button>
+          </div>
         </div>
       </div>
     </div>
@@ -6,17 +6,23 @@ import api from '../../../api_config';
 import { useNavigate } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 
+const PAGE_SIZE = 10;
+
 const ProductSalesTable = () => {
   const [products, setProducts] = useState([]);
   const [startDate, setStartDate] = useState();
   const [endDate, setEndDate] = useState();
   const [grandTotal, setGrandTotal] = useState(0);
   const [columns, setColumns] = useState({});
+  // cursors of the pages before the current one, and of the next page
+  const [cursors, setCursors] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
   const navigate = useNavigate();
   const { t } = useTranslation('productAnalysis');
 
-  const fetchSales = async () => {
+  // The server sorts and pages the sales; only PAGE_SIZE rows are fetched at a time
+  const fetchSales = async (cursor = null) => {
     if (!startDate || !endDate) return;
 
     try {
@@ -24,31 +30,41 @@ const ProductSalesTable = () => {
         params: {
           start_date: startDate.toISOString().split('T')[0],
           end_date: endDate.toISOString().split('T')[0],
+          limit: PAGE_SIZE,
+          ...(cursor ? { cursor } : {}),
         },
       });
 
       const data = res.data;
-      console.log('data -->', data);
 
       // ✅ Update columns and rows
       setColumns(data.columns || {});
       setProducts(data.rows || []);
+      setNextCursor(data.next_cursor || null);
 
-      // ✅ Calculate grand total (price * quantity)
-      const total = (data.rows || []).reduce(
-        (sum, item) => sum + (item.price * item.quantity),
-        0
-      );
-      setGrandTotal(total);
+      // ✅ Grand total (price * quantity) of the whole range comes with the first page
+      if (!cursor) setGrandTotal(data.grand_total || 0);
     } catch (err) {
       console.error('Error fetching product sales:', err);
     }
   };
 
   useEffect(() => {
+    setCursors([]);
     fetchSales();
   }, [startDate, endDate]);
 
+  const nextPage = () => {
+    setCursors([...cursors, nextCursor]);
+    fetchSales(nextCursor);
+  };
+
+  const previousPage = () => {
+    const previous = cursors.slice(0, -1);
+    setCursors(previous);
+    fetchSales(previous[previous.length - 1]);
+  };
+
   // ✅ Updated table header setup
   const headData = [
     'ID',
@@ -129,13 +145,21 @@ const ProductSalesTable = () => {
 
           <div className="card__body">
             <Table
-              limit="10"
               headData={headData}
               renderHead={renderHead}
               bodyData={products}
               renderBody={renderBody}
             />
           </div>
+
+          <div className="flex justify-end gap-2 mt-4">
+            <button className="border px-3 py-1 rounded" disabled={cursors.length === 0} onClick={previousPage}>
+              {t('previous')}
+            </button>
+            <button className="border px-3 py-1 rounded" disabled={!nextCursor} onClick={nextPage}>
+              {t('next')}
+            </button>
+          </div>
         </div>
       </div>
     </div>
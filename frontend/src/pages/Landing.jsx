@@ -92,18 +92,32 @@ const Dashboard = () => {
     const [salesComparison, setSalesComparison] = useState(null)
     const [topCustHeaders, setTopCustHeaders] = useState([]);
     const [topCustRows, setTopCustRows] = useState([]);
+    const [summary, setSummary] = useState(null);
 
     const { t, i18n } = useTranslation("landing");
 
     const topCustomerHead = ["user", "totalOrders", "totalSpending"];
     const renderCustomerHead = (item, index) => <th key={index}>{t(item)}</th>;
 
+    // One request for every card, table and list on the page
     useEffect(() => {
         (async () => {
           try {
-            const { data } = await api.get("/dashboard/latest-rows", {
+            const { data } = await api.get("/dashboard/summary", {
               params: { limit: 5 },
             });
+            setSummary(data);
+          } catch (err) {
+            console.error("Error fetching dashboard summary:", err);
+          }
+        })();
+      }, []);
+
+    useEffect(() => {
+        if (!summary) return;
+        (() => {
+          try {
+            const data = summary.latest_rows || {};
       
             const rows = Array.isArray(data.rows) ? data.rows : [];
       
@@ -130,15 +144,14 @@ const Dashboard = () => {
             console.error("Error fetching latest rows:", err);
           }
         })();
-      }, []);
+      }, [summary]);
       
 
       useEffect(() => {
-        (async () => {
+        if (!summary) return;
+        (() => {
             try {
-            const { data } = await api.get("/dashboard/top-customers", {
-                params: { limit: 5 },
-            });
+            const data = summary.top_customers || {};
 
             // Ensure rows exist
             const rows = Array.isArray(data.rows) ? data.rows : [];
@@ -162,15 +175,16 @@ const Dashboard = () => {
             console.error("Error fetching top customers:", err);
             }
         })();
-        }, []);
+        }, [summary]);
 
       useEffect(() => {
-        const fetchStatusCards = async () => {
+        if (!summary) return;
+        const fetchStatusCards = () => {
           try {
-            const { data: { count } } = await api.get("/dashboard/total-orders-count");
-            const { data: { total_sales } } = await api.get("/dashboard/total-sales");
-            const { data: { total_products } } = await api.get("/dashboard/total-products");
-            const { data: { total_customers } } = await api.get("/dashboard/total-customers");
+            const { count } = summary.total_orders_count || {};
+            const { total_sales } = summary.total_sales || {};
+            const { total_products } = summary.total_products || {};
+            const { total_customers } = summary.total_customers || {};
             console.log("total customers",total_customers )
     
             const cards = [
@@ -203,7 +217,7 @@ const Dashboard = () => {
         };
     
         fetchStatusCards();
-      }, [i18n.language]);
+      }, [summary, i18n.language]);
 
     useEffect(() => {
         api.get(`/sales-comparison`)